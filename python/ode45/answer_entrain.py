@@ -2,14 +2,13 @@ from netCDF4 import Dataset
 import site
 site.addsitedir('C:\Users\Den\mya405\python\\thermlib')
 site.addsitedir('C:\Users\Den\mya405\python\\skew_T')
-from scipy.integrate import ode
 import matplotlib.pyplot as plt
 import numpy as np
 from constants import constants as c
-from nudge import nudge
+from sounding import Sounding
 from new_thermo import thetaep, tinvert_thetae, wsat
-from calcBuoy import calcBuoy
 from findTmoist import findTmoist
+from parcelEnsemble import parcelTrajectory, EnvColumn
 
 def answer_entrain():
     filename = 'littlerock.nc'
@@ -26,13 +25,13 @@ def answer_entrain():
     temp = sound_var[:,2]
     dewpoint = sound_var[:,3]
     
-    #height must have unique values
-    envHeight= nudge(height)
-    #Tenv and TdEnv interpolators return temp. in deg C, given height in m
+    #Sounding drops repeated levels and keeps the interpolation slopes
+    sound = Sounding.from_array(sound_var[:], nc_file.col_names)
     #Press interpolator returns pressure in hPa given height in m
-    interpTenv = lambda zVals: np.interp(zVals, envHeight, temp)
-    interpTdEnv = lambda zVals: np.interp(zVals, envHeight, dewpoint)
-    interpPress = lambda zVals: np.interp(zVals, envHeight, press)
+    interpPress = sound.interpolator('press', 'height')
+    #the environmental press, Tv, thetae and wT that F needs, tabulated
+    #once every 10 m, so F does not solve for them on every call
+    env = EnvColumn(sound, dz=10.)
     
     p900_level = np.where(abs(900 - press) < 2.)
     p800_level = np.where(abs(800 - press) < 7.)
@@ -42,34 +41,18 @@ def answer_entrain():
     entrain_rate = 2.e-4
     winit = 0.5 #initial velocity (m/s)
     yinit = [winit, height_800, thetaeVal, wTcloud]  
-    tinit = 0
     tfin = 2500
     dt = 10
     
-    #want to integrate F using ode45 (from MATLAB) equivalent integrator
-    r = ode(F).set_integrator('dopri5')
-    r.set_f_params(entrain_rate, interpTenv, interpTdEnv, interpPress)
-    r.set_initial_value(yinit, tinit)
-    
-    y = np.array(yinit)
-    t = np.array(tinit)
-    
-    #stop tracking the parcel when the time runs out, or if the parcel stops moving/is desecnding
-    while r.successful() and r.t < tfin and r.y[0] > 0:
-        #find y at the next time step
-        #(r.integrate(t) updates the fields r.y and r.t so that r.y = F(t) and r.t = t 
-        #where F is the function being integrated)
-        r.integrate(r.t+dt)
-        if r.y[0] <= 0:
-            break
-        #keep track of y at each time step
-        y = np.vstack((y, r.y))
-        t = np.vstack((t, r.t))
-        
-    wvel = y[:,0]
-    cloud_height = y[:,1]
-    thetae_cloud = y[:,2]
-    wT_cloud = y[:,3]
+    #integrate F with an ode45 (from MATLAB) equivalent integrator;
+    #stop tracking the parcel when the time runs out, or exactly where it
+    #stops moving up
+    traj, events = parcelTrajectory(F, yinit, tfin, dt,
+                                    args=(entrain_rate, env))
+    wvel = traj['w']
+    cloud_height = traj['z']
+    thetae_cloud = traj['thetae']
+    wT_cloud = traj['wT']
     
     plt.figure(1)
     plt.plot(wvel, cloud_height)
@@ -78,28 +61,15 @@ def answer_entrain():
     plt.gca().set_title('vertical velocity of a cloud parcel vs height,\
  entrainment rate of %4.1e $s^{-1}$' %entrain_rate)
     
-    Tcloud = np.zeros(cloud_height.size)
-    wvCloud = np.zeros(cloud_height.size)
-    wlCloud = np.zeros(cloud_height.size)
-    
-    for i in range(0, len(cloud_height)):
-        the_press = interpPress(cloud_height[i])*100.
-        Tcloud[i], wvCloud[i], wlCloud[i] = tinvert_thetae(thetae_cloud[i], 
-                                                        wT_cloud[i], the_press)
-        
-    Tadia= np.zeros(cloud_height.size)
-    wvAdia = np.zeros(cloud_height.size)
-    wlAdia = np.zeros(cloud_height.size)
-    
-   
-    for i in range(0, len(cloud_height)):
-        the_press = interpPress(cloud_height[i])*100.
-        Tadia[i], wvAdia[i], wlAdia[i] = tinvert_thetae(thetae_cloud[0], 
-                                                      wT_cloud[0], the_press)
+    cloud_press = interpPress(cloud_height)*100.
+    Tcloud, wvCloud, wlCloud = tinvert_thetae(thetae_cloud, wT_cloud,
+                                              cloud_press)
+    Tadia, wvAdia, wlAdia = tinvert_thetae(thetae_cloud[0], wT_cloud[0],
+                                           cloud_press)
     
     plt.figure(2)
     TcloudHandle, = plt.plot(Tcloud - c.Tc, cloud_height, 'r-')
-    TenvHandle, = plt.plot(temp, envHeight, 'g-')
+    TenvHandle, = plt.plot(sound.temp, sound.height, 'g-')
     TadiaHandle, = plt.plot(Tadia - c.Tc, cloud_height, 'b-')
     plt.xlabel('temperature (deg C)')
     plt.ylabel('height above surface (m)')
@@ -111,19 +81,19 @@ def answer_entrain():
        
 #F returns the buoyancy (and height), velocity, rate of change of thetae_cloud 
 #(w.r.t. time) and rate of change of total mixing ratio at a given time step and height
-def F(t, y, entrain_rate, interpTenv, interpTdEnv, interpPress):
+def F(t, y, entrain_rate, env):
     yp = np.zeros((4,1))
     velocity = y[0]
     height = y[1]
     thetae_cloud = y[2]
     wT_cloud = y[3]
-    #yp[0] is the acceleration, in this case the buoyancy 
-    yp[0] = calcBuoy(height, thetae_cloud, interpTenv, interpTdEnv, interpPress)
-    press = interpPress(height)*100. #Pa
-    Tdenv = interpTdEnv(height) + c.Tc #K
-    Tenv = interpTenv(height) + c.Tc #K
-    wTenv = wsat(Tdenv, press) #kg/kg
-    thetaeEnv = thetaep(Tdenv, Tenv, press)
+    #environment at the parcel height: Pa, K, K, kg/kg
+    press, Tvenv, thetaeEnv, wTenv = env.interp(height)
+    #yp[0] is the acceleration, in this case the buoyancy, neglecting
+    #liquid water loading as in calcBuoy
+    Tcloud = findTmoist(thetae_cloud, press, engine='table') #K
+    Tvcloud = Tcloud*(1. + c.eps*wsat(Tcloud, press))
+    yp[0] = c.g0*(Tvcloud - Tvenv)/Tvenv
     #yp[1] is the rate of change of height
     yp[1] = velocity
     #yp[2] is the rate of change of thetae_cloud
@@ -5,15 +5,17 @@ from constants import constants as c
 from findTmoist import findTmoist
 from new_thermo import wsat
 
-def calcBuoy(height, thetae0, interpTenv, interpTdEnv, interpPress):
+def calcBuoy(height, thetae0, interpTenv, interpTdEnv, interpPress,
+             engine='bracket'):
 
     #input: height (m), thetae0 (K), plus function handles for
-    #T,Td, press soundings
+    #T,Td, press soundings, engine = findTmoist engine
+    #('bracket', 'brenth', 'newton' or 'table')
     #output: Bout = buoyant acceleration in m/s^2
     #neglect liquid water loading in the virtual temperature
     
     press=interpPress(height)*100.#%Pa
-    Tcloud=findTmoist(thetae0,press) #K
+    Tcloud=findTmoist(thetae0,press,engine=engine) #K
     wvcloud=wsat(Tcloud,press); #kg/kg
     Tvcloud=Tcloud*(1. + c.eps*wvcloud)
     Tenv=interpTenv(height) + c.Tc
@@ -2,14 +2,14 @@ from netCDF4 import Dataset
 import site
 site.addsitedir('C:\Users\Den\mya405\python\\thermlib')
 site.addsitedir('C:\Users\Den\mya405\python\\skew_T')
-from scipy.integrate import ode
 import matplotlib.pyplot as plt
 import numpy as np
 from constants import constants as c
-from nudge import nudge
+from sounding import Sounding
 from new_thermo import thetaep
 from calcBuoy import calcBuoy
 from findTmoist import findTmoist
+from parcelEnsemble import parcelTrajectory
 
 def ode_littlerock():
     filename = 'littlerock.nc'
@@ -26,13 +26,14 @@ def ode_littlerock():
     temp = sound_var[:,2]
     dewpoint = sound_var[:,3]
     
-    #height must have unique values
-    newHeight= nudge(height)
+    #Sounding drops repeated levels and keeps the interpolation
+    #slopes, so the interpolators below are cheap to call from F
+    sound = Sounding.from_array(sound_var[:], nc_file.col_names)
     #Tenv and TdEnv interpolators return temp. in deg C, given height in m
     #Press interpolator returns pressure in hPa given height in m
-    interpTenv = lambda zVals: np.interp(zVals, newHeight, temp)
-    interpTdEnv = lambda zVals: np.interp(zVals, newHeight, dewpoint)
-    interpPress = lambda zVals: np.interp(zVals, newHeight, press)
+    interpTenv = sound.interpolator('temp', 'height')
+    interpTdEnv = sound.interpolator('dewpt', 'height')
+    interpPress = sound.interpolator('press', 'height')
     p900_level = np.where(abs(900 - press) < 2.)
     p800_level = np.where(abs(800 - press) < 7.)
     thetaeVal=thetaep(dewpoint[p900_level] + c.Tc,temp[p900_level] + c.Tc,press[p900_level]*100.)
@@ -40,30 +41,16 @@ def ode_littlerock():
     height_800=height[p800_level]
     
     yinit = [0.5, height_800]  #(intial velocity = 0.5 m/s, initial height in m)
-    tinit = 0
     tfin = 2500
     dt = 10
     
-    #want to integrate F using ode45 (from MATLAB) equivalent integrator
-    r = ode(F).set_integrator('dopri5')
-    r.set_f_params(thetaeVal, interpTenv, interpTdEnv, interpPress)
-    r.set_initial_value(yinit, tinit)
-    
-    y = np.array(yinit)
-    t = np.array(tinit)
-    
-    #stop integration when the parcel changes direction, or time runs out
-    while r.successful() and r.t < tfin and r.y[0] > 0:
-        #find y at the next time step
-        #(r.integrate(t) updates the fields r.y and r.t so that r.y = F(t) and r.t = t 
-        #where F is the function being integrated)
-        r.integrate(r.t+dt)
-        #keep track of y at each time step
-        y = np.vstack((y, r.y))
-        t = np.vstack((t, r.t))
-        
-    wvel = y[:,0]
-    height = y[:,1]
+    #integrate F with an ode45 (from MATLAB) equivalent integrator,
+    #stopping exactly where the parcel stops rising, or when time runs out
+    traj, events = parcelTrajectory(F, yinit, tfin, dt,
+                                    args=(thetaeVal, interpTenv, interpTdEnv,
+                                          interpPress))
+    wvel = traj['w']
+    height = traj['z']
     
     plt.figure(1)
     plt.plot(wvel, height)
@@ -2,9 +2,10 @@
 import site
 site.addsitedir('C:\Users\Den\mya405\python\\thermlib')
 import numpy as np
-from findTmoist import findTmoist
+from findTmoist import findTmoist, warmTmoist
+from calcTvDiff import cloudTvDiff
 
-def calcAdiabat(press0, thetae0, topPress):
+def calcAdiabat(press0, thetae0, topPress, engine='walk'):
     """
     
     Calculates the temperature-pressure coordinates of a moist adiabat.
@@ -14,6 +15,8 @@ def calcAdiabat(press0, thetae0, topPress):
     press0: the initial pressure (Pa)
     thetae0: the equivalent potential temperature (K) of the adiabat
     topPress: the final pressure (Pa)
+    engine: findTmoist engine, 'walk' (default), 'bracket', 'brenth',
+            'newton' or 'table'
     
     Returns
     - - - - - -
@@ -28,19 +31,147 @@ def calcAdiabat(press0, thetae0, topPress):
     50
     >>> len(T)
     50
+    >>> p,Ttable = calcAdiabat(800*100, 300, 1000*100, engine='table')
+    >>> np.max(np.abs(Ttable - T)) < 1.e-4
+    True
     
 
     """
     
     pressVals = np.linspace(press0, topPress, 50)
     
-    tempVals = findTmoist(thetae0, pressVals)
+    tempVals = findTmoist(thetae0, pressVals, engine=engine)
     
     return pressVals, np.asarray(tempVals)
 
+def calcAdiabatAdaptive(press0, thetae0, topPress, tol=0.01,
+                        interpTenv=None, interpTdEnv=None, minDp=10.,
+                        numStart=9, maxLevels=2000):
+    """
+    
+    Calculates the temperature-pressure coordinates of a moist adiabat
+    on levels that are only refined where they are needed.
+    
+    Parameters
+    - - - - - -
+    press0: the initial pressure (Pa)
+    thetae0: the equivalent potential temperature (K) of the adiabat
+    topPress: the final pressure (Pa)
+    tol: an interval is split while the adiabat temperature at its
+         midpoint is more than tol (K) from the straight line in
+         log(p) between its end points or, with a sounding, while the
+         virtual temperature difference is
+    interpTenv, interpTdEnv: optional interpolators for the
+         environmental temperature and dew point (deg C) given
+         pressure (hPa), as for calcTvDiff.  Intervals where the
+         virtual temperature difference changes sign are split down
+         to minDp, which places the LFC and EL crossings
+    minDp: intervals narrower than this (Pa) are never split
+    numStart: number of levels, evenly spaced in log(p), to start from
+    maxLevels: refinement stops once there are this many levels
+    
+    Returns
+    - - - - - -
+    (pressVals, tempVals, TvDiff, nevals): pressVals (Pa) and
+        tempVals (K) are the coordinates of the thetae0 adiabat, in
+        order from press0 to topPress.  TvDiff is the virtual
+        temperature difference (K) from cloudTvDiff at pressVals, or
+        None without a sounding.  nevals is the total number of thetaes
+        evaluations used.
+                
+    
+    Tests
+    - - - - -
+    >>> p, T, Tv, nevals = calcAdiabatAdaptive(900.e2, 330., 200.e2)
+    >>> Tfine = findTmoist(330., p, engine='brenth')
+    >>> np.max(np.abs(T - Tfine)) < 1.e-8
+    True
+    >>> pfine = np.linspace(900.e2, 200.e2, 2000)
+    >>> Tline = np.interp(-np.log(pfine), -np.log(p), T)
+    >>> np.max(np.abs(Tline - findTmoist(330., pfine))) < 0.01
+    True
+    >>> len(p) < 60 and nevals < 200
+    True
+
+    A sounding with an inversion, integrated for CAPE.  The adaptive
+    levels cost fewer thetaes evaluations than 100 evenly spaced levels
+    walked with walkTmoist, and give a smaller CAPE error:
+
+    >>> from findTmoist import walkTmoist
+    >>> ps = [200., 250., 300., 400., 500., 600., 700., 750., 800., 850.,
+    ...       870., 900.]
+    >>> ts = [-55., -52., -42., -27., -13., -5., 4., 8., 7., 14., 16., 19.]
+    >>> Tenv = lambda phPa: np.interp(phPa, ps, ts)
+    >>> Tdenv = lambda phPa: Tenv(phPa) - 8.
+    >>> cape = lambda p, Tv: -c.Rd*np.trapz(np.maximum(Tv, 0.), np.log(p))
+    >>> p, T, Tv, nevals = calcAdiabatAdaptive(900.e2, 330., 200.e2, tol=0.1,
+    ...                                        interpTenv=Tenv,
+    ...                                        interpTdEnv=Tdenv)
+    >>> pfine = np.linspace(900.e2, 200.e2, 20000)
+    >>> Tvfine = cloudTvDiff(findTmoist(330., pfine), pfine, Tenv, Tdenv)
+    >>> capefine = cape(pfine, Tvfine)
+    >>> puni = np.linspace(900.e2, 200.e2, 100)
+    >>> Tuni, nuni = walkTmoist(330., puni, full_output=True)
+    >>> Tvuni = cloudTvDiff(Tuni, puni, Tenv, Tdenv)
+    >>> nevals < nuni.sum()
+    True
+    >>> abs(cape(p, Tv) - capefine) < abs(cape(puni, Tvuni) - capefine) < 2.
+    True
+    
+    """
+    haveEnv = interpTenv is not None
+    logp = np.linspace(np.log(press0), np.log(topPress), numStart)
+    press = np.exp(logp)
+    press[0] = press0
+    press[-1] = topPress
+    temp = np.empty(numStart)
+    slope = np.empty(numStart)
+    nevals = 0
+    guess = np.nan
+    for k in range(numStart):
+        temp[k], slope[k], n = warmTmoist(thetae0, press[k], guess)
+        nevals += n
+        if k + 1 < numStart:
+            guess = temp[k] + slope[k]*(press[k+1] - press[k])
+    if haveEnv:
+        TvDiff = cloudTvDiff(temp, press, interpTenv, interpTdEnv)
+    else:
+        TvDiff = None
+    check = np.ones(numStart - 1, bool)
+    while np.any(check) and press.size < maxLevels:
+        i = np.flatnonzero(check)
+        p1, p2 = press[i], press[i+1]
+        h = p2 - p1
+        pm = np.sqrt(p1*p2)
+        #cubic Hermite first guess from the end values and lapse rates
+        u = (pm - p1)/h
+        Tpred = (2*u**3 - 3*u**2 + 1)*temp[i] + (u**3 - 2*u**2 + u)*h*slope[i] \
+                + (3*u**2 - 2*u**3)*temp[i+1] + (u**3 - u**2)*h*slope[i+1]
+        Tm, sm, n = warmTmoist(thetae0, pm, Tpred)
+        nevals += n.sum()
+        #curvature: distance of the midpoint from the chord in log(p)
+        split = np.abs(Tm - 0.5*(temp[i] + temp[i+1])) > tol
+        if haveEnv:
+            dm = cloudTvDiff(Tm, pm, interpTenv, interpTdEnv)
+            d1, d2 = TvDiff[i], TvDiff[i+1]
+            split |= np.abs(dm - 0.5*(d1 + d2)) > tol
+            split |= d1*d2 < 0.
+            TvDiff = np.insert(TvDiff, i + 1, dm)
+        split &= np.abs(h) > 2.*minDp
+        press = np.insert(press, i + 1, pm)
+        temp = np.insert(temp, i + 1, Tm)
+        slope = np.insert(slope, i + 1, sm)
+        #both halves of a split interval are checked again
+        check = np.zeros(press.size - 1, bool)
+        left = i + np.arange(i.size)
+        check[left] = split
+        check[left + 1] = split
+    return press, temp, TvDiff, int(nevals)
+
 def _test():
     import doctest
-    doctest.testmod()
+    from constants import constants as c
+    doctest.testmod(extraglobs={'c': c})
 
 if __name__ == "__main__":
     _test()
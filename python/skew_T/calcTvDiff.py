@@ -8,7 +8,7 @@ from new_thermo import wsat
 from findTmoist import findTmoist
 
 
-def calcTvDiff(press, thetae0, interpTenv, interpTdEnv):
+def calcTvDiff(press, thetae0, interpTenv, interpTdEnv, engine='bracket'):
     """
     
     Calculates the virtual temperature difference between the thetae0
@@ -21,6 +21,8 @@ def calcTvDiff(press, thetae0, interpTenv, interpTdEnv):
     thetae0: equivalent potential temperature of the adiabat (K)
     interpTenv: interpolator for environmental temperature (deg C)
     interpTdEnv: interpolator for environmental dew point temperature (deg C)
+    engine: findTmoist engine, 'bracket' (default), 'walk' (for a 1-d
+            press walked level by level), 'brenth', 'newton' or 'table'
     
     Returns
     - - - - - -
@@ -30,7 +32,29 @@ def calcTvDiff(press, thetae0, interpTenv, interpTdEnv):
    
     """
     
-    Tcloud=findTmoist(thetae0,press)
+    Tcloud=findTmoist(thetae0,press,engine=engine)
+    return cloudTvDiff(Tcloud, press, interpTenv, interpTdEnv)
+
+
+def cloudTvDiff(Tcloud, press, interpTenv, interpTdEnv):
+    """
+    
+    Calculates the virtual temperature difference between cloud air
+    at temperature Tcloud and a given sounding, as in calcTvDiff.
+    
+    Parameters
+    - - - - - -
+    
+    Tcloud: temperature on the moist adiabat (K)
+    press: pressure (Pa)
+    interpTenv: interpolator for environmental temperature (deg C)
+    interpTdEnv: interpolator for environmental dew point temperature (deg C)
+    
+    Returns
+    - - - - - -
+    TvDiff: the virtual temperature difference at pressure press (K).
+    
+    """
     wvcloud=wsat(Tcloud,press)
     Tvcloud=Tcloud*(1. + c.eps*wvcloud)
     Tenv=interpTenv(press*1.e-2) + c.Tc
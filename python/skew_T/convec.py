@@ -4,7 +4,8 @@ import site
 site.addsitedir('C:\Users\Den\mya405\python\\thermlib')
 from constants import constants as c
 from convecSkew import convecSkew
-from new_thermo import thetaep, wsat, tinvert_thetae, convertTempToSkew, LCLfind, Tdfind
+from new_thermo import thetaep, wsat, tinvert_thetae, convertTempToSkew, Tdfind
+from batchLCL import batchLCL
 from findTmoist import findTmoist
 import numpy as np
 import matplotlib.pyplot as plt
@@ -47,19 +48,12 @@ plt.show()
 #print -dpdf initial_sound.pdf
 
 #put on the top and bottom LCLs and the thetae sounding
-Tlcl=np.zeros(numPoints)
-pLCL=np.zeros(numPoints)
-theTheta=np.zeros(numPoints)
-theThetae=np.zeros(numPoints)
-Tpseudo=np.zeros(numPoints)
-wtotal=np.zeros(numPoints)
-for i in range(0, numPoints):
-  wtotal[i]=wsat(Tdew[i] + c.Tc,press[i]*100.);
-  Tlcl[i],pLCL[i]=LCLfind(Tdew[i] + c.Tc,Temp[i]+c.Tc,press[i]*100.)
-  theThetae[i]=thetaep(Tdew[i] + c.Tc,Temp[i] + c.Tc,press[i]*100.)
-  #find the temperature along the pseudo adiabat at press[i]
-  Tpseudo[i]=findTmoist(theThetae[i],press[i]*100.)
-  #no liquid water in sounding
+wtotal=wsat(Tdew + c.Tc,press*100.);
+Tlcl,pLCL,saturated=batchLCL(Temp + c.Tc,press*100.,Td=Tdew + c.Tc)
+theThetae=thetaep(Tdew + c.Tc,Temp + c.Tc,press*100.)
+#find the temperature along the pseudo adiabat at press
+Tpseudo=findTmoist(theThetae,press*100.,engine='newton')
+#no liquid water in sounding
 xplot=convertTempToSkew(Tlcl[0] - c.Tc,pLCL[0]*0.01,skew);
 bot,=plt.plot(xplot,pLCL[0]*0.01,'ro',markersize=12, markerfacecolor ='r')
 xplot=convertTempToSkew(Tlcl[-1] - c.Tc,pLCL[-1]*0.01,skew)
@@ -75,13 +69,12 @@ plt.show()
 
 
 #figure 2: lift cloud base by 50 hPa to 850 hPa 
-for i in range(0,numPoints):
-  press[i]=press[i] - 50
-  #find the temperature along the pseudoadiabats at press[i]
-  Tpseudo[i]=findTmoist(theThetae[i],press[i]*100.)
-  #find the actual temperature and dewpoint
-  Temp[i],wv,wl=tinvert_thetae(theThetae[i],wtotal[i],press[i]*100.)
-  Tdew[i]=Tdfind(wv,press[i]*100.)
+press=press - 50
+#find the temperature along the pseudoadiabats at press
+Tpseudo=findTmoist(theThetae,press*100.,engine='newton')
+#find the actual temperature and dewpoint
+Temp,wv,wl=tinvert_thetae(theThetae,wtotal,press*100.)
+Tdew=Tdfind(wv,press*100.)
 
 plt.figure(2)
 skew, ax = convecSkew(2)
@@ -107,13 +100,12 @@ plt.show()
 
 
 #figure 3: lift cloud base by 1470 Pa to 835.3 hPa
-for i in range(0,numPoints):
-  press[i]=press[i] - 14.7
-  #find the temperature along the pseudoadiabats at press[i]
-  Tpseudo[i]=findTmoist(theThetae[i],press[i]*100.)
-  #find the actual temperature and dewpoint
-  Temp[i],wv,wl=tinvert_thetae(theThetae[i],wtotal[i],press[i]*100.)
-  Tdew[i]=Tdfind(wv,press[i]*100.)
+press=press - 14.7
+#find the temperature along the pseudoadiabats at press
+Tpseudo=findTmoist(theThetae,press*100.,engine='newton')
+#find the actual temperature and dewpoint
+Temp,wv,wl=tinvert_thetae(theThetae,wtotal,press*100.)
+Tdew=Tdfind(wv,press*100.)
 
 plt.figure(3)
 skew, ax = convecSkew(3)
@@ -139,13 +131,12 @@ plt.show()
 
 
 #figure 4: lift cloud base by 10.30 hPa to 825 hPa
-for i in range(0,numPoints):
-  press[i]=press[i] - 10.3
-  #find the temperature along the pseudoadiabats at press[i]
-  Tpseudo[i]=findTmoist(theThetae[i],press[i]*100.)
-  #find the actual temperature and dewpoint
-  Temp[i],wv,wl=tinvert_thetae(theThetae[i],wtotal[i],press[i]*100.)
-  Tdew[i]=Tdfind(wv,press[i]*100.)
+press=press - 10.3
+#find the temperature along the pseudoadiabats at press
+Tpseudo=findTmoist(theThetae,press*100.,engine='newton')
+#find the actual temperature and dewpoint
+Temp,wv,wl=tinvert_thetae(theThetae,wtotal,press*100.)
+Tdew=Tdfind(wv,press*100.)
 
 plt.figure(4)
 skew, ax = convecSkew(4)
@@ -171,13 +162,12 @@ plt.show()
 
 
 #figure 5: lift cloud base by 25 hPa to 800 hPa
-for i in range(0,numPoints):
-  press[i]=press[i] - 25
-  #find the temperature along the pseudoadiabats at press[i]
-  Tpseudo[i]=findTmoist(theThetae[i],press[i]*100.)
-  #find the actual temperature and dewpoint
-  Temp[i],wv,wl=tinvert_thetae(theThetae[i],wtotal[i],press[i]*100.)
-  Tdew[i]=Tdfind(wv,press[i]*100.)
+press=press - 25
+#find the temperature along the pseudoadiabats at press
+Tpseudo=findTmoist(theThetae,press*100.,engine='newton')
+#find the actual temperature and dewpoint
+Temp,wv,wl=tinvert_thetae(theThetae,wtotal,press*100.)
+Tdew=Tdfind(wv,press*100.)
 
 plt.figure(5)
 skew, ax = convecSkew(5)
@@ -203,13 +193,12 @@ plt.show()
 
 
 #figure 6: lift cloud base by 32.25 hPa to 768 hPa
-for i in range(0,numPoints):
-  press[i]=press[i] - 32.25
-  #find the temperature along the pseudoadiabats at press[i]
-  Tpseudo[i]=findTmoist(theThetae[i],press[i]*100.)
-  #find the actual temperature and dewpoint
-  Temp[i],wv,wl=tinvert_thetae(theThetae[i],wtotal[i],press[i]*100.)
-  Tdew[i]=Tdfind(wv,press[i]*100.)
+press=press - 32.25
+#find the temperature along the pseudoadiabats at press
+Tpseudo=findTmoist(theThetae,press*100.,engine='newton')
+#find the actual temperature and dewpoint
+Temp,wv,wl=tinvert_thetae(theThetae,wtotal,press*100.)
+Tdew=Tdfind(wv,press*100.)
 
 plt.figure(6)
 skew, ax = convecSkew(6)
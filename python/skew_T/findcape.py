@@ -77,12 +77,12 @@ ax1.set_yticklabels(labels)
 ax1.set_ybound((400, 1000))
 
 
-calcTvDiffHandle = lambda pVals: calcTvDiff(pVals, thetaeVal, interpTenv, interpTdenv)
 presslevs = np.linspace(400, 950, 100)*1e2
 #reverse the pressure levels so integration can start at p = 950 hPa
 presslevs = presslevs[::-1]
 
-Tvdiff = [calcTvDiffHandle(p) for p in presslevs]
+#walk the adiabat up through all the levels at once
+Tvdiff = calcTvDiff(presslevs, thetaeVal, interpTenv, interpTdenv, engine='walk')
     
 plt.figure(2)
 plt.plot(Tvdiff, presslevs/100)
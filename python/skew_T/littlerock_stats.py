@@ -9,6 +9,7 @@ from convecSkew import convecSkew
 from calcAdiabat import calcAdiabat
 from calcTvDiff import calcTvDiff
 from nudge import nudge
+from batchCape import batchCAPE, parcelCAPE
     
 filename='littlerock.nc';
 print 'reading file: %s\n' %filename
@@ -82,11 +83,11 @@ plt.gca().set_title('littlerock sounding, %s' %var_names[3])
 #plt.gca().legend([p900_adiabat], ['900 hPa moist adiabat'])
 plt.show()
 
-calcTvDiffHandle = lambda pVals: calcTvDiff(pVals, thetaeVal, interpTenv, interpTdenv)
 presslevs = np.linspace(200, press[0], 100)*1e2
 #start integrating from first sounding level
 presslevs = presslevs[::-1]
-Tvdiff = [calcTvDiffHandle(p) for p in presslevs]
+#walk the adiabat up through all the levels at once
+Tvdiff = calcTvDiff(presslevs, thetaeVal, interpTenv, interpTdenv, engine='walk')
     
 plt.figure(3)
 plt.plot(Tvdiff, presslevs/100)
@@ -102,6 +103,19 @@ plt.title('cumulative CAPE (J/kg) vs. pressure (hPa)')
 plt.gca().invert_yaxis()
 plt.show()
 
+#the same parcel on the native sounding levels, with the LFC and EL
+#found exactly and the areas integrated between them
+CAPE, CIN, LFC, EL, wmax = batchCAPE(press*100., temp + c.Tc,
+                                     dewpoint + c.Tc, thetae0=thetaeVal,
+                                     topPress=200.e2, exact=True)
+print 'exact CAPE %10.4f (J/kg), CIN %10.4f (J/kg)' %(CAPE[0], CIN[0])
+print 'LFC %8.2f (hPa), EL %8.2f (hPa)' %(LFC[0]*1.e-2, EL[0]*1.e-2)
+#surface based, most unstable and 100 hPa mixed layer parcels
+parcels = parcelCAPE(press*100., temp + c.Tc, dewpoint + c.Tc,
+                     topPress=200.e2, exact=True)
+for name in ['SB', 'MU', 'ML100']:
+    print '%5s CAPE %10.4f (J/kg)' %(name, parcels[name][0][0])
+
 #equate kinetic and potential energy to get maximum
 #updraft speed
    
@@ -35,16 +35,10 @@ plt.text(xtempB,pressB*0.01,'B', fontweight='bold',fontsize= 22,color='b')
 plt.text(xtempC,pressC*0.01,'C', fontweight='bold',fontsize= 22,color='b')
 
 pressLevs=np.linspace(700,900,60)*100.
-lineAB = np.zeros(pressLevs.size)
-rhoAB = np.zeros(pressLevs.size)
 
 #adiabatic expansion from A to B
-for i in range(0, len(pressLevs)):
-    thePress=pressLevs[i]
-    temp,wv,wl=tinvert_thetae(thetaeA, wtA, thePress)
-    lineAB[i]=temp
-    rho=thePress/(c.Rd*temp)
-    rhoAB[i]=rho
+lineAB,wv,wl=tinvert_thetae(thetaeA, wtA, pressLevs)
+rhoAB=pressLevs/(c.Rd*lineAB)
 
 #isothermal compression from B to C
 rhoBC=pressLevs/(c.Rd*tempB)
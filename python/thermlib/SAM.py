@@ -1,8 +1,6 @@
 #!/usr/bin/env python
 
 import numpy
-import rootfinder
-import scipy.optimize
 from numpy import array
 
 # Definition of thermodynamic constant:
@@ -39,6 +37,17 @@ fac1 = fac_cond + (1 + bp)*fac_fus
 fac2 = fac_fus*ap
 ag = 1./(tgrmax - tgrmin)
 
+# Polynomial fits for the saturation vapor pressures [hPa] and their
+# temperature derivatives, in powers of T - 273.16
+esatw_coef = (6.11239921, 0.443987641, 0.142986287e-1, 0.264847430e-3, 0.302950461e-5,
+              0.206739458e-7, 0.640689451e-10, -0.952447341e-13, -0.976195544e-15)
+dtesatw_coef = (0.443956472, 0.285976452e-1, 0.794747212e-3, 0.121167162e-4, 0.103167413e-6,
+                0.385208005e-9, -0.604119582e-12, -0.792933209e-14, -0.599634321e-17)
+esati_coef = (6.11147274, 0.503160820, 0.188439774e-1, 0.420895665e-3, 0.615021634e-5,
+              0.602588177e-7, 0.385852041e-9, 0.146898966e-11, 0.252751365e-14)
+dtesati_coef = (0.503223089, 0.377174432e-1, 0.126710138e-2, 0.249065913e-4, 0.312668753e-6,
+                0.255653718e-8, 0.132073448e-10, 0.390204672e-13, 0.497275778e-16)
+
 def find_chi_orig(T, Te, qv, qve, qn, p):
 
     chi = 0.2
@@ -194,10 +203,246 @@ def invert_h(h, z, p, q, qp):
 
     return Tabs1, qn
 
+# Work arrays used by invert_h_chunked, one set per call, each as long
+# as a chunk.  Names mirror the variables in invert_h.
+_float_work = ('h', 'z', 'p', 'q', 'qp', 'Tabs', 'Tabs1', 'qn',
+               'om', 'omc', 'dlstarn', 'lstarn', 'omp', 'lstarp', 'dlstarp',
+               'qsatt', 'dqsat', 'qdef', 'fff', 'dfff', 'dTabs',
+               'dT', 'dTw', 'dTc', 'es', 'p_esat', 'tmp1', 'tmp2')
+_bool_work = ('T_gt', 'T_lt', 'low')
+
+def _work_buffers(n, dtype):
+    w = {}
+    for name in _float_work:
+        w[name] = numpy.empty(n, dtype)
+    for name in _bool_work:
+        w[name] = numpy.empty(n, bool)
+    return w
+
+def _poly_inplace(a, dT, out):
+    # a[0] + dT*(a[1] + ... + dT*a[8]) written into out, in the same
+    # order of operations as esatw and friends
+    numpy.multiply(dT, a[8], out=out)
+    for coef in a[7:0:-1]:
+        out += coef
+        out *= dT
+    out += a[0]
+    return out
+
+def _ice_floor_inplace(c, w, out):
+    # Below -88.16 C the ice fits switch to a quadratic, as in esati
+    dTc, tmp, low = w['dTc'], w['tmp1'], w['low']
+    numpy.maximum(w['dT'], -100., out=dTc)
+    numpy.multiply(dTc, c[2], out=tmp)
+    tmp += c[1]
+    tmp *= dTc
+    tmp += c[0]
+    numpy.less(dTc, -88.16, out=low)
+    numpy.copyto(out, tmp, where=low)
+
+def _sat_inplace(T, p, w, deriv=True):
+    # w['qsatt'] = om*qsatw(T, p) + (1-om)*qsati(T, p) and, if deriv,
+    # w['dqsat'] = om*dtqsatw(T, p) + (1-om)*dtqsati(T, p), with om
+    # already in w['om'].  Everything is done in the work arrays.
+    om, omc, es, p_esat = w['om'], w['omc'], w['es'], w['p_esat']
+    numpy.subtract(T, 273.16, out=w['dT'])
+    numpy.maximum(w['dT'], -80., out=w['dTw'])
+    numpy.subtract(1., om, out=omc)
+
+    for coef, dT, weight, out in ((esatw_coef, w['dTw'], om, w['qsatt']),
+                                  (esati_coef, w['dT'], omc, w['tmp2'])):
+        _poly_inplace(coef, dT, es)
+        if coef is esati_coef:
+            _ice_floor_inplace((0.00763685, 0.000151069, 7.48215e-7), w, es)
+        es *= 100.
+        numpy.subtract(p, es, out=p_esat)
+        numpy.maximum(p_esat, es, out=p_esat)
+        numpy.multiply(es, 0.622, out=out)
+        out /= p_esat
+        out *= weight
+    w['qsatt'] += w['tmp2']
+
+    if not deriv:
+        return
+    for coef, dT, weight, out in ((dtesatw_coef, w['dTw'], om, w['dqsat']),
+                                  (dtesati_coef, w['dT'], omc, w['tmp2'])):
+        _poly_inplace(coef, dT, es)
+        if coef is dtesati_coef:
+            _ice_floor_inplace((0.0013186, 2.60269e-5, 1.28676e-7), w, es)
+        es *= 100.
+        numpy.multiply(es, 0.622, out=out)
+        out /= p
+        out *= weight
+    w['dqsat'] += w['tmp2']
+
+def _ramp_inplace(T, a, b, Tmin, Tmax, w, out):
+    # out = a*T - b, set to 1 above Tmax and 0 below Tmin; the masks
+    # are left in w['T_gt'] and w['T_lt']
+    numpy.greater_equal(T, Tmax, out=w['T_gt'])
+    numpy.less_equal(T, Tmin, out=w['T_lt'])
+    numpy.multiply(T, a, out=out)
+    out -= b
+    numpy.copyto(out, 1., where=w['T_gt'])
+    numpy.copyto(out, 0., where=w['T_lt'])
+
+def _invert_h_points(w, niter=10):
+    # Newton iteration of invert_h on the saturated points already
+    # packed into the front of the work arrays
+    Tabs, Tabs1, p, q, qp = w['Tabs'], w['Tabs1'], w['p'], w['q'], w['qp']
+    qsatt, dqsat, qdef = w['qsatt'], w['dqsat'], w['qdef']
+    fff, dfff, dTabs, tmp = w['fff'], w['dfff'], w['dTabs'], w['tmp1']
+    for i in range(niter):
+        _ramp_inplace(Tabs1, an, bn, tbgmin, tbgmax, w, w['om'])
+        dlstarn = w['dlstarn']
+        dlstarn.fill(an*fac_fus)
+        numpy.copyto(dlstarn, 0., where=w['T_gt'])
+        numpy.copyto(dlstarn, 0., where=w['T_lt'])
+
+        lstarn = w['lstarn']
+        numpy.multiply(w['om'], fac_cond, out=lstarn)
+        numpy.subtract(1., w['om'], out=tmp)
+        tmp *= fac_sub
+        lstarn += tmp
+
+        _sat_inplace(Tabs1, p, w)
+
+        _ramp_inplace(Tabs1, ap, bp, tprmin, tprmax, w, w['omp'])
+        lstarp = w['lstarp']
+        numpy.multiply(w['omp'], fac_cond, out=lstarp)
+        numpy.subtract(1., w['omp'], out=tmp)
+        tmp *= fac_sub
+        lstarp += tmp
+
+        dlstarp = w['dlstarp']
+        dlstarp.fill(ap*fac_fus)
+        numpy.copyto(dlstarp, 0., where=w['T_gt'])
+        numpy.copyto(dlstarp, 0., where=w['T_lt'])
+
+        # fff = Tabs - Tabs1 + lstarn*(q-qsatt) + lstarp*qp
+        numpy.subtract(q, qsatt, out=qdef)
+        numpy.subtract(Tabs, Tabs1, out=fff)
+        numpy.multiply(lstarn, qdef, out=tmp)
+        fff += tmp
+        numpy.multiply(lstarp, qp, out=tmp)
+        fff += tmp
+        # dfff = dlstarn*(q-qsatt) + dlstarp*qp - lstarn*dqsat - 1.
+        numpy.multiply(dlstarn, qdef, out=dfff)
+        numpy.multiply(dlstarp, qp, out=tmp)
+        dfff += tmp
+        numpy.multiply(lstarn, dqsat, out=tmp)
+        dfff -= tmp
+        dfff -= 1.
+
+        numpy.negative(fff, out=dTabs)
+        dTabs /= dfff
+        Tabs1 += dTabs
+
+    numpy.multiply(dqsat, dTabs, out=tmp)
+    qsatt += tmp
+    qn = w['qn']
+    numpy.subtract(q, qsatt, out=qn)
+    numpy.less(qn, 0., out=w['low'])
+    numpy.copyto(qn, 0., where=w['low'])
+
+def invert_h_chunked(h, z, p, q, qp, chunk=65536, dtype=numpy.float64):
+    """
+    Same answer as invert_h(h, z, p, q, qp), for fields too big to
+    invert in one piece.
+
+    The broadcast fields are worked through in slabs of whole levels
+    along the first axis (z in SAM output), about 'chunk' points at a
+    time, using one set of work arrays for every slab.  Only the
+    points that start out saturated go through the Newton iteration.
+    Pass dtype=numpy.float32 to halve the memory of the outputs and
+    work arrays.
+
+    >>> T = numpy.linspace(230., 310., 60).reshape(3, 4, 5)
+    >>> z = numpy.array([200., 1500., 4000.])[:, None, None]
+    >>> p = numpy.array([9.8e4, 8.5e4, 6.2e4])[:, None, None]
+    >>> q = qsatw(T, p) * numpy.linspace(0.8, 1.2, 20).reshape(4, 5)
+    >>> qp = numpy.where(T > 270., 1.e-4, 0.)
+    >>> hh = cp*T + g*z
+    >>> T1, qn1 = invert_h(hh, z, p, q, qp)
+    >>> T2, qn2 = invert_h_chunked(hh, z, p, q, qp, chunk=7)
+    >>> numpy.array_equal(T1, T2), numpy.array_equal(qn1, qn2)
+    (True, True)
+    >>> T3, qn3 = invert_h_chunked(hh, z, p, q, qp, dtype=numpy.float32)
+    >>> T3.dtype, numpy.allclose(T3, T1, atol=1.e-3)
+    (dtype('float32'), True)
+    """
+    fields = numpy.broadcast_arrays(h, z, p, q, qp)
+    shape = fields[0].shape
+    if len(shape) == 0:
+        fields = [x.reshape(1) for x in fields]
+    nz = fields[0].shape[0]
+    level = fields[0][0].size
+    rows = max(1, chunk // max(level, 1))
+
+    Tabs1_out = numpy.empty(fields[0].shape, dtype)
+    qn_out = numpy.empty(fields[0].shape, dtype)
+    w = _work_buffers(rows*level, dtype)
+
+    for k0 in range(0, nz, rows):
+        k1 = min(k0 + rows, nz)
+        n = (k1 - k0)*level
+        slab = dict((name, buf[:n]) for name, buf in w.items())
+        for name, x in zip(('h', 'z', 'p', 'q', 'qp'), fields):
+            numpy.copyto(slab[name].reshape(x[k0:k1].shape), x[k0:k1],
+                         casting='unsafe')
+        Tabs, Tabs1, qp_s = slab['Tabs'], slab['Tabs1'], slab['qp']
+        T_out = Tabs1_out[k0:k1].reshape(-1)
+        qn = qn_out[k0:k1].reshape(-1)
+
+        # First guess, for every point in the slab
+        numpy.multiply(slab['z'], g, out=Tabs)
+        numpy.subtract(slab['h'], Tabs, out=Tabs)
+        Tabs /= cp
+        tmp1, tmp2 = slab['tmp1'], slab['tmp2']
+        numpy.multiply(qp_s, fac1, out=tmp1)
+        tmp1 += Tabs
+        numpy.multiply(qp_s, fac2, out=tmp2)
+        tmp2 += 1.
+        numpy.divide(tmp1, tmp2, out=Tabs1)
+
+        T_gt, T_lt = slab['T_gt'], slab['T_lt']
+        numpy.greater_equal(Tabs1, tbgmax, out=T_gt)
+        numpy.less_equal(Tabs1, tbgmin, out=T_lt)
+        numpy.multiply(qp_s, fac_cond, out=tmp1)
+        tmp1 += Tabs
+        numpy.copyto(Tabs1, tmp1, where=T_gt)
+        numpy.multiply(qp_s, fac_sub, out=tmp1)
+        tmp1 += Tabs
+        numpy.copyto(Tabs1, tmp1, where=T_lt)
+
+        om = slab['om']
+        numpy.multiply(Tabs1, an, out=om)
+        om -= bn
+        numpy.copyto(om, 1., where=T_gt)
+        numpy.copyto(om, 0., where=T_lt)
+
+        _sat_inplace(Tabs1, slab['p'], slab, deriv=False)
+        numpy.subtract(slab['q'], slab['qsatt'], out=qn)
+        T_out[...] = Tabs1
+
+        # Iterate only the saturated points, packed to the front
+        sat = numpy.flatnonzero(qn > 0)
+        numpy.copyto(slab['low'], qn < 0)
+        numpy.copyto(qn, 0., where=slab['low'])
+        if sat.size == 0:
+            continue
+        m = sat.size
+        points = dict((name, buf[:m]) for name, buf in w.items())
+        for name in ('Tabs', 'Tabs1', 'p', 'q', 'qp'):
+            points[name][...] = slab[name][sat]
+        _invert_h_points(points)
+        T_out[sat] = points['Tabs1']
+        qn[sat] = points['qn']
+
+    return Tabs1_out.reshape(shape), qn_out.reshape(shape)
+
 def esatw(T):
     # Saturation vapor [Pa]
-    a = (6.11239921, 0.443987641, 0.142986287e-1, 0.264847430e-3, 0.302950461e-5,
-         0.206739458e-7, 0.640689451e-10, -0.952447341e-13, -0.976195544e-15)
+    a = esatw_coef
     dT = T-273.16
     dT[dT<-80.] = -80.
     return (a[0] + dT*(a[1] + dT*(a[2] + dT*(a[3] + dT*(a[4] + dT*(a[5] + dT*(a[6] + dT*(a[7] + dT*a[8]))))))))*100.
@@ -209,8 +454,7 @@ def qsatw(T, p):
     return 0.622 * esat/p_esat
 
 def dtesatw(T):
-    a = (0.443956472, 0.285976452e-1, 0.794747212e-3, 0.121167162e-4, 0.103167413e-6,
-         0.385208005e-9, -0.604119582e-12, -0.792933209e-14, -0.599634321e-17)
+    a = dtesatw_coef
     dT = T-273.16
     dT[dT<-80.] = -80.
     return (a[0] + dT*(a[1] + dT*(a[2] + dT*(a[3] + dT*(a[4] + dT*(a[5] + dT*(a[6] + dT*(a[7] + dT*a[8]))))))))*100.
@@ -219,8 +463,7 @@ def dtqsatw(T, p):
     return 0.622*dtesatw(T)/p
 
 def esati(T):
-    a = (6.11147274, 0.503160820, 0.188439774e-1, 0.420895665e-3, 0.615021634e-5,
-         0.602588177e-7, 0.385852041e-9, 0.146898966e-11, 0.252751365e-14)
+    a = esati_coef
     dT = T-273.16
     answer = a[0] + dT*(a[1] + dT*(a[2] + dT*(a[3] + dT*(a[4] + dT*(a[5] + dT*(a[6] + dT*(a[7] + dT*a[8])))))))
     dT[dT<-100.] = -100.
@@ -234,8 +477,7 @@ def qsati(T, p):
     return 0.622 * esat/p_esat
         
 def dtesati(T):
-    a = (0.503223089, 0.377174432e-1, 0.126710138e-2, 0.249065913e-4, 0.312668753e-6,
-         0.255653718e-8, 0.132073448e-10, 0.390204672e-13, 0.497275778e-16)
+    a = dtesati_coef
     dT = T-273.16
     answer = a[0] + dT*(a[1] + dT*(a[2] + dT*(a[3] + dT*(a[4] + dT*(a[5] + dT*(a[6] + dT*(a[7] + dT*a[8])))))))
     dT[dT<-100.] = -100.
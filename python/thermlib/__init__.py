@@ -1,6 +1,8 @@
 #!/usr/bin/env python27
 
+# Importing the package only costs numpy: matplotlib is left to the
+# plotting modules, and the scipy-backed solvers import scipy on
+# first use.
 from thermo import *
 
 __all__ = ['thermo',]
-
@@ -0,0 +1,202 @@
+"""This is the docstring for the adiabatTable.py module. This module
+contains three functions: makeAdiabatTable, loadAdiabatTable and
+tableTmoist.  Together they provide the table-backed 'table' engine
+for findTmoist."""
+
+import os
+
+import numpy as np
+
+from findTmoist import newtonTmoist
+
+tableFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'moist_adiabat_table.npz')
+
+#splines already read from disk, keyed by filename
+_tableCache = {}
+
+def makeAdiabatTable(filename=None, thetaeLims=(250., 365.),
+                     pressLims=(1.e4, 1.05e5), numThetae=231,
+                     numPress=241):
+    """
+    makeAdiabatTable(filename=None, thetaeLims=(250., 365.),
+                     pressLims=(1.e4, 1.05e5), numThetae=231,
+                     numPress=241)
+
+    Solves for the moist adiabat temperature on a regular grid of
+    thetae and log(pressure) and saves it as a compressed .npz file.
+
+    Parameters
+    - - - - - -
+    filename : str, optional
+        Output file, defaults to 'tableFile' next to this module.
+    thetaeLims : tuple, optional
+        Smallest and largest thetae in the table (K).
+    pressLims : tuple, optional
+        Smallest and largest pressure in the table (Pa).
+    numThetae, numPress : int, optional
+        Number of grid points along each axis.
+
+    Returns
+    - - - -
+    table : dict
+        'thetae' (K), 'logp' (log Pa) and 'Temp' (K), as written
+        to 'filename'.
+
+    Raises
+    - - - -
+    ValueError
+        If a grid point has no moist adiabat between 50 K and 400 K.
+
+    Notes
+    - - -
+    Above about 365 K the 0.060 kg/kg cap in wsat makes thetaes
+    non-monotonic near 1000 hPa, so the default table stops there.
+    The file is written under a temporary name in the same directory
+    and renamed into place, so another process never reads a half
+    written table.
+
+    """
+    if filename is None:
+        filename = tableFile
+    table = _solveTable(thetaeLims, pressLims, numThetae, numPress)
+    _saveTable(filename, table)
+    return table
+
+
+def _solveTable(thetaeLims=(250., 365.), pressLims=(1.e4, 1.05e5),
+                numThetae=231, numPress=241):
+    # the table of makeAdiabatTable, without writing it
+    thetae = np.linspace(thetaeLims[0], thetaeLims[1], numThetae)
+    logp = np.linspace(np.log(pressLims[0]), np.log(pressLims[1]),
+                       numPress)
+    Temp = newtonTmoist(thetae[:, np.newaxis], np.exp(logp)[np.newaxis, :])
+    if np.any(np.isnan(Temp)):
+        raise ValueError('table limits leave the 50-400 K bracket')
+    return {'thetae': thetae, 'logp': logp,
+            'Temp': Temp.astype(np.float32)}
+
+
+def _saveTable(filename, table):
+    # write under a temporary name, then rename, as in
+    # entrain_sweep._cell_task
+    partial = filename + '.%d.part' % os.getpid()
+    try:
+        with open(partial, 'wb') as f:
+            np.savez_compressed(f, **table)
+        os.rename(partial, filename)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    _tableCache.pop(filename, None)
+
+
+def loadAdiabatTable(filename=None):
+    """
+    loadAdiabatTable(filename=None)
+
+    Returns the bicubic spline for the table in 'filename', building
+    the table first if the file does not exist yet.  If the file
+    can't be written there (e.g. a read-only install) the table is
+    kept in memory only.  Splines are cached, so the file is only
+    read once per process.
+
+    Parameters
+    - - - - - -
+    filename : str, optional
+        Table file, defaults to 'tableFile' next to this module.
+
+    Returns
+    - - - -
+    spline : scipy.interpolate.RectBivariateSpline
+        Temperature (K) as a function of (thetae, log(pressure)).
+
+    """
+    if filename is None:
+        filename = tableFile
+    try:
+        return _tableCache[filename]
+    except KeyError:
+        pass
+    from scipy import interpolate
+
+    if os.path.exists(filename):
+        saved = np.load(filename)
+        try:
+            table = dict((name, saved[name])
+                         for name in ('thetae', 'logp', 'Temp'))
+        finally:
+            saved.close()
+    else:
+        table = _solveTable()
+        try:
+            _saveTable(filename, table)
+        except (IOError, OSError):
+            pass
+    spline = interpolate.RectBivariateSpline(table['thetae'],
+                                             table['logp'],
+                                             table['Temp'].astype(float),
+                                             kx=3, ky=3)
+    _tableCache[filename] = spline
+    return spline
+
+
+def tableTmoist(thetaE0, press, filename=None):
+    """
+    tableTmoist(thetaE0, press, filename=None)
+
+    Calculates the temperatures along moist adiabats by bicubic
+    interpolation in a precomputed (thetae, log p) table.
+
+    Parameters
+    - - - - - -
+    thetaE0 : float or array_like
+        Equivalent potential temperature (K).
+    press : float or array_like
+        Pressure (Pa). Broadcast against 'thetaE0'.
+    filename : str, optional
+        Table file, see loadAdiabatTable.
+
+    Returns
+    - - - -
+    Temp : float or ndarray
+        Temperature (K) with the broadcast shape of the inputs.
+
+    Notes
+    - - -
+    With the default grid (0.5 K in thetae, 241 levels in log p
+    between 100 and 1050 hPa) the interpolated temperature is within
+    1.e-4 K of newtonTmoist everywhere inside the table.  Points
+    outside the table are handed to newtonTmoist.
+
+    Examples
+    - - - - -
+    >>> abs(tableTmoist(300., 8.e4) - 270.5959084197) < 1.e-4
+    True
+    >>> tableTmoist([300., 330.], 8.e4).shape
+    (2,)
+
+    """
+    spline = loadAdiabatTable(filename)
+    thetaE0, press = np.broadcast_arrays(np.asarray(thetaE0, dtype=float),
+                                         np.asarray(press, dtype=float))
+    logp = np.log(press)
+    thetaeKnots, logpKnots = spline.get_knots()
+    inside = (thetaE0 >= thetaeKnots[0]) & (thetaE0 <= thetaeKnots[-1]) \
+             & (logp >= logpKnots[0]) & (logp <= logpKnots[-1])
+    Temp = np.empty(thetaE0.shape)
+    Temp[inside] = spline.ev(thetaE0[inside], logp[inside])
+    outside = ~inside
+    if np.any(outside):
+        Temp[outside] = newtonTmoist(thetaE0[outside], press[outside])
+    if Temp.ndim == 0:
+        Temp = Temp[()]
+    return Temp
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,642 @@
+"""This is the docstring for the batchCape.py module. This module
+contains readSoundings, padSoundings and batchCAPE, which find CAPE,
+CIN, LFC, EL and the maximum updraft speed for whole stacks of
+soundings at once, layerBuoyancy, the parcel buoyancy inside a layer
+of a sounding, and selectParcels and parcelCAPE, which pick surface
+based, most unstable and mixed layer parcels and lift them."""
+
+import numpy as np
+
+from constants import constants as c
+from rootfinder import fzero_bracket
+from new_thermo import wsat, thetaep, theta, invtheta, Tdfind
+from findTmoist import thetaEchange, warmTmoist
+
+def padSoundings(soundings, pad=np.nan):
+    """
+    padSoundings(soundings, pad=np.nan)
+
+    Stacks soundings with different numbers of levels into one array.
+
+    Parameters
+    - - - - - -
+    soundings : sequence of array_like
+        Soundings of shape (nlev, ncols), levels along the first axis.
+    pad : float, optional
+        Value for the levels past the end of the shorter soundings.
+
+    Returns
+    - - - -
+    stack : ndarray
+        Array of shape (nsound, max nlev, ncols).
+
+    Examples
+    - - - - -
+    >>> padSoundings([np.ones((2, 3)), np.ones((1, 3))])[:, :, 0]
+    array([[ 1.,  1.],
+           [ 1., nan]])
+
+    """
+    soundings = [np.asarray(s, dtype=float) for s in soundings]
+    nlev = max(s.shape[0] for s in soundings)
+    stack = np.empty((len(soundings), nlev) + soundings[0].shape[1:])
+    stack.fill(pad)
+    for i, s in enumerate(soundings):
+        stack[i, :s.shape[0]] = s
+    return stack
+
+
+def readSoundings(filename):
+    """
+    readSoundings(filename)
+
+    Reads every sounding in a netCDF file written like littlerock.nc
+    or soundings.nc, one variable per sounding with the columns named
+    in the 'col_names' attribute.
+
+    Parameters
+    - - - - - -
+    filename : str
+        Name of the netCDF file.
+
+    Returns
+    - - - -
+    names : list of str
+        Variable name of every sounding.
+    press, temp, dewpt : ndarray
+        Pressure (Pa), temperature (K) and dewpoint (K), shape
+        (nsound, nlev), padded with nan, as taken by batchCAPE.
+
+    """
+    from netCDF4 import Dataset
+
+    nc_file = Dataset(filename)
+    try:
+        cols = [name.strip() for name in nc_file.col_names.split(',')]
+        names = [str(name) for name in nc_file.variables.keys()]
+        stack = padSoundings([np.ma.filled(var[:].astype(float), np.nan)
+                              for var in nc_file.variables.values()])
+    finally:
+        nc_file.close()
+    press = stack[:, :, cols.index('press')] * 100.
+    temp = stack[:, :, cols.index('temp')] + c.Tc
+    dewpt = stack[:, :, cols.index('dewpt')] + c.Tc
+    return names, press, temp, dewpt
+
+
+def batchCAPE(press, temp, dewpt, startLevel=0, thetae0=None,
+              topPress=None, exact=False, nodes=5, full_output=False):
+    """
+    batchCAPE(press, temp, dewpt, startLevel=0, thetae0=None,
+              topPress=None, exact=False, nodes=5, full_output=False)
+
+    Lifts a parcel along the moist adiabat through every sounding of a
+    stack at once and integrates its buoyancy between the sounding
+    levels.
+
+    Parameters
+    - - - - - -
+    press : array_like
+        Pressure (Pa), shape (nsound, nlev), decreasing along each
+        sounding.  Missing levels and padding are nan.
+    temp, dewpt : array_like
+        Temperature and dewpoint (K), same shape as 'press'.
+    startLevel : int or array_like, optional
+        Level index of the parcel in every sounding, default the
+        lowest level.
+    thetae0 : float or array_like, optional
+        Equivalent potential temperature (K) of every parcel.  Defaults
+        to thetaep at 'startLevel'.
+    topPress : float, optional
+        Stop the integration at this pressure (Pa), default the top of
+        each sounding.
+    exact : bool, optional
+        If False (default) the buoyancy is taken as linear in log(p)
+        between levels.  If True the sounding is taken as linear in
+        log(p) between levels, the parcel follows the exact moist
+        adiabat, every crossing of zero buoyancy is found by root
+        finding, and the buoyancy is integrated between crossings by
+        Gauss-Legendre quadrature, see 'layerBuoyancy'.
+    nodes : int, optional
+        Number of Gauss-Legendre nodes per layer when 'exact'.  The
+        nodes are also where crossings inside a layer are looked for,
+        so two crossings closer together than the node spacing are
+        missed.
+    full_output : bool, optional
+        If True also return the positive and negative areas.
+
+    Returns
+    - - - -
+    CAPE : ndarray
+        Area (J/kg) between the level of free convection and the
+        equilibrium level, 0 if the parcel is never buoyant.
+    CIN : ndarray
+        Negative area (J/kg) below the level of free convection.
+    LFC : ndarray
+        Pressure (Pa) where the parcel first becomes buoyant, nan if it
+        never does.
+    EL : ndarray
+        Pressure (Pa) where the parcel is buoyant for the last time, or
+        the top of the integration if it is buoyant there.
+    wmax : ndarray
+        Maximum updraft speed (m/s), sqrt(2*area) for the largest area
+        accumulated above the level of free convection.
+    POS, NEG : ndarray
+        Only if 'full_output'.  Total positive and negative areas
+        (J/kg) of the whole column above the parcel.
+
+    Notes
+    - - -
+    The parcel follows the thetae0 pseudo adiabat from 'startLevel'
+    and its virtual temperature difference with the sounding is
+    found, as in skew_T/calcTvDiff.py, on every level of every
+    sounding in a single call to rootfinder.fzero_bracket.  The
+    difference is taken as linear in log(p) between levels, so the
+    crossings and the areas on either side of them are exact for
+    that profile.  With 'exact' the parcel curvature between levels
+    is kept too, so coarse native levels give the CAPE of a finely
+    interpolated sounding.  See bench_cape.py for the throughput.
+
+    Examples
+    - - - - -
+    >>> press = np.array([[1000., 900., 800., 700., 500., 300., 200.],
+    ...                   [1000., 850., 700., 500., 200., np.nan, np.nan]])
+    >>> temp = np.array([[28., 20., 14., 8., -8., -32., -52.],
+    ...                  [10., 2., -6., -20., -60., np.nan, np.nan]])
+    >>> press, temp = press*100., temp + c.Tc
+    >>> dewpt = temp - 4.
+    >>> CAPE, CIN, LFC, EL, wmax = batchCAPE(press, temp, dewpt)
+    >>> print '%.2f %.2f %.1f %.1f %.3f' % (CAPE[0], CIN[0], LFC[0], EL[0],
+    ...                                     wmax[0])
+    2871.82 -22.43 94517.3 20000.0 75.787
+    >>> CAPE[1], CIN[1], np.isnan(LFC[1])
+    (0.0, 0.0, True)
+
+    The first sounding has only seven levels, so the linear buoyancy
+    misses the curvature of the adiabat; the exact integral matches
+    the sounding interpolated onto 40000 levels:
+
+    >>> out = batchCAPE(press, temp, dewpt, exact=True, full_output=True)
+    >>> print '%.2f %.2f %.1f %.1f %.2f %.2f' % tuple(x[0] for x in out[:6])
+    2990.23 -21.76 94632.7 20000.0 77.33 2990.23
+    >>> lp = np.linspace(np.log(1.e5), np.log(2.e4), 40000)
+    >>> fine = [np.exp(lp)] + [np.interp(-lp, -np.log(press[0]), x[0])
+    ...                        for x in (temp, dewpt)]
+    >>> print '%.2f' % batchCAPE(*fine)[0]
+    2990.23
+
+    """
+    press, temp, dewpt = [np.array(x, dtype=float, ndmin=2)
+                          for x in (press, temp, dewpt)]
+    nsound, nlev = press.shape
+    rows = np.arange(nsound)
+    start = np.empty(nsound, int)
+    start[:] = startLevel
+    if thetae0 is None:
+        thetae0 = thetaep(dewpt[rows, start], temp[rows, start],
+                          press[rows, start])
+    theta0 = np.empty(nsound)
+    theta0[:] = thetae0
+
+    level = np.arange(nlev)
+    valid, press, temp, dewpt = _packLevels(press, temp, dewpt,
+                                            level >= start[:, None],
+                                            topPress)
+
+    Tcloud = np.empty_like(press)
+    Tcloud.fill(np.nan)
+    Tcloud[valid] = fzero_bracket(thetaEchange, 50., 400.,
+                                  np.broadcast_to(theta0[:, None],
+                                                  press.shape)[valid],
+                                  press[valid])
+    Tvdiff = np.empty_like(press)
+    Tvdiff.fill(np.nan)
+    Tvcloud = Tcloud[valid]*(1. + c.eps*wsat(Tcloud[valid], press[valid]))
+    Tvenv = temp[valid]*(1. + c.eps*wsat(dewpt[valid], press[valid]))
+    Tvdiff[valid] = Tvcloud - Tvenv
+    if exact:
+        out = _exactCAPE(press, temp, dewpt, Tcloud, Tvdiff, valid, theta0,
+                         nodes)
+        if full_output:
+            return out
+        return out[:5]
+
+    # areas on either side of zero for every layer, J/kg
+    b1 = Tvdiff[:, :-1]
+    b2 = Tvdiff[:, 1:]
+    layer = _layers(valid, press)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        logp = np.log(press)
+        width = np.where(layer, logp[:, :-1] - logp[:, 1:], 0.)
+        b1 = np.where(layer, b1, 0.)
+        b2 = np.where(layer, b2, 0.)
+        cross = b1*b2 < 0.
+        span = np.where(cross, np.abs(b1 - b2), 1.)
+        pos = np.where(cross, np.maximum(b1, b2)**2/(2.*span),
+                       0.5*(np.maximum(b1, 0.) + np.maximum(b2, 0.)))
+        neg = np.where(cross, -np.minimum(b1, b2)**2/(2.*span),
+                       0.5*(np.minimum(b1, 0.) + np.minimum(b2, 0.)))
+        pos *= c.Rd*width
+        neg *= c.Rd*width
+        frac = np.where(b1 != b2, b1/(b1 - b2), 0.)
+        pcross = np.exp(logp[:, :-1] - frac*width)
+    up = layer & (b1 <= 0.) & (b2 > 0.)
+    down = layer & (b1 > 0.) & (b2 <= 0.)
+
+    # layer index of the LFC and EL crossings; -1 means the parcel is
+    # buoyant at its starting level, nlev - 1 that it is still
+    # buoyant at the top
+    nlayer = nlev - 1
+    buoyant0 = Tvdiff[:, 0] > 0.
+    haveUp = up.any(axis=1)
+    iLFC = np.where(buoyant0, -1, np.argmax(up, axis=1))
+    free = buoyant0 | haveUp
+    laye = np.arange(nlayer)
+    down &= laye > iLFC[:, None]
+    haveDown = down.any(axis=1)
+    iEL = np.where(haveDown, nlayer - 1 - np.argmax(down[:, ::-1], axis=1),
+                   nlayer)
+
+    inside = (laye > iLFC[:, None]) & (laye < iEL[:, None])
+    ends = (laye == iLFC[:, None]) | (laye == iEL[:, None])
+    area = np.where(inside, pos + neg, 0.) + np.where(ends, pos, 0.)
+    area[~free] = 0.
+    cumArea = np.cumsum(area, axis=1)
+    CAPE = cumArea[:, -1] if nlayer > 0 else np.zeros(nsound)
+    wmax = np.sqrt(2.*np.maximum(cumArea.max(axis=1), 0.)) \
+           if nlayer > 0 else np.zeros(nsound)
+    below = (laye < iLFC[:, None]) | (laye == iLFC[:, None])
+    CIN = np.where(free, np.where(below, neg, 0.).sum(axis=1), 0.)
+
+    LFC = np.empty(nsound)
+    LFC.fill(np.nan)
+    LFC[buoyant0] = press[buoyant0, 0]
+    hit = ~buoyant0 & haveUp
+    LFC[hit] = pcross[hit, iLFC[hit]]
+    EL = np.empty(nsound)
+    EL.fill(np.nan)
+    hit = free & haveDown
+    EL[hit] = pcross[hit, iEL[hit]]
+    hit = free & ~haveDown
+    ntop = valid.sum(axis=1) - 1
+    EL[hit] = press[hit, ntop[hit]]
+    if full_output:
+        return CAPE, CIN, LFC, EL, wmax, pos.sum(axis=1), neg.sum(axis=1)
+    return CAPE, CIN, LFC, EL, wmax
+
+
+def _packLevels(press, temp, dewpt, keep=True, topPress=None):
+    # move the usable levels to the front of every row, so each
+    # sounding is one unbroken run of levels, and flag them
+    valid = np.isfinite(press) & np.isfinite(temp) & np.isfinite(dewpt) \
+            & keep
+    if topPress is not None:
+        with np.errstate(invalid='ignore'):
+            valid &= press >= topPress
+    order = np.argsort(~valid, axis=1, kind='mergesort')
+    return [np.take_along_axis(x, order, axis=1)
+            for x in (valid, press, temp, dewpt)]
+
+
+def _layers(valid, press):
+    # layers between neighbouring usable levels; a layer whose
+    # pressure does not fall, such as a repeated level moved by
+    # skew_T/nudge.py, has no depth and is left out
+    with np.errstate(invalid='ignore'):
+        return valid[:, :-1] & valid[:, 1:] & (press[:, 1:] < press[:, :-1])
+
+
+def layerBuoyancy(x, logp1, dlogp, T1, dT, Td1, dTd, thetae0, Tcloud1,
+                  dTcloud):
+    """
+    layerBuoyancy(x, logp1, dlogp, T1, dT, Td1, dTd, thetae0, Tcloud1,
+                  dTcloud)
+
+    Virtual temperature difference (K) between the thetae0 moist
+    adiabat and a sounding layer that is linear in log(p), at the
+    fraction x of the way up the layer.
+
+    Parameters
+    - - - - - -
+    x : float or array_like
+        Position in the layer, 0 at the bottom and 1 at the top.
+    logp1, dlogp : float or array_like
+        log of the bottom pressure (Pa), and its change across the layer.
+    T1, dT, Td1, dTd : float or array_like
+        Temperature and dewpoint (K) at the bottom, and their changes
+        across the layer.
+    thetae0 : float or array_like
+        Equivalent potential temperature (K) of the parcel.
+    Tcloud1, dTcloud : float or array_like
+        Parcel temperature (K) at the bottom and its change across the
+        layer, for the first guess handed to findTmoist.warmTmoist.
+
+    All arguments are broadcast against each other.
+    """
+    press = np.exp(logp1 + x*dlogp)
+    Tcloud = warmTmoist(thetae0, press, Tcloud1 + x*dTcloud)[0]
+    Tenv = T1 + x*dT
+    Tdenv = Td1 + x*dTd
+    return Tcloud*(1. + c.eps*wsat(Tcloud, press)) \
+           - Tenv*(1. + c.eps*wsat(Tdenv, press))
+
+
+def _exactCAPE(press, temp, dewpt, Tcloud, Tvdiff, valid, theta0, nodes):
+    # batchCAPE with exact=True, on the compacted levels: split every
+    # layer at its buoyancy crossings and integrate each piece by
+    # Gauss-Legendre quadrature
+    nsound = press.shape[0]
+    xg, wg = np.polynomial.legendre.leggauss(nodes)
+    xg = 0.5*(xg + 1.)
+    wg = 0.5*wg
+
+    layer = _layers(valid, press)
+    sL, jL = np.nonzero(layer)
+    logp = np.log(np.where(valid, press, 1.))
+    def across(x):
+        return x[sL, jL], x[sL, jL + 1] - x[sL, jL]
+    lp1, dlp = across(logp)
+    T1, dT = across(temp)
+    Td1, dTd = across(dewpt)
+    Tc1, dTc = across(Tcloud)
+    args = (lp1, dlp, T1, dT, Td1, dTd, theta0[sL], Tc1, dTc)
+    def buoyancy(x, L):
+        # layerBuoyancy at x for the layers L, x of shape L.shape + (n,)
+        return layerBuoyancy(x, *[a[L][:, None] for a in args])
+
+    # buoyancy at the bottom, the nodes and the top of every layer
+    allL = np.arange(sL.size)
+    samples = np.empty((sL.size, nodes + 2))
+    samples[:, 0] = Tvdiff[sL, jL]
+    samples[:, -1] = Tvdiff[sL, jL + 1]
+    samples[:, 1:-1] = buoyancy(xg[None, :], allL)
+    xs = np.concatenate(([0.], xg, [1.]))
+
+    # crossings between neighbouring samples, found by root finding
+    up = samples > 0.
+    cL, cK = np.nonzero(up[:, 1:] != up[:, :-1])
+    roots = fzero_bracket(layerBuoyancy, xs[cK], xs[cK + 1],
+                          *[a[cL] for a in args], xtol=1.e-12)
+
+    # pieces between crossings, in order up every sounding
+    edgeL = np.concatenate((allL, allL, cL))
+    edgeX = np.concatenate((np.zeros(sL.size), np.ones(sL.size), roots))
+    order = np.lexsort((edgeX, edgeL))
+    edgeL, edgeX = edgeL[order], edgeX[order]
+    same = edgeL[1:] == edgeL[:-1]
+    pL = edgeL[:-1][same]
+    xa = edgeX[:-1][same]
+    xb = edgeX[1:][same]
+
+    # whole layers reuse the samples at the nodes
+    values = np.empty((pL.size, nodes))
+    whole = (xa == 0.) & (xb == 1.)
+    values[whole] = samples[pL[whole], 1:-1]
+    part = ~whole
+    values[part] = buoyancy(xa[part, None] + (xb - xa)[part, None]*xg,
+                            pL[part])
+    area = -c.Rd*dlp[pL]*(xb - xa)*np.dot(values, wg)
+
+    # per sounding: the first and last buoyant piece bound the LFC
+    # and EL
+    ps = sL[pL]
+    index = np.arange(pL.size)
+    buoyant = area > 0.
+    first = np.empty(nsound, int)
+    first.fill(pL.size)
+    last = np.empty(nsound, int)
+    last.fill(-1)
+    np.minimum.at(first, ps[buoyant], index[buoyant])
+    np.maximum.at(last, ps[buoyant], index[buoyant])
+    free = last >= 0
+    inside = (index >= first[ps]) & (index <= last[ps])
+    below = index < first[ps]
+
+    CAPE = np.bincount(ps, np.where(inside, area, 0.), nsound)
+    CIN = np.bincount(ps, np.where(below & free[ps], area, 0.), nsound)
+    POS = np.bincount(ps, np.maximum(area, 0.), nsound)
+    NEG = np.bincount(ps, np.minimum(area, 0.), nsound)
+    cumArea = np.cumsum(np.where(inside, area, 0.))
+    start = np.searchsorted(ps, np.arange(nsound))
+    offset = np.concatenate(([0.], cumArea))[start]
+    top = np.zeros(nsound)
+    np.maximum.at(top, ps[inside], cumArea[inside] - offset[ps[inside]])
+    wmax = np.sqrt(2.*top)
+
+    LFC = np.empty(nsound)
+    LFC.fill(np.nan)
+    EL = np.empty(nsound)
+    EL.fill(np.nan)
+    i = first[free]
+    LFC[free] = np.exp(lp1[pL[i]] + xa[i]*dlp[pL[i]])
+    i = last[free]
+    EL[free] = np.exp(lp1[pL[i]] + xb[i]*dlp[pL[i]])
+    return CAPE, CIN, LFC, EL, wmax, POS, NEG
+
+
+def selectParcels(press, temp, dewpt, kind='MU', depth=100.e2,
+                  muTop=300.e2):
+    """
+    selectParcels(press, temp, dewpt, kind='MU', depth=100.e2,
+                  muTop=300.e2)
+
+    Picks the parcel to lift in every sounding of a stack.
+
+    Parameters
+    - - - - - -
+    press, temp, dewpt : array_like
+        Soundings as taken by batchCAPE: pressure (Pa), temperature
+        and dewpoint (K), shape (nsound, nlev), padded with nan.
+    kind : str, optional
+        'SB' for the surface (lowest) level, 'MU' (default) for the
+        level with the largest thetaep below 'muTop', or 'ML' for a
+        surface parcel with the mean potential temperature and mixing
+        ratio of the lowest 'depth' Pa.
+    depth : float or array_like, optional
+        Depth(s) of the mixed layer (Pa).  For an array, the results
+        have one row per depth.
+    muTop : float, optional
+        Most unstable parcels come from levels with pressure of at
+        least 'muTop' (Pa).
+
+    Returns
+    - - - -
+    startLevel : ndarray of int
+        Level index of the parcel in every sounding, as taken by
+        batchCAPE.
+    thetae0 : ndarray
+        Equivalent potential temperature of the parcel (K).
+
+    Raises
+    - - - -
+    NameError
+        If 'kind' is not recognized.
+
+    Notes
+    - - -
+    thetaep is found for every level of every sounding at once, and
+    the mixed layer means for all depths come from one cumulative sum
+    of potential temperature and mixing ratio over pressure, taken as
+    linear in pressure between levels.  If a sounding is shallower
+    than 'depth' its whole depth is used.
+
+    Examples
+    - - - - -
+    >>> press = np.array([[1000., 950., 900., 850., 700., 500., 300.]])*100.
+    >>> temp = np.array([[24., 22., 21., 17., 8., -10., -35.]]) + c.Tc
+    >>> dewpt = np.array([[14., 18., 17., 10., -2., -25., -50.]]) + c.Tc
+    >>> level, thetae0 = selectParcels(press, temp, dewpt)
+    >>> print level[0], '%.3f' % thetae0[0]
+    2 343.902
+    >>> level, thetae0 = selectParcels(press, temp, dewpt, kind='ML',
+    ...                                depth=[50.e2, 100.e2])
+    >>> print level[:, 0], np.round(thetae0[:, 0], 3)
+    [0 0] [333.322 337.633]
+    >>> level, thetae0 = selectParcels(press, temp, dewpt, kind='SB')
+    >>> thetae0[0] == thetaep(dewpt[0, 0], temp[0, 0], press[0, 0])
+    True
+
+    """
+    press, temp, dewpt = [np.array(x, dtype=float, ndmin=2)
+                          for x in (press, temp, dewpt)]
+    nsound = press.shape[0]
+    rows = np.arange(nsound)
+    valid = np.isfinite(press) & np.isfinite(temp) & np.isfinite(dewpt)
+    first = np.argmax(valid, axis=1)
+    if kind == 'SB':
+        return first, thetaep(dewpt[rows, first], temp[rows, first],
+                              press[rows, first])
+    elif kind == 'MU':
+        with np.errstate(invalid='ignore'):
+            low = valid & (press >= muTop)
+        low[rows, first] = True
+        thetaeAll = np.empty_like(press)
+        thetaeAll.fill(-np.inf)
+        thetaeAll[low] = thetaep(dewpt[low], temp[low], press[low])
+        start = np.argmax(thetaeAll, axis=1)
+        return start, thetaeAll[rows, start]
+    elif kind != 'ML':
+        raise NameError('kind must be SB, MU or ML')
+
+    valid, press, temp, dewpt = _packLevels(press, temp, dewpt)
+    depth = np.asarray(depth, dtype=float)
+    with np.errstate(invalid='ignore'):
+        thetaLev = np.where(valid, theta(temp, press), 0.)
+        wvLev = np.where(valid, wsat(dewpt, press), 0.)
+    layer = _layers(valid, press)
+    dp = np.where(layer, press[:, :-1] - press[:, 1:], 0.)
+    def cumulate(x):
+        # integral of x dp from the lowest level up to every level
+        total = np.zeros(press.shape)
+        total[:, 1:] = np.cumsum(0.5*(x[:, :-1] + x[:, 1:])*dp, axis=1)
+        return total
+    thetaSum = cumulate(thetaLev)
+    wvSum = cumulate(wvLev)
+
+    nvalid = valid.sum(axis=1)
+    psfc = press[rows, 0]
+    ptop = np.maximum(psfc - depth[..., None],
+                      press[rows, np.maximum(nvalid - 1, 0)])
+    # k is the last level at or below ptop, interpolate up from it
+    with np.errstate(invalid='ignore'):
+        k = np.minimum((valid & (press > ptop[..., None])).sum(axis=-1) - 1,
+                       np.maximum(nvalid - 2, 0))
+    k = np.maximum(k, 0)
+    k1 = np.minimum(k + 1, press.shape[1] - 1)
+    pk = press[rows, k]
+    width = pk - press[rows, k1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.where(width > 0., (pk - ptop)/width, 0.)
+        def mean(total, x):
+            xk = x[rows, k]
+            xtop = xk + frac*(x[rows, k1] - xk)
+            return (total[rows, k] + 0.5*(xk + xtop)*(pk - ptop)) \
+                   / (psfc - ptop)
+        thetaMix = mean(thetaSum, thetaLev)
+        wvMix = mean(wvSum, wvLev)
+    Tmix = invtheta(thetaMix, psfc)
+    Tdmix = np.minimum(Tdfind(wvMix, psfc), Tmix)
+    start = first + np.zeros(Tmix.shape, int)
+    return start, thetaep(Tdmix, Tmix, psfc + 0.*Tmix)
+
+
+def parcelCAPE(press, temp, dewpt, parcels=('SB', 'MU', 'ML'),
+               depths=(100.e2,), muTop=300.e2, **kwargs):
+    """
+    parcelCAPE(press, temp, dewpt, parcels=('SB', 'MU', 'ML'),
+               depths=(100.e2,), muTop=300.e2, **kwargs)
+
+    CAPE and friends for surface based, most unstable and mixed layer
+    parcels, all lifted in one batchCAPE call.
+
+    Parameters
+    - - - - - -
+    press, temp, dewpt : array_like
+        Soundings as taken by batchCAPE.
+    parcels : sequence of str, optional
+        Parcel kinds, see selectParcels.
+    depths : sequence of float, optional
+        Mixed layer depths (Pa) for the 'ML' parcels.
+    muTop : float, optional
+        Highest level (Pa) for most unstable parcels.
+    **kwargs
+        Passed on to batchCAPE, e.g. topPress or exact.
+
+    Returns
+    - - - -
+    results : dict
+        Maps 'SB', 'MU' and 'ML<depth in hPa>' (e.g. 'ML100') to the
+        tuple (CAPE, CIN, LFC, EL, wmax) returned by batchCAPE.
+
+    Examples
+    - - - - -
+    >>> press = np.array([[1000., 950., 900., 850., 700., 500., 300.]])*100.
+    >>> temp = np.array([[24., 22., 21., 17., 8., -10., -35.]]) + c.Tc
+    >>> dewpt = np.array([[14., 18., 17., 10., -2., -25., -50.]]) + c.Tc
+    >>> out = parcelCAPE(press, temp, dewpt, depths=[50.e2, 100.e2])
+    >>> sorted(out.keys())
+    ['ML100', 'ML50', 'MU', 'SB']
+    >>> mu = batchCAPE(press, temp, dewpt, *selectParcels(press, temp, dewpt))
+    >>> np.array_equal(out['MU'][0], mu[0])
+    True
+    >>> out['MU'][0][0] > out['ML100'][0][0] > out['SB'][0][0]
+    True
+
+    """
+    press, temp, dewpt = [np.array(x, dtype=float, ndmin=2)
+                          for x in (press, temp, dewpt)]
+    nsound = press.shape[0]
+    names = []
+    starts = []
+    thetaes = []
+    for kind in parcels:
+        if kind == 'ML':
+            start, thetae0 = selectParcels(press, temp, dewpt, 'ML',
+                                           np.asarray(depths, dtype=float))
+            for depth, s, t in zip(depths, start, thetae0):
+                names.append('ML%g' % (depth*1.e-2))
+                starts.append(s)
+                thetaes.append(t)
+        else:
+            start, thetae0 = selectParcels(press, temp, dewpt, kind,
+                                           muTop=muTop)
+            names.append(kind)
+            starts.append(start)
+            thetaes.append(thetae0)
+    ncopy = len(names)
+    out = batchCAPE(np.tile(press, (ncopy, 1)), np.tile(temp, (ncopy, 1)),
+                    np.tile(dewpt, (ncopy, 1)),
+                    startLevel=np.concatenate(starts),
+                    thetae0=np.concatenate(thetaes), **kwargs)
+    results = {}
+    for i, name in enumerate(names):
+        results[name] = tuple(x[i*nsound:(i + 1)*nsound] for x in out)
+    return results
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
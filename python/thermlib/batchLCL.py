@@ -0,0 +1,110 @@
+"""This is the docstring for the batchLCL.py module."""
+
+import numpy as np
+
+from constants import constants as c
+from rootfinder import fzero_vec
+from new_thermo import esat, theta, invtheta, Tdfind
+from findLCL0 import Tchange
+
+def batchLCL(T, p, Td=None, wv=None, exact=False):
+    """
+    batchLCL(T, p, Td=None, wv=None, exact=False)
+
+    Finds the temperature and pressure at the lifting condensation
+    level (LCL) for whole arrays of parcels at once.
+
+    Parameters
+    - - - - - -
+    T : float or array_like
+        Temperature (K).
+    p : float or array_like
+        Pressure (Pa).
+    Td : float or array_like, optional
+        Dewpoint temperature (K).
+    wv : float or array_like, optional
+        Vapour mixing ratio (kg/kg). Give exactly one of 'Td' and
+        'wv'; all inputs are broadcast against each other.
+    exact : bool, optional
+        If False (default) use Bolton's closed form, as in LCLfind.
+        If True solve T(theta) = Td(wv) for every parcel together, as
+        findLCL0 does one parcel at a time; the answers agree with
+        findLCL0 to within 1.e-3 Pa.
+
+    Returns
+    - - - -
+    Tlcl : float or ndarray
+        Temperature at the LCL (K).
+    plcl : float or ndarray
+        Pressure at the LCL (Pa).
+    saturated : bool or ndarray
+        True where the parcel is already saturated (Td >= T).  There
+        Tlcl and plcl are just T and p, instead of the NameError
+        raised by LCLfind and findLCL0.
+
+    Raises
+    - - - -
+    NameError
+        If neither or both of 'Td' and 'wv' are given.
+
+    Examples
+    - - - - -
+    >>> Tlcl, plcl, sat = batchLCL([300., 280.], 8.e4, Td=[280., 300.])
+    >>> np.allclose(Tlcl, [275.76250387361404, 280.])
+    True
+    >>> np.allclose(plcl, [59518.928699453245, 8.e4])
+    True
+    >>> sat
+    array([False,  True])
+    >>> Tlcl, plcl, sat = batchLCL(280., 9.e4, wv=0.001, exact=True)
+    >>> print '%.4f %.2f' % (Tlcl, plcl)
+    250.2260 60692.04
+
+    References
+    - - - - - -
+    Emanuel 4.6.24 p. 130 and 4.6.22 p. 129
+
+    """
+    if (Td is None) == (wv is None):
+        raise NameError('need exactly one of Td and wv')
+    if wv is None:
+        T, p, Td = np.broadcast_arrays(np.asarray(T, dtype=float),
+                                       np.asarray(p, dtype=float),
+                                       np.asarray(Td, dtype=float))
+        e = esat(Td)
+        wv = c.eps * e / (p - e)
+    else:
+        T, p, wv = np.broadcast_arrays(np.asarray(T, dtype=float),
+                                       np.asarray(p, dtype=float),
+                                       np.asarray(wv, dtype=float))
+        e = wv * p / (c.eps + wv)
+        Td = Tdfind(wv, p)
+    saturated = Td >= T
+    Tlcl = np.array(T)
+    plcl = np.array(p)
+    unsat = ~saturated
+    if exact:
+        theta0 = theta(T[unsat], p[unsat], wv[unsat])
+        plcl[unsat] = fzero_vec(Tchange, p[unsat], 2.e4, wv[unsat], theta0)
+        Tlcl[unsat] = invtheta(theta0, plcl[unsat], wv[unsat])
+    else:
+        #Bolton's formula requires hPa.
+        ehPa = e[unsat] * 0.01
+        # This is is an empircal fit from for LCL temp from Bolton, 1980 MWR.
+        Tlcl[unsat] = (2840. / (3.5 * np.log(T[unsat]) - np.log(ehPa)
+                                - 4.805)) + 55.
+        r = wv[unsat]
+        cp = c.cpd + r * c.cpv
+        plcl[unsat] = p[unsat] * np.exp(cp / (c.Rd * (1 + r / c.eps)) *
+                                        np.log(Tlcl[unsat] / T[unsat]))
+    if Tlcl.ndim == 0:
+        return Tlcl[()], plcl[()], saturated[()]
+    return Tlcl, plcl, saturated
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Throughput of batchCAPE in soundings per second.
+
+The littlerock.nc soundings are tiled into stacks of 1 to 10000
+soundings and each stack is done in one batchCAPE call, with and
+without 'exact' crossings and quadrature.  For comparison the 'loop'
+column calls batchCAPE one sounding at a time, and the 'script'
+column follows skew_T/littlerock_stats.py: a walk up a 100 level
+adiabat per sounding with the buoyancy summed on it.
+
+usage:  python bench_cape.py
+"""
+
+import os
+import timeit
+
+import numpy as np
+
+from constants import constants as c
+from new_thermo import wsat, thetaep
+from findTmoist import walkTmoist
+from batchCape import readSoundings, batchCAPE
+
+soundingFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'skew_T', 'littlerock.nc')
+
+def time_call(func, ntimes=3):
+    # best of ntimes, in seconds
+    return min(timeit.repeat(func, number=1, repeat=ntimes))
+
+def script_cape(press, temp, dewpt):
+    # one sounding the way the interactive scripts do it
+    ok = np.isfinite(press)
+    press, temp, dewpt = press[ok], temp[ok], dewpt[ok]
+    thetae0 = thetaep(dewpt[0], temp[0], press[0])
+    presslevs = np.linspace(press[0], 2.e4, 100)
+    Tcloud = walkTmoist(thetae0, presslevs)
+    Tenv = np.interp(presslevs, press[::-1], temp[::-1])
+    Tdenv = np.interp(presslevs, press[::-1], dewpt[::-1])
+    Tvdiff = Tcloud*(1. + c.eps*wsat(Tcloud, presslevs)) \
+             - Tenv*(1. + c.eps*wsat(Tdenv, presslevs))
+    return -c.Rd*np.cumsum(Tvdiff[1:]*np.diff(np.log(presslevs)))[-1]
+
+def main():
+    names, press, temp, dewpt = readSoundings(soundingFile)
+    nfile = len(names)
+    print '%10s %14s %14s %14s %14s' % ('soundings', 'batch/s', 'exact/s',
+                                        'loop/s', 'script/s')
+    for nsound in [1, 10, 100, 1000, 10000]:
+        tiles = -(-nsound // nfile)
+        p, T, Td = [np.tile(x, (tiles, 1))[:nsound]
+                    for x in (press, temp, dewpt)]
+        batch = time_call(lambda: batchCAPE(p, T, Td))
+        exact = time_call(lambda: batchCAPE(p, T, Td, exact=True))
+        if nsound <= 100:
+            loop = time_call(lambda: [batchCAPE(p[i], T[i], Td[i])
+                                      for i in range(nsound)])
+            script = time_call(lambda: [script_cape(p[i], T[i], Td[i])
+                                        for i in range(nsound)])
+            print '%10d %14.1f %14.1f %14.1f %14.1f' % (nsound, nsound/batch,
+                                                        nsound/exact,
+                                                        nsound/loop,
+                                                        nsound/script)
+        else:
+            print '%10d %14.1f %14.1f' % (nsound, nsound/batch, nsound/exact)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Throughput of parcelEnsemble.ensembleParcels in parcels per second.
+
+Ensembles of 1 to 10000 parcels from the Mar-02-2012-12Z littlerock.nc
+sounding, with initial velocities from 0.5 to 10 m/s and entrainment
+rates from 0 to 5.e-4 1/s, are integrated to tfin=2500 s in one
+ensembleParcels call.  For comparison the 'script' column integrates
+the same parcels one at a time the way ode45/answer_entrain.py did
+before parcelTrajectory and EnvColumn: scipy dopri5 with calcBuoy (a
+findTmoist solve) and thetaep in the right hand side.
+
+usage:  python bench_ensemble.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+from scipy.integrate import ode
+from netCDF4 import Dataset
+
+from constants import constants as c
+from new_thermo import thetaep, wsat
+from sounding import Sounding
+from parcelEnsemble import ensembleParcels
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '..', 'ode45'))
+from calcBuoy import calcBuoy
+
+soundingFile = os.path.join(here, '..', 'skew_T', 'littlerock.nc')
+
+def time_call(func, ntimes=3):
+    # best of ntimes, in seconds
+    return min(timeit.repeat(func, number=1, repeat=ntimes))
+
+def F(t, y, entrain_rate, interpTenv, interpTdEnv, interpPress):
+    # the original right hand side of ode45/answer_entrain.py
+    yp = np.zeros((4, 1))
+    yp[0] = calcBuoy(y[1], y[2], interpTenv, interpTdEnv, interpPress)
+    press = interpPress(y[1])*100.
+    Tdenv = interpTdEnv(y[1]) + c.Tc
+    Tenv = interpTenv(y[1]) + c.Tc
+    yp[1] = y[0]
+    yp[2] = entrain_rate*(thetaep(Tdenv, Tenv, press) - y[2])
+    yp[3] = entrain_rate*(wsat(Tdenv, press) - y[3])
+    return yp
+
+def script_parcel(sound, yinit, entrain_rate, tfin=2500., dt=10.):
+    # one parcel, stepping like answer_entrain.py
+    r = ode(F).set_integrator('dopri5')
+    r.set_f_params(entrain_rate, sound.interpolator('temp'),
+                   sound.interpolator('dewpt'), sound.interpolator('press'))
+    r.set_initial_value(yinit, 0.)
+    heights = [yinit[1]]
+    while r.successful() and r.t < tfin and r.y[0] > 0:
+        r.integrate(r.t + dt)
+        if r.y[0] <= 0:
+            break
+        heights.append(r.y[1])
+    return heights
+
+def main():
+    nc_file = Dataset(soundingFile)
+    sound = Sounding.from_array(nc_file.variables['Mar-02-2012-12Z'][:],
+                                nc_file.col_names)
+    nc_file.close()
+    Tdenv, Tenv = [sound.interp(name, press=900.) + c.Tc
+                   for name in ('dewpt', 'temp')]
+    thetae0 = thetaep(Tdenv, Tenv, 900.e2)
+    wT0 = wsat(Tdenv, 900.e2)
+    z800 = sound.interp('height', press=800.)
+    print '%10s %14s %14s %10s' % ('parcels', 'ensemble/s', 'script/s',
+                                   'speedup')
+    for nparcel in [1, 10, 100, 1000, 10000]:
+        winit = np.linspace(0.5, 10., nparcel)
+        entrain = np.linspace(0., 5.e-4, nparcel)[::-1]
+        ntimes = 3 if nparcel <= 1000 else 1
+        ensemble = time_call(lambda: ensembleParcels(sound, thetae0, wT0,
+                                                     winit, z800,
+                                                     entrain=entrain),
+                             ntimes)
+        if nparcel <= 10:
+            script = time_call(lambda: [script_parcel(sound,
+                                                      [winit[i], z800,
+                                                       thetae0, wT0],
+                                                      entrain[i])
+                                        for i in range(nparcel)], 1)
+            print '%10d %14.1f %14.1f %10.1f' % (nparcel, nparcel/ensemble,
+                                                 nparcel/script,
+                                                 script/ensemble)
+        else:
+            print '%10d %14.1f' % (nparcel, nparcel/ensemble)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Import-time budget for the numerical thermlib modules.
+
+Each module is imported in a fresh interpreter, so nothing is cached
+in sys.modules, and the time is compared with a bare 'import numpy'.
+A numerical module may cost at most 'budget' seconds on top of numpy
+and must not pull in matplotlib, pylab or scipy.  The doctest below
+enforces both.
+
+usage:  python bench_import.py
+
+>>> slow = check_imports()
+>>> slow
+[]
+"""
+
+import os
+import subprocess
+import sys
+
+thermlibDir = os.path.dirname(os.path.abspath(__file__))
+
+#modules that should cost no more than numpy to import
+numerical = ['thermo', 'new_thermo', 'rootfinder', 'constants', 'esat',
+             'wsat', 'thetaes', 'thetaep', 'findTmoist', 'findLCL0',
+             'batchLCL', 'batchCape', 'tinvert', 'findWvWl', 'SAM',
+             'les_chi', 'storm_indices', 'sounding', 'parcelEnsemble',
+             'entrain_sweep', 'steadyPlume', 'adiabatTable', 'skewT',
+             'qt_vs_theta_l']
+
+#modules that must be loaded lazily, if at all
+heavy = ['matplotlib', 'pylab', 'scipy']
+
+#seconds allowed on top of 'import numpy'
+budget = 0.05
+
+_script = """
+import sys, time
+t0 = time.time()
+import %s
+t1 = time.time()
+print t1 - t0
+print ' '.join(name for name in %r if name in sys.modules)
+"""
+
+def import_time(module, repeat=5):
+    """
+    import_time(module, repeat=5)
+
+    Returns the median cold import time of 'module' in seconds and
+    the list of heavy modules the import loaded.
+    """
+    times = []
+    for i in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c',
+                                       _script % (module, heavy)],
+                                      cwd=thermlibDir)
+        lines = out.split('\n')
+        times.append(float(lines[0]))
+        loaded = lines[1].split()
+    times.sort()
+    return times[len(times)//2], loaded
+
+def check_imports(modules=numerical):
+    """
+    check_imports(modules=numerical)
+
+    Returns (module, extra seconds, heavy modules) for every module that
+    goes over 'budget' or loads a heavy module.
+    """
+    base, loaded = import_time('numpy')
+    slow = []
+    for module in modules:
+        seconds, loaded = import_time(module)
+        if seconds - base > budget or loaded:
+            slow.append((module, seconds - base, loaded))
+    return slow
+
+def main():
+    base, loaded = import_time('numpy')
+    print '%15s %10s   %s' % ('module', 'ms', 'heavy modules')
+    print '%15s %10.1f' % ('numpy', base*1.e3)
+    for module in numerical:
+        seconds, loaded = import_time(module)
+        print '%15s %10.1f   %s' % (module, seconds*1.e3, ' '.join(loaded))
+    print 'budget: %.1f ms over numpy' % (budget*1.e3)
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    main()
+    _test()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Scaling of storm_indices.compute_indices with the number of workers.
+
+The littlerock.nc soundings are copied into an archive of 'nsound'
+soundings, and the whole archive is done with 1 to N workers (N
+defaults to the number of cores).  Every run must give the same table
+as the serial one; the speedup is against workers=None, which runs in
+this process.
+
+usage:  python bench_indices.py [nsound] [N]
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+from collections import OrderedDict
+
+from storm_indices import read_archive, compute_indices
+
+soundingFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'skew_T', 'littlerock.nc')
+
+def make_archive(nsound):
+    # nsound copies of the littlerock soundings, keyed by copy and time
+    names, stacks = read_archive(soundingFile)
+    cols, stack = stacks[0]
+    archive = OrderedDict()
+    for i in range(nsound):
+        j = i % len(names)
+        archive['%05d-%s' % (i, names[j])] = stack[j]
+    return archive, ','.join(cols)
+
+def main():
+    nsound = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    most = int(sys.argv[2]) if len(sys.argv) > 2 \
+           else multiprocessing.cpu_count()
+    archive, columns = make_archive(nsound)
+    t0 = time.time()
+    serial = compute_indices(archive, columns=columns)
+    base = time.time() - t0
+    print '%d soundings, %d cores' % (nsound, multiprocessing.cpu_count())
+    print '%8s %12s %12s %10s %6s' % ('workers', 'seconds', 'soundings/s',
+                                      'speedup', 'same')
+    print '%8s %12.2f %12.1f %10.2f %6s' % ('serial', base, nsound/base, 1.,
+                                           True)
+    for workers in range(1, max(most, 1) + 1):
+        t0 = time.time()
+        table = compute_indices(archive, workers=workers, columns=columns)
+        seconds = time.time() - t0
+        print '%8d %12.2f %12.1f %10.2f %6s' % (workers, seconds,
+                                               nsound/seconds,
+                                               base/seconds,
+                                               repr(table) == repr(serial))
+
+if __name__ == "__main__":
+    main()
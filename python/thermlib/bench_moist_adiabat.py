@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Timing for one moist adiabat, 1000 hPa to 200 hPa, on 50, 500 and
+5000 levels.
+
+The per-level engines of findTmoist invert thetaes at every level, so
+their cost grows with the number of levels.  moist_adiabat_ode
+integrates dT/dp once and reads the levels off its dense output, so
+only the (cheap) interpolation grows.  The ode column includes the
+integration; the max error column is against the brenth engine.
+
+usage:  python bench_moist_adiabat.py
+"""
+
+import timeit
+
+import numpy as np
+
+from findTmoist import findTmoist, moist_adiabat_ode
+
+thetaE0 = 330.
+
+def time_call(func, ntimes=3):
+    # best of ntimes, in seconds
+    return min(timeit.repeat(func, number=1, repeat=ntimes))
+
+def ode_levels(press):
+    Tprofile = moist_adiabat_ode(thetaE0, press[0], press[-1])
+    return Tprofile(press)
+
+def main():
+    engines = ['brenth', 'bracket', 'walk', 'ode']
+    print '%8s' % 'levels' + ''.join(['%10s' % name for name in engines]) \
+        + '%14s' % 'max error'
+    for nlevs in [50, 500, 5000]:
+        press = np.linspace(1.e5, 2.e4, nlevs)
+        times = []
+        for name in engines[:-1]:
+            times.append(time_call(lambda: findTmoist(thetaE0, press,
+                                                      engine=name)))
+        times.append(time_call(lambda: ode_levels(press)))
+        Tbrenth = np.asarray(findTmoist(thetaE0, press, engine='brenth'))
+        error = np.max(np.abs(ode_levels(press) - Tbrenth))
+        print '%8d' % nlevs + ''.join(['%8.1fms' % (t*1.e3) for t in times]) \
+            + '%14.2e' % error
+
+if __name__ == "__main__":
+    main()
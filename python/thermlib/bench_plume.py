@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Time of steadyPlume.steadyPlume against time stepping the same plume.
+
+The littlerock.nc soundings are tiled into stacks of 1 to 10000
+soundings.  Each plume starts at 800 hPa with 0.5 m/s and the thetae
+and total water of 900 hPa, as in ode45/answer_entrain.py, and is run
+undilute (mu=0) so that it is the same parcel in height and in time.
+Whole stacks go through one steadyPlume call, with every sounding
+layer as one step (nsub=1) and split in four (nsub=4); the 'time'
+column integrates the soundings one at a time with
+parcelEnsemble.ensembleParcels, and 'top diff' is the largest cloud
+top difference (m) between the two, the time stepping top being the
+highest 10 s record.
+
+usage:  python bench_plume.py
+"""
+
+import os
+import timeit
+
+import numpy as np
+
+from constants import constants as c
+from new_thermo import thetaep, wsat
+from sounding import Sounding
+from storm_indices import read_archive
+from parcelEnsemble import ensembleParcels
+from steadyPlume import steadyPlume
+
+soundingFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'skew_T', 'littlerock.nc')
+
+def time_call(func, ntimes=3):
+    # best of ntimes, in seconds
+    return min(timeit.repeat(func, number=1, repeat=ntimes))
+
+def plume_starts(press, height, temp, dewpt):
+    # thetae and total water at 900 hPa and the height of 800 hPa
+    thetae0, wT0, z800 = [np.empty(press.shape[0]) for i in range(3)]
+    for i in range(press.shape[0]):
+        ok = np.isfinite(press[i])
+        p = press[i][ok][::-1]
+        Tenv, Tdenv = [np.interp(900., p, x[ok][::-1]) + c.Tc
+                       for x in (temp[i], dewpt[i])]
+        thetae0[i] = thetaep(Tdenv, Tenv, 900.e2)
+        wT0[i] = wsat(Tdenv, 900.e2)
+        z800[i] = np.interp(800., p, height[i][ok][::-1])
+    return thetae0, wT0, z800
+
+def time_stepping(stack, cols, thetae0, wT0, z800):
+    # cloud tops one sounding at a time, in time
+    tops = np.empty(stack.shape[0])
+    for i in range(stack.shape[0]):
+        sound = Sounding.from_array(stack[i], ','.join(cols))
+        out = ensembleParcels(sound, thetae0[i], wT0[i], 0.5, z800[i])
+        tops[i] = np.nanmax(out['z'])
+    return tops
+
+def main():
+    names, [(cols, archive)] = read_archive(soundingFile)
+    print '%10s %14s %14s %14s %10s' % ('soundings', 'nsub=1/s', 'nsub=4/s',
+                                        'time/s', 'top diff')
+    for nsound in [1, 10, 100, 1000, 10000]:
+        tiles = -(-nsound // len(names))
+        stack = np.tile(archive, (tiles, 1, 1))[:nsound]
+        press, height, temp, dewpt = [stack[:, :, cols.index(name)]
+                                      for name in ('press', 'height', 'temp',
+                                                   'dewpt')]
+        thetae0, wT0, z800 = plume_starts(press, height, temp, dewpt)
+        args = (height, press*100., temp + c.Tc, dewpt + c.Tc, thetae0, wT0,
+                z800)
+        coarse = time_call(lambda: steadyPlume(*args))
+        fine = time_call(lambda: steadyPlume(*args, nsub=4))
+        if nsound <= 10:
+            stepping = time_call(lambda: time_stepping(stack, cols, thetae0,
+                                                       wT0, z800), 1)
+            tops = time_stepping(stack, cols, thetae0, wT0, z800)
+            diff = np.nanmax(np.abs(steadyPlume(*args, nsub=4)['cloud_top']
+                                    - tops))
+            print '%10d %14.1f %14.1f %14.1f %10.1f' % (nsound,
+                                                        nsound/coarse,
+                                                        nsound/fine,
+                                                        nsound/stepping, diff)
+        else:
+            print '%10d %14.1f %14.1f' % (nsound, nsound/coarse, nsound/fine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+Timing for the broadcasting esat/wsat/thetaes in new_thermo.
+
+Prints the time per element for 10**3 to 10**7 elements, with and
+without a preallocated 'out' buffer.  For linear scaling the ns/elem
+column should stay roughly flat as the size grows.
+
+usage:  python bench_wsat.py
+"""
+
+import timeit
+
+import numpy as np
+
+from new_thermo import esat, wsat, thetaes
+
+def time_call(func, ntimes=3):
+    # best of ntimes, in seconds
+    return min(timeit.repeat(func, number=1, repeat=ntimes))
+
+def main():
+    print '%10s %8s %12s %12s' % ('size', 'func', 'ns/elem', 'ns/elem out=')
+    for power in range(3, 8):
+        size = 10**power
+        Temp = np.linspace(230., 310., size)
+        press = np.linspace(1.e5, 2.e4, size)
+        out = np.empty(size)
+        for name, func in [('esat', esat), ('wsat', wsat),
+                           ('thetaes', thetaes)]:
+            if name == 'esat':
+                args = (Temp,)
+            else:
+                args = (Temp, press)
+            fresh = time_call(lambda: func(*args))
+            reused = time_call(lambda: func(*args, out=out))
+            print '%10d %8s %12.2f %12.2f' % (size, name, fresh/size*1.e9,
+                                              reused/size*1.e9)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""This is the docstring for the entrain_sweep.py module. This module
+contains sweep_entrainment, which runs the entraining parcel of
+ode45/answer_entrain.py over a grid of entrainment rates for every
+sounding in an archive, on a process pool, keeping every finished
+piece of the sweep on disk so that an interrupted sweep can resume."""
+
+import os
+import hashlib
+from collections import OrderedDict
+
+import numpy
+
+from constants import constants as c
+from new_thermo import thetaep, wsat, tinvert_thetae
+from sounding import Sounding
+from parcelEnsemble import ensembleParcels
+from storm_indices import default_columns, read_archive
+
+#per sounding and rate results, and the liquid water profile
+sweep_names = ['cloud_top', 'wmax', 'wl']
+
+def _sweep_cell(cols, sound, rates, heights, settings):
+    # results for one sounding and a block of entrainment rates
+    nrate = len(rates)
+    cloud_top = numpy.nan*numpy.empty(nrate)
+    wmax = numpy.nan*numpy.empty(nrate)
+    wl = numpy.nan*numpy.empty((nrate, len(heights)))
+    try:
+        sound = Sounding.from_array(sound, ','.join(cols))
+    except ValueError:
+        return cloud_top, wmax, wl
+    parcel_hPa = settings['parcel_press']*1.e-2
+    start_hPa = settings['start_press']*1.e-2
+    if parcel_hPa > sound.press[0] or start_hPa < sound.press[-1]:
+        return cloud_top, wmax, wl
+    Tdenv, Tenv = [sound.interp(name, press=parcel_hPa) + c.Tc
+                   for name in ('dewpt', 'temp')]
+    thetae0 = thetaep(Tdenv, Tenv, settings['parcel_press'])
+    wT0 = wsat(Tdenv, settings['parcel_press'])
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        out = ensembleParcels(sound, thetae0, wT0, settings['winit'],
+                              sound.interp('height', press=start_hPa),
+                              entrain=rates, tfin=settings['tfin'],
+                              dt=settings['dt'])
+    ok = numpy.isfinite(out['z'])
+    cloud_top[:] = numpy.nanmax(numpy.where(ok, out['z'], -numpy.inf), axis=0)
+    wmax[:] = numpy.nanmax(numpy.where(ok, out['w'], -numpy.inf), axis=0)
+    press = sound.interp('press', height=out['z'][ok])*100.
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        wlKept = tinvert_thetae(out['thetae'][ok], out['wT'][ok], press)[2]
+    wlAll = numpy.nan*out['z']
+    wlAll[ok] = wlKept
+    for i in range(nrate):
+        # z only rises over the records that were kept
+        rising = ok[:, i]
+        if rising.sum() > 1:
+            wl[i] = numpy.interp(heights, out['z'][rising, i],
+                                 wlAll[rising, i], left=numpy.nan,
+                                 right=numpy.nan)
+    return cloud_top, wmax, wl
+
+def _cell_key(cols, sound, rates, heights, settings):
+    # name of the cache file of a cell, from everything it depends on
+    digest = hashlib.sha1()
+    digest.update(','.join(cols))
+    for values in (sound, rates, heights):
+        digest.update(numpy.ascontiguousarray(values, dtype=float).tostring())
+    digest.update(repr(sorted(settings.items())))
+    return digest.hexdigest()
+
+def _cell_task(args):
+    cols, sound, rates, heights, settings, filename = args
+    cloud_top, wmax, wl = _sweep_cell(cols, sound, rates, heights, settings)
+    if filename is not None:
+        #write under a temporary name, so an interrupted write never
+        #leaves a cell that looks finished
+        partial = filename + '.%d.part' % os.getpid()
+        with open(partial, 'wb') as f:
+            numpy.savez(f, cloud_top=cloud_top, wmax=wmax, wl=wl)
+        os.rename(partial, filename)
+    return cloud_top, wmax, wl
+
+def _load_cell(filename):
+    cell = numpy.load(filename)
+    try:
+        return [cell[name] for name in sweep_names]
+    finally:
+        cell.close()
+
+def sweep_entrainment(archive, rates, heights=None, cache_dir=None,
+                      workers=None, chunk=25, winit=0.5, parcel_press=900.e2,
+                      start_press=800.e2, tfin=2500., dt=10.,
+                      columns=default_columns):
+    """
+    sweep_entrainment(archive, rates, heights=None, cache_dir=None,
+                      workers=None, chunk=25, winit=0.5,
+                      parcel_press=900.e2, start_press=800.e2, tfin=2500.,
+                      dt=10., columns=default_columns)
+
+    Cloud top, maximum velocity and liquid water profile of the
+    entraining parcel for every sounding and entrainment rate.
+
+    Parameters
+    - - - - - -
+    archive : str, sequence of str or mapping
+        Soundings in the form taken by storm_indices.read_archive.
+    rates : array_like
+        Entrainment rates (1/s).
+    heights : array_like, optional
+        Heights (m) of the liquid water profiles, every 250 m up to
+        20 km by default.
+    cache_dir : str, optional
+        Directory for finished cells, created if needed.  A cell is one
+        sounding and a block of 'chunk' rates; cells already in
+        'cache_dir' are read back instead of being run again.
+    workers : int, optional
+        Number of processes for a multiprocessing pool.  The results do
+        not depend on 'workers'.
+    chunk : int, optional
+        Number of rates integrated together in one ensembleParcels
+        call.
+    winit : float, optional
+        Initial velocity (m/s).
+    parcel_press, start_press : float, optional
+        The parcel has the thetae and total water of the environment at
+        'parcel_press' and starts from 'start_press' (Pa), as in
+        answer_entrain.py.
+    tfin, dt : float, optional
+        Passed to ensembleParcels.
+    columns : str, optional
+        Column names for a mapping archive, see read_archive.
+
+    Returns
+    - - - -
+    coords : OrderedDict
+        'sounding' (times), 'rate' (1/s) and 'height' (m).
+    data_vars : OrderedDict
+        Maps 'cloud_top' (m) and 'wmax' (m/s) to (('sounding', 'rate'),
+        array) and 'wl' (kg/kg) to (('sounding', 'rate', 'height'),
+        array).  This is the form xarray.Dataset(data_vars, coords)
+        takes.  Cells whose sounding does not reach 'parcel_press' or
+        'start_press' are nan, and so is 'wl' outside the rise of the
+        parcel.
+
+    Notes
+    - - -
+    The cache files are named by a hash of the sounding, the rates,
+    the heights and the settings of the cell, so changing any of them
+    starts the affected cells afresh, and a cell is written under a
+    temporary name first, so a killed sweep leaves only whole cells.
+
+    Examples
+    - - - - -
+    >>> import os, shutil, tempfile
+    >>> filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    ...                         '..', 'skew_T', 'littlerock.nc')
+    >>> cache_dir = tempfile.mkdtemp()
+    >>> rates = [0., 2.e-4, 5.e-4]
+    >>> coords, data_vars = sweep_entrainment(filename, rates,
+    ...                                       cache_dir=cache_dir, chunk=2)
+    >>> coords['sounding'][3]
+    'Mar-02-2012-12Z'
+    >>> dims, cloud_top = data_vars['cloud_top']
+    >>> dims, cloud_top.shape, data_vars['wl'][1].shape
+    (('sounding', 'rate'), (6, 3), (6, 3, 81))
+    >>> print '%.0f %.0f %.0f' % tuple(cloud_top[3])
+    14387 14048 13487
+    >>> len(os.listdir(cache_dir))
+    12
+
+    A second run, here on two processes, reads every cell back:
+
+    >>> coords, again = sweep_entrainment(filename, rates, workers=2,
+    ...                                   cache_dir=cache_dir, chunk=2)
+    >>> all(numpy.allclose(again[name][1], data_vars[name][1], rtol=0.,
+    ...                    atol=0., equal_nan=True) for name in sweep_names)
+    True
+    >>> shutil.rmtree(cache_dir)
+
+    """
+    rates = numpy.atleast_1d(numpy.asarray(rates, dtype=float))
+    if heights is None:
+        heights = numpy.arange(0., 20001., 250.)
+    heights = numpy.asarray(heights, dtype=float)
+    settings = {'winit': float(winit), 'parcel_press': float(parcel_press),
+                'start_press': float(start_press), 'tfin': float(tfin),
+                'dt': float(dt)}
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    names, stacks = read_archive(archive, columns)
+    nsound = len(names)
+    results = OrderedDict([('cloud_top', numpy.empty((nsound, rates.size))),
+                           ('wmax', numpy.empty((nsound, rates.size))),
+                           ('wl', numpy.empty((nsound, rates.size,
+                                               heights.size)))])
+    tasks = []
+    places = []
+    row = 0
+    for cols, stack in stacks:
+        for sound in stack:
+            for k0 in range(0, rates.size, chunk):
+                block = rates[k0:k0 + chunk]
+                filename = None
+                if cache_dir is not None:
+                    filename = os.path.join(cache_dir, _cell_key(
+                        cols, sound, block, heights, settings) + '.npz')
+                    if os.path.exists(filename):
+                        cell = _load_cell(filename)
+                        for name, values in zip(sweep_names, cell):
+                            results[name][row, k0:k0 + chunk] = values
+                        continue
+                tasks.append((cols, sound, block, heights, settings,
+                              filename))
+                places.append((row, k0))
+            row += 1
+    if not workers:
+        cells = [_cell_task(args) for args in tasks]
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        try:
+            #map hands the cells back in order
+            cells = pool.map(_cell_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    for (row, k0), cell in zip(places, cells):
+        for name, values in zip(sweep_names, cell):
+            results[name][row, k0:k0 + chunk] = values
+    coords = OrderedDict([('sounding', names), ('rate', rates),
+                          ('height', heights)])
+    data_vars = OrderedDict([('cloud_top', (('sounding', 'rate'),
+                                            results['cloud_top'])),
+                             ('wmax', (('sounding', 'rate'),
+                                       results['wmax'])),
+                             ('wl', (('sounding', 'rate', 'height'),
+                                     results['wl']))])
+    return coords, data_vars
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
@@ -1,12 +1,11 @@
 """This is the docstring for the esat.py module."""
 
 import numpy as np
-import matplotlib.cbook as cbook
 
 
-def esat(T):
+def esat(T, out=None):
     """
-    esat(T)
+    esat(T, out=None)
 
     Calculates the saturation water vapor pressure over a flat
     surface of water at temperature 'T'.
@@ -15,35 +14,40 @@ def esat(T):
     - - - - - -
     T : float or array_like
         Temperature of parcel (K).
+    out : ndarray, optional
+        Float array to hold the result, so repeated calls don't
+        allocate. Must have a shape 'T' broadcasts to.
 
     Returns
     - - - -
-    esatOut : float or list
+    esatOut : float or ndarray
         Saturation water vapour pressure (Pa).
 
     Examples
     - - - - -
-    >>> esat(300.)
-    3534.5196668891358
-    >>> esat([300., 310.])
-    [3534.5196668891358, 6235.5321818976754]
+    >>> np.allclose(esat(300.), 3534.5196668891358)
+    True
+    >>> np.allclose(esat([300., 310.]), [3534.5196668891358, 6235.5321818976754])
+    True
 
     References
     - - - - - -
     Emanuel 4.4.14 p. 117
       
     """
-    # determine if T has been input as a vector
-    is_scalar=True
-    if cbook.iterable(T):
-        is_scalar = False
-    T=np.atleast_1d(T)
-    Tc = T - 273.15
-    esatOut = 611.2 * np.exp(17.67 * Tc / (Tc + 243.5))
-    # if T is a vector
-    if is_scalar:
-        esatOut = esatOut[0]
-    return esatOut
+    if out is None:
+        out = np.empty(np.shape(T))
+    # 17.67*Tc/(Tc + 243.5) = 17.67 - 17.67*243.5/(Tc + 243.5),
+    # which can be built up in 'out' without temporaries
+    np.subtract(T, 273.15 - 243.5, out=out)
+    np.reciprocal(out, out=out)
+    out *= -17.67 * 243.5
+    out += 17.67
+    np.exp(out, out=out)
+    out *= 611.2
+    if out.ndim == 0:
+        return out[()]
+    return out
 
     
 def _test():
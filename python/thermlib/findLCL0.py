@@ -1,5 +1,8 @@
-from rootfinder import fzero
-from new_thermo import theta, invtheta, Tdfind
+import numpy as np
+
+from rootfinder import fzero_newton
+from constants import constants as c
+from new_thermo import theta, invtheta, Tdfind, LCLfind
 
 
 def findLCL0(wv, press0, temp0):
@@ -12,19 +15,23 @@ def findLCL0(wv, press0, temp0):
 
     Parameters
     - - - - - -
-    wv : float
+    wv : float or array_like
          Mixing ratio (K).
-    temp0 : float
+    temp0 : float or array_like
            Temperature (K).
-    press0: float
+    press0: float or array_like
             pressure (Pa)
 
     Returns
     - - - - -
-    plcl : float
+    plcl : float or ndarray
         Pressure at the LCL (Pa).
-    Tlcl : float
+    Tlcl : float or ndarray
         Temperature at the LCL (K).
+
+    Array inputs are broadcast against each other and all of the
+    parcels are solved together, by Newton steps in pressure on the
+    analytic derivative from TchangeDeriv (rootfinder.fzero_newton).
     
     Raises
     - - - -
@@ -41,15 +48,20 @@ def findLCL0(wv, press0, temp0):
         ...
     NameError: parcel is saturated at this pressure
     >>> p1, T1 =  findLCL0(0.001, 9.e4, 280.)
-    >>> print T1, p1
-    250.226034799 60692.0428535
+    >>> print '%.6f %.4f' % (T1, p1)
+    250.226035 60692.0429
+    >>> p2, T2 = findLCL0(0.001, 9.e4, [280., 290.])
+    >>> print '%.6f %.4f' % (T2[0], p2[0])
+    250.226035 60692.0429
     
     """
     
     
+    wv, press0, temp0 = [np.asarray(x, dtype=float)
+                         for x in (wv, press0, temp0)]
     Td = Tdfind(wv, press0)
     
-    if (Td >= temp0):
+    if np.any(Td >= temp0):
         raise NameError('parcel is saturated at this pressure')
     
     theta0 = theta(temp0, press0, wv)
@@ -58,7 +70,9 @@ def findLCL0(wv, press0, temp0):
     
     #will return plcl, Tlcl when Tchange returns approx. 0 
     #(i.e. when the parcel temperature = Td)
-    plcl = fzero(Tchange, [1000*100, 200*100], (wv, theta0))
+    #starting from Bolton's LCL pressure
+    plcl = fzero_newton(TchangeDeriv, 1000*100, 200*100, wv, theta0,
+                        x0=LCLfind(Td, temp0, press0)[1])
     Tlcl = invtheta(theta0, plcl, wv)
     
     return plcl, Tlcl
@@ -71,7 +85,7 @@ def Tchange(pguess, wv0, theta0):
     
     Parameters 
     - - - - - -
-    pguess: float, a guess at the pressure at the LCL (input via fzero) (Pa)
+    pguess: float, a guess at the pressure at the LCL (input via fzero_bracket) (Pa)
     wv0: float, mixing ratio of the parcel (kg/kg)
     theta0: float, potential temperature of the parcel
     
@@ -86,6 +100,17 @@ def Tchange(pguess, wv0, theta0):
     Td = Tdfind(wv0, pguess)
     return T - Td
 
+def TchangeDeriv(pguess, wv0, theta0):
+    # Tchange and its derivative in pguess: the dry adiabat has
+    # dT/dp = power*T/p, and with u = log(e/611.2) the dewpoint of
+    # Tdfind has dTd/dp = 243.5*17.67/(u*(17.67/u - 1))**2/p
+    T = invtheta(theta0, pguess, wv0)
+    power = c.Rd/c.cpd*(1. - 0.24*wv0)
+    u = np.log(wv0*pguess/(c.eps + wv0)/611.2)
+    Td = 243.5/(17.67/u - 1.) + c.Tc
+    dTd = 243.5*17.67/(u*(17.67/u - 1.))**2/pguess
+    return T - Td, power*T/pguess - dTd
+
 def _test():
     import doctest
     doctest.testmod()
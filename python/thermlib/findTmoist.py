@@ -1,86 +1,529 @@
 """This is the docstring for the findTmoist.py module. This module
-contains two functions: findTmoist and thetaEchange."""
+contains seven functions: findTmoist, thetaEchange, newtonTmoist,
+walkTmoist, warmTmoist, moist_adiabat_ode and thetaesNewton."""
 
-from scipy import optimize 
+import numpy as np
 
+from constants import constants
+from rootfinder import fzero_bracket
 from thetaes import thetaes
+from new_thermo import thetaesDeriv
 
-def findTmoist(thetaE0, press):
+def findTmoist(thetaE0, press, engine='bracket'):
     """
-    findTmoist(thetaE0, press)
-    
+    findTmoist(thetaE0, press, engine='bracket')
+
     Calculates the temperatures along a moist adiabat.
-    
+
     Parameters
     - - - - - -
-    thetaE0 : float
+    thetaE0 : float or array_like
         Initial equivalent potential temperature (K).
     press : float or array_like
         Pressure (Pa).
+    engine : str, optional
+        'bracket' (default) solves every (thetaE0, press) pair
+        at once with rootfinder.fzero_bracket on [50 K, 400 K].
+        'walk' needs a 1-d 'press' and starts each level from the
+        one before, see 'walkTmoist'. 'brenth' solves one level at
+        a time with scipy's brenth and needs a scalar 'thetaE0'.
+        'newton' uses Newton steps on every pair at once, see
+        'newtonTmoist'. 'ode' integrates dT/dp once across the
+        range of 'press' and reads every level off the dense
+        output, see 'moist_adiabat_ode'. 'table' interpolates in a
+        precomputed table, see adiabatTable.tableTmoist.
 
     Returns
     - - - -
     Temp : float or array_like
         Temperature (K) of thetaE0 adiabat at 'press'.
 
+    Raises
+    - - - -
+    NameError
+        If 'engine' is not recognized.
+
     Examples
     - - - - -
-    >>> findTmoist(300., 8.e4)
-    270.59590841970277
-    
-    >>> findTmoist(330., 800)
+    >>> print '%.6f' % findTmoist(300., 8.e4)
+    270.595908
+
+    >>> print '%.4f' % findTmoist(330., 800)
     83.1818
-    
+
+    >>> press = np.linspace(1.e5, 2.e4, 20)
+    >>> Tbrenth = findTmoist(330., press, engine='brenth')
+    >>> Tbracket = findTmoist(330., press)
+    >>> Tnewton = findTmoist(330., press, engine='newton')
+    >>> np.max(np.abs(Tbracket - Tbrenth)) < 1.e-9
+    True
+    >>> np.max(np.abs(Tnewton - Tbrenth)) < 1.e-6
+    True
+    >>> Tode = findTmoist(330., press, engine='ode')
+    >>> np.max(np.abs(Tode - Tbrenth)) < 1.e-5
+    True
+
     """
+    if engine == 'bracket':
+        return fzero_bracket(thetaEchange, 50., 400., thetaE0, press)
+    elif engine == 'walk':
+        return walkTmoist(thetaE0, press)
+    elif engine == 'newton':
+        return newtonTmoist(thetaE0, press)
+    elif engine == 'ode':
+        press = np.asarray(press, dtype=float)
+        Tprofile = moist_adiabat_ode(thetaE0, np.max(press), np.min(press))
+        return Tprofile(press)
+    elif engine == 'table':
+        from adiabatTable import tableTmoist
+        return tableTmoist(thetaE0, press)
+    elif engine != 'brenth':
+        raise NameError('engine must be bracket, walk, brenth, newton, ode or table');
+
+    from scipy import optimize
 
     # First determine if press can be indexed
     try: len(press)
     except: #press is a single value
         Temp = optimize.zeros.brenth(thetaEchange, 50, 400, \
                                         (thetaE0, press));
-    else: #press is a vector           
+    else: #press is a vector
         Temp = []
-        press = list(press)        
-        for i in press:            
-            # This assumes that the dewpoint is somewhere between 
+        press = list(press)
+        for i in press:
+            # This assumes that the dewpoint is somewhere between
             # 250K and 350K.
             Temp.append(optimize.zeros.brenth(thetaEchange, 50, \
                                                  400, (thetaE0, i)));
-            #{'in Tmoist: ',i, result(i)}  
-        
+            #{'in Tmoist: ',i, result(i)}
+
     return Temp
-    
+
 
 def thetaEchange(Tguess, thetaE0, press):
     """
     thetaEchange(Tguess, thetaE0, press)
 
-    Evaluates the equation and passes it back to brenth.
+    Evaluates the equation and passes it back to the rootfinder.
 
     Parameters
     - - - - - -
-    Tguess : float
+    Tguess : float or ndarray
         Trial temperature value (K).
-    ws0 : float
-        Initial saturated mixing ratio (kg/kg).
-    press : float
+    thetaE0 : float or ndarray
+        Equivalent potential temperature (K).
+    press : float or ndarray
         Pressure (Pa).
 
     Returns
     - - - -
-    theDiff : float
+    theDiff : float or ndarray
         The difference between the values of 'thetaEguess' and
         'thetaE0'. This difference is then compared to the tolerance
-        allowed by brenth.
-        
+        allowed by the rootfinder.
+
     """
     thetaEguess = thetaes(Tguess, press);
-    
+
     #when this result is small enough we're done
     theDiff = thetaEguess - thetaE0;
     return theDiff
 
 
+def newtonTmoist(thetaE0, press, xtol=1.e-9, maxiter=60):
+    """
+    newtonTmoist(thetaE0, press, xtol=1.e-9, maxiter=60)
+
+    Calculates the temperatures along moist adiabats for whole
+    arrays of thetaE0 and pressure at once.
+
+    Parameters
+    - - - - - -
+    thetaE0 : float or array_like
+        Equivalent potential temperature (K).
+    press : float or array_like
+        Pressure (Pa). Broadcast against 'thetaE0'.
+    xtol : float, optional
+        An element stops iterating once its Newton step is
+        smaller than 'xtol' (K).
+    maxiter : int, optional
+        Maximum number of array-wide iterations; elements still
+        iterating after that are solved by rootfinder.fzero_bracket.
+
+    Returns
+    - - - -
+    Temp : float or ndarray
+        Temperature (K) with the broadcast shape of the inputs.
+        Elements with no root between 50 K and 400 K (where
+        brenth would raise) are nan.
+
+    Notes
+    - - -
+    Every element keeps its own bracket inside [50 K, 400 K] and
+    takes a Newton step on thetaes(T, p) - thetaE0, falling back to
+    bisection whenever the step leaves the bracket.  Only the
+    elements that have not converged are evaluated on each pass.
+    The answers agree with the brenth engine to better than 1.e-6 K.
+    Any element that has not converged after 'maxiter' passes falls
+    back to fzero_bracket, as in 'warmTmoist', so no unconverged
+    temperature is returned.
+
+    Examples
+    - - - - -
+    >>> test = abs(newtonTmoist(300., 8.e4) - 270.5959084197) < 1.e-6
+    >>> test
+    True
+    >>> Temp = newtonTmoist([[300.], [330.]], [8.e4, 5.e4, 3.e4])
+    >>> Temp.shape
+    (2, 3)
+    >>> np.allclose(newtonTmoist([[300.], [330.]], [8.e4, 5.e4, 3.e4],
+    ...                          maxiter=1), Temp, rtol=0., atol=1.e-6)
+    True
+
+    """
+    thetaE0, press = np.broadcast_arrays(np.asarray(thetaE0, dtype=float),
+                                         np.asarray(press, dtype=float))
+    theShape = thetaE0.shape
+    thetaE0 = thetaE0.ravel()
+    press = press.ravel()
+    Tlow = np.empty_like(thetaE0)
+    Tlow.fill(50.)
+    Thigh = np.empty_like(thetaE0)
+    Thigh.fill(400.)
+    flow, dummy = thetaesNewton(Tlow, press)
+    fhigh, dummy = thetaesNewton(Thigh, press)
+    hit = (flow - thetaE0 <= 0.) & (fhigh - thetaE0 >= 0.)
+    Temp = np.empty_like(thetaE0)
+    Temp.fill(np.nan)
+    # The dry adiabat lies on the warm side of the root, where
+    # thetaes is convex, so Newton heads down to it monotonically.
+    c = constants();
+    Tdry = thetaE0 * (press / c.p0) ** (c.Rd / c.cpd)
+    Temp[hit] = np.clip(Tdry[hit], 50., 400.)
+    active = np.flatnonzero(hit)
+    for count in range(maxiter):
+        if active.size == 0:
+            break
+        T = Temp[active]
+        f, df = thetaesNewton(T, press[active])
+        f = f - thetaE0[active]
+        lo = Tlow[active]
+        hi = Thigh[active]
+        lo[f < 0.] = T[f < 0.]
+        hi[f >= 0.] = T[f >= 0.]
+        Tlow[active] = lo
+        Thigh[active] = hi
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Tnew = T - f / df
+        done = (np.abs(Tnew - T) < xtol) | (f == 0.)
+        Tnew[f == 0.] = T[f == 0.]
+        bisect = ~done & ~((Tnew > lo) & (Tnew < hi))
+        Tnew[bisect] = 0.5 * (lo[bisect] + hi[bisect])
+        Temp[active] = Tnew
+        active = active[~done]
+    if active.size > 0:
+        Temp[active] = fzero_bracket(thetaEchange, 50., 400.,
+                                     thetaE0[active], press[active])
+    Temp = Temp.reshape(theShape)
+    if Temp.ndim == 0:
+        Temp = Temp[()]
+    return Temp
+
+
+def walkTmoist(thetaE0, press, lapse=True, xtol=1.e-9, maxiter=10,
+               full_output=False):
+    """
+    walkTmoist(thetaE0, press, lapse=True, xtol=1.e-9, maxiter=10,
+               full_output=False)
+
+    Calculates the temperatures along moist adiabats by walking
+    through the pressure levels in order, starting each level from
+    the answer at the level before.
+
+    Parameters
+    - - - - - -
+    thetaE0 : float or array_like
+        Equivalent potential temperature (K) of one or more adiabats.
+    press : array_like
+        1-d sequence of pressure levels (Pa), best closely spaced.
+    lapse : bool, optional
+        If True (default) the first guess at each level follows the
+        moist lapse rate dT/dp from the level before, which comes
+        free with its last Newton step (see 'warmTmoist').  If False the guess is just
+        the previous temperature.
+    xtol : float, optional
+        A level is done once its Newton step is smaller than 'xtol' (K).
+    maxiter : int, optional
+        Newton steps allowed per level before that level falls back
+        to rootfinder.fzero_bracket on [50 K, 400 K].
+    full_output : bool, optional
+        If True also return the number of thetaes evaluations used at
+        every level.
+
+    Returns
+    - - - -
+    Temp : ndarray
+        Temperature (K) with shape press.shape + thetaE0.shape.
+    nevals : ndarray of int
+        Only if 'full_output'.  Evaluations per level and adiabat.
+
+    Raises
+    - - - -
+    NameError
+        If 'press' is not 1-d.
+
+    Notes
+    - - -
+    The first level is bracketed on [50 K, 400 K].  Every later level
+    takes Newton steps from the warm start, which usually converge
+    in 3 evaluations, against about 10 for fzero_bracket and 11 for
+    brenth on the full bracket.
+
+    Examples
+    - - - - -
+    >>> from scipy import optimize
+    >>> press = np.linspace(9.e4, 2.e4, 100)
+    >>> Temp, nevals = walkTmoist(330., press, full_output=True)
+    >>> Tbrenth = findTmoist(330., press, engine='brenth')
+    >>> np.max(np.abs(Temp - Tbrenth)) < 1.e-8
+    True
+    >>> calls = [optimize.brenth(thetaEchange, 50, 400, (330., p),
+    ...                          full_output=True)[1].function_calls
+    ...          for p in press]
+    >>> np.mean(nevals[1:]) < np.mean(calls) / 3.
+    True
+    >>> np.mean(walkTmoist(330., press, lapse=False,
+    ...                    full_output=True)[1][1:])
+    4.0
+    >>> Temp = walkTmoist([300., 330.], press)
+    >>> Temp.shape
+    (100, 2)
+
+    """
+    thetaE0 = np.asarray(thetaE0, dtype=float)
+    press = np.asarray(press, dtype=float)
+    if press.ndim != 1:
+        raise NameError('press must be a 1-d sequence of levels')
+    theShape = press.shape + thetaE0.shape
+    thetaE0 = thetaE0.ravel()
+    Temp = np.empty((press.size, thetaE0.size))
+    nevals = np.zeros((press.size, thetaE0.size), int)
+    T = np.empty(thetaE0.size)
+    T.fill(np.nan)
+    for k in range(press.size):
+        if k > 0:
+            T = Temp[k-1]
+            if lapse:
+                T = T + slope * (press[k] - press[k-1])
+        Temp[k], slope, nevals[k] = warmTmoist(thetaE0, press[k], T,
+                                               xtol, maxiter)
+    Temp = Temp.reshape(theShape)
+    if full_output:
+        return Temp, nevals.reshape(theShape)
+    return Temp
+
+
+def warmTmoist(thetaE0, press, Tguess, xtol=1.e-9, maxiter=10):
+    """
+    warmTmoist(thetaE0, press, Tguess, xtol=1.e-9, maxiter=10)
+
+    Calculates the temperatures along moist adiabats by Newton steps
+    from a nearby first guess, falling back to
+    rootfinder.fzero_bracket on [50 K, 400 K] wherever that fails.
+
+    Parameters
+    - - - - - -
+    thetaE0 : float or array_like
+        Equivalent potential temperature (K).
+    press : float or array_like
+        Pressure (Pa).
+    Tguess : float or array_like
+        First guess temperature (K); nan means no guess, so the
+        element goes straight to the bracketing solver.
+    xtol : float, optional
+        An element is done once its Newton step is smaller than
+        'xtol' (K).
+    maxiter : int, optional
+        Newton steps allowed before falling back to the bracket.
+
+    Returns
+    - - - -
+    Temp : ndarray
+        Temperature (K) with the broadcast shape of the inputs.
+    slope : ndarray
+        Moist lapse rate dT/dp (K/Pa) at (Temp, press).
+    nevals : ndarray of int
+        Number of thetaes evaluations used by every element.
+
+    Examples
+    - - - - -
+    >>> Temp, slope, nevals = warmTmoist(330., [8.e4, 5.e4], [290., np.nan])
+    >>> np.allclose(Temp, findTmoist(330., [8.e4, 5.e4], engine='brenth'))
+    True
+    >>> nevals[0] < nevals[1]
+    True
+
+    """
+    arrays = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                   for x in (thetaE0, press, Tguess)])
+    theShape = arrays[0].shape
+    thetaE0, press, T = [np.array(x).ravel() for x in arrays]
+    nevals = np.zeros(T.shape, int)
+    slope = np.zeros(T.shape)
+    active = np.flatnonzero(np.isfinite(T))
+    stuck = list(np.flatnonzero(~np.isfinite(T)))
+    for count in range(maxiter):
+        if active.size == 0:
+            break
+        f, dfdT, dfdp = thetaesNewton(T[active], press[active],
+                                      dpress=True)
+        nevals[active] += 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = (f - thetaE0[active]) / dfdT
+            slope[active] = -dfdp / dfdT
+        T[active] = T[active] - step
+        bad = ~np.isfinite(step) | (T[active] < 50.) | (T[active] > 400.)
+        stuck.extend(active[bad])
+        active = active[~bad & (np.abs(step) >= xtol)]
+    stuck = np.union1d(stuck, active).astype(int)
+    if stuck.size > 0:
+        T[stuck], niter, ok = fzero_bracket(thetaEchange, 50., 400.,
+                                            thetaE0[stuck], press[stuck],
+                                            full_output=True)
+        f, dfdT, dfdp = thetaesNewton(T[stuck], press[stuck], dpress=True)
+        nevals[stuck] += niter + 3
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope[stuck] = -dfdp / dfdT
+    slope[~np.isfinite(slope)] = 0.
+    return (T.reshape(theShape), slope.reshape(theShape),
+            nevals.reshape(theShape))
+
+
+def moist_adiabat_ode(thetaE0, pressStart, pressEnd, rtol=1.e-10,
+                      atol=1.e-10):
+    """
+    moist_adiabat_ode(thetaE0, pressStart, pressEnd, rtol=1.e-10,
+                      atol=1.e-10)
+
+    Integrates the moist lapse rate dT/dp once from 'pressStart' to
+    'pressEnd' and returns the whole moist adiabat as a function of
+    pressure.
+
+    Parameters
+    - - - - - -
+    thetaE0 : float or array_like
+        Equivalent potential temperature (K) of one or more adiabats,
+        integrated together.
+    pressStart, pressEnd : float
+        Pressure range (Pa); either may be the larger.
+    rtol, atol : float, optional
+        Tolerances for scipy.integrate.solve_ivp.
+
+    Returns
+    - - - -
+    Tprofile : function
+        Tprofile(press) gives the temperature (K) with shape
+        press.shape + thetaE0.shape from the dense output of the
+        integration.  Pressures outside the range give nan.
+
+    Notes
+    - - -
+    The starting temperature comes from rootfinder.fzero_bracket.
+    After that the integration uses the Dormand-Prince (RK45) scheme,
+    as in ode45/, on T(log p), with the slope
+    dT/dp = -(dthetaep/dp)/(dthetaep/dT) from 'thetaesNewton', so a
+    whole profile costs a few hundred thetaes evaluations however
+    many levels are asked for (under 200 from 1000 to 200 hPa at the
+    default tolerances, good to about 1.e-6 K).  See
+    bench_moist_adiabat.py for timings
+    against the per-level engines.
+
+    Examples
+    - - - - -
+    >>> Tprofile = moist_adiabat_ode(330., 1.e5, 2.e4)
+    >>> press = np.linspace(1.e5, 2.e4, 50)
+    >>> Tbrenth = findTmoist(330., press, engine='brenth')
+    >>> np.max(np.abs(Tprofile(press) - Tbrenth)) < 1.e-5
+    True
+    >>> Tprofile(1.5e4)
+    nan
+    >>> Tprofile = moist_adiabat_ode([300., 330.], 2.e4, 1.e5)
+    >>> Tprofile(press).shape
+    (50, 2)
+    >>> np.allclose(Tprofile(press)[:, 1], Tbrenth)
+    True
+
+    """
+    from scipy.integrate import solve_ivp
+
+    thetaE0 = np.asarray(thetaE0, dtype=float)
+    theShape = thetaE0.shape
+    thetaE0 = thetaE0.ravel()
+    T0 = fzero_bracket(thetaEchange, 50., 400., thetaE0, pressStart)
+
+    def lapse(logp, T):
+        press = np.exp(logp)
+        f, dfdT, dfdp = thetaesNewton(T, press + 0.*T, dpress=True)
+        # dT/dlog(p) = p dT/dp
+        return -press * dfdp / dfdT
+
+    logStart = np.log(pressStart)
+    logEnd = np.log(pressEnd)
+    soln = solve_ivp(lapse, (logStart, logEnd), T0, method='RK45',
+                     dense_output=True, rtol=rtol, atol=atol)
+    if not soln.success:
+        raise ValueError(soln.message)
+    logLow = min(logStart, logEnd)
+    logHigh = max(logStart, logEnd)
+
+    def Tprofile(press):
+        logp = np.log(np.asarray(press, dtype=float))
+        Temp = np.atleast_2d(soln.sol(logp.ravel()).T)
+        outside = (logp.ravel() < logLow) | (logp.ravel() > logHigh)
+        Temp[outside] = np.nan
+        Temp = Temp.reshape(logp.shape + theShape)
+        if Temp.ndim == 0:
+            Temp = Temp[()]
+        return Temp
+
+    return Tprofile
+
+
+def thetaesNewton(Temp, press, dpress=False):
+    """
+    thetaesNewton(Temp, press, dpress=False)
+
+    Array version of thetaes, together with its derivative with
+    respect to temperature, for use by 'newtonTmoist'.
+
+    Parameters
+    - - - - - -
+    Temp : ndarray
+        Temperature (K).
+    press : ndarray
+        Pressure (Pa).
+    dpress : bool, optional
+        If True also return the derivative with respect to pressure.
+
+    Returns
+    - - - -
+    thetaep : ndarray
+        Pseudo equivalent potential temperature (K), pegged at 450 K
+        like thetaes.
+    dthetaep : ndarray
+        d(thetaep)/dT (dimensionless).
+    dthetaepdp : ndarray
+        d(thetaep)/dp (K/Pa), only if 'dpress' is True.  Along a moist
+        adiabat dT/dp = -dthetaepdp/dthetaep.
+
+    Notes
+    - - -
+    This is new_thermo.thetaesDeriv, which has the formulas.
+
+    """
+    return thetaesDeriv(Temp, press, dpress)
+
+
 def _test():
     import doctest
     doctest.testmod()
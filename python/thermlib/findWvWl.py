@@ -3,7 +3,6 @@ contains two functions: findWvWl and islist..
 """
 
 import numpy as np
-import matplotlib.cbook as cbook
 
 from wsat import wsat
 
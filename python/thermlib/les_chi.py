@@ -0,0 +1,224 @@
+"""This is the docstring for the les_chi.py module. This module
+contains env_profile and chi_analysis, which run SAM.find_chi over
+every cloudy point of a SAM LES volume, such as the subsets written
+by make_subset.py, a slab of levels at a time."""
+
+import numpy
+
+import SAM
+
+def _levels(field, k0, k1, scale):
+    # levels k0:k1 of a (z, y, x) field as floats, scaled to SI;
+    # netCDF variables and memmaps only read those levels
+    return numpy.asarray(field[k0:k1], dtype=float) * scale
+
+def _slab_rows(shape, chunk):
+    # whole levels per slab, about 'chunk' points at a time
+    level = int(numpy.prod(shape[1:]))
+    return max(1, chunk // max(level, 1))
+
+def env_profile(TABS, QV, QN=None, qn_min=1.e-5, chunk=2**20,
+                qscale=1.):
+    """
+    env_profile(TABS, QV, QN=None, qn_min=1.e-5, chunk=2**20, qscale=1.)
+
+    Environmental temperature and vapour profiles from the horizontal
+    means of a (z, y, x) LES volume.
+
+    Parameters
+    - - - - - -
+    TABS : array_like
+        Temperature (K), any object that can be sliced along its first
+        (z) axis, e.g. an ndarray or a netCDF variable.
+    QV : array_like
+        Vapour mixing ratio, same shape as TABS.
+    QN : array_like, optional
+        Cloud condensate.  If given, the means are over the points with
+        QN <= qn_min only; levels with no clear points use all points.
+    qn_min : float, optional
+        Threshold for cloudy points, in the scaled units.
+    chunk : int, optional
+        Approximate number of points read at a time.
+    qscale : float, optional
+        Factor that converts QV and QN to kg/kg, e.g. 1.e-3 for the
+        g/kg fields in SAM output.
+
+    Returns
+    - - - -
+    T_env, qv_env : ndarray
+        Mean temperature (K) and vapour mixing ratio (kg/kg), one value
+        per level.
+
+    """
+    nz = TABS.shape[0]
+    rows = _slab_rows(TABS.shape, chunk)
+    T_env = numpy.empty(nz)
+    qv_env = numpy.empty(nz)
+    for k0 in range(0, nz, rows):
+        k1 = min(k0 + rows, nz)
+        T = _levels(TABS, k0, k1, 1.).reshape(k1 - k0, -1)
+        qv = _levels(QV, k0, k1, qscale).reshape(k1 - k0, -1)
+        if QN is None:
+            T_env[k0:k1] = T.mean(axis=1)
+            qv_env[k0:k1] = qv.mean(axis=1)
+            continue
+        clear = _levels(QN, k0, k1, qscale).reshape(k1 - k0, -1) <= qn_min
+        nclear = clear.sum(axis=1)
+        T_all = T.mean(axis=1)
+        qv_all = qv.mean(axis=1)
+        with numpy.errstate(invalid='ignore'):
+            T_env[k0:k1] = numpy.where(clear, T, 0.).sum(axis=1)/nclear
+            qv_env[k0:k1] = numpy.where(clear, qv, 0.).sum(axis=1)/nclear
+        T_env[k0:k1][nclear == 0] = T_all[nclear == 0]
+        qv_env[k0:k1][nclear == 0] = qv_all[nclear == 0]
+    return T_env, qv_env
+
+def _chi_slab(T, qv, qn, p, T_env, qv_env, qn_min, bins, dtype):
+    # chi at the cloudy points of one slab of levels, plus the
+    # per-level histograms and cloudy point counts
+    nlev = T.shape[0]
+    chi = numpy.empty(T.shape, dtype)
+    chi.fill(numpy.nan)
+    hist = numpy.zeros((nlev, len(bins) - 1), int)
+    cloudy = qn > qn_min
+    k = numpy.nonzero(cloudy)[0]
+    ncloud = numpy.bincount(k, minlength=nlev)
+    if k.size == 0:
+        return chi, hist, ncloud
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        values = SAM.find_chi(T[cloudy], T_env[k], qv[cloudy], qv_env[k],
+                              qn[cloudy], 0., 0.,
+                              numpy.broadcast_to(p, T.shape)[cloudy])
+    chi[cloudy] = values
+    # the cloudy points come out level by level, so split at the counts
+    for lev, v in enumerate(numpy.split(values, numpy.cumsum(ncloud)[:-1])):
+        hist[lev] = numpy.histogram(v[numpy.isfinite(v)], bins)[0]
+    return chi, hist, ncloud
+
+def _chi_task(args):
+    return _chi_slab(*args)
+
+def chi_analysis(TABS, QV, QN, p, env=None, bins=None, qn_min=1.e-5,
+                 chunk=2**20, workers=None, dtype=numpy.float32,
+                 qscale=1., pscale=1.):
+    """
+    chi_analysis(TABS, QV, QN, p, env=None, bins=None, qn_min=1.e-5,
+                 chunk=2**20, workers=None, dtype=numpy.float32,
+                 qscale=1., pscale=1.)
+
+    Critical mixing fraction (SAM.find_chi) at every cloudy point of a
+    (z, y, x) LES volume, worked through in slabs of whole levels.
+
+    Parameters
+    - - - - - -
+    TABS, QV, QN : array_like
+        Temperature (K), vapour mixing ratio and cloud condensate.  Any
+        object that can be sliced along its first (z) axis will do, so
+        netCDF variables are read one slab at a time.
+    p : array_like
+        Pressure, one value per level or the full field.
+    env : tuple, optional
+        (T_env, qv_env) profiles in K and kg/kg.  Defaults to the clear
+        air horizontal means from env_profile.
+    bins : array_like, optional
+        Histogram bin edges for chi, default 50 bins on [0, 1].
+    qn_min : float, optional
+        Points with QN > qn_min (after scaling) are cloudy.
+    chunk : int, optional
+        Approximate number of points per slab; only a few slabs are in
+        memory at once, besides the chi output itself.
+    workers : int, optional
+        Number of processes for a multiprocessing pool working on
+        separate slabs.  The results do not depend on 'workers'.
+    dtype : numpy dtype, optional
+        dtype of the chi field.
+    qscale, pscale : float, optional
+        Factors that convert QV, QN to kg/kg and p to Pa, e.g. 1.e-3
+        and 100. for the g/kg and hPa fields in SAM output.
+
+    Returns
+    - - - -
+    result : dict
+        'chi' (field, nan at clear points), 'hist' (counts per level
+        and bin), 'bins', 'ncloud' (cloudy points per level), 'T_env'
+        and 'qv_env'.
+
+    Examples
+    - - - - -
+    >>> Tbar = 300. - numpy.linspace(0., 20., 8)[:, None, None]
+    >>> T = Tbar + numpy.linspace(-1., 1., 30).reshape(5, 6)
+    >>> p = numpy.linspace(1.e5, 8.e4, 8)
+    >>> qn = numpy.where(T > Tbar + 0.5, 1.e-3, 0.)
+    >>> qv = SAM.qsatw(T, p[:, None, None] + 0.*T) \\
+    ...      * numpy.where(qn > 0., 1., 0.8)
+    >>> out = chi_analysis(T, qv, qn, p, chunk=60)
+    >>> out['ncloud']
+    array([8, 8, 8, 8, 8, 8, 8, 8])
+    >>> numpy.nonzero(out['hist'][0])[0]
+    array([21, 22, 23, 24, 25, 26])
+    >>> par = chi_analysis(T, qv, qn, p, chunk=60, workers=2)
+    >>> numpy.array_equal(out['hist'], par['hist'])
+    True
+
+    """
+    if bins is None:
+        bins = numpy.linspace(0., 1., 51)
+    bins = numpy.asarray(bins, dtype=float)
+    if env is None:
+        env = env_profile(TABS, QV, QN, qn_min, chunk, qscale)
+    T_env, qv_env = [numpy.asarray(x, dtype=float) for x in env]
+    p = numpy.asarray(p, dtype=float) * pscale
+    shape = TABS.shape
+    nz = shape[0]
+    rows = _slab_rows(shape, chunk)
+
+    chi = numpy.empty(shape, dtype)
+    hist = numpy.zeros((nz, len(bins) - 1), int)
+    ncloud = numpy.zeros(nz, int)
+
+    def tasks():
+        for k0 in range(0, nz, rows):
+            k1 = min(k0 + rows, nz)
+            if p.ndim == 1:
+                p_slab = p[k0:k1].reshape((-1,) + (1,)*(len(shape) - 1))
+            else:
+                p_slab = p[k0:k1]
+            yield k0, k1, (_levels(TABS, k0, k1, 1.),
+                           _levels(QV, k0, k1, qscale),
+                           _levels(QN, k0, k1, qscale), p_slab,
+                           T_env[k0:k1], qv_env[k0:k1], qn_min, bins, dtype)
+
+    def store(k0, k1, answer):
+        chi[k0:k1], hist[k0:k1], ncloud[k0:k1] = answer
+
+    if not workers:
+        for k0, k1, args in tasks():
+            store(k0, k1, _chi_task(args))
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        try:
+            # keep at most two slabs per worker in flight, so memory
+            # stays bounded however large the volume is
+            pending = []
+            for k0, k1, args in tasks():
+                pending.append((k0, k1, pool.apply_async(_chi_task, (args,))))
+                if len(pending) >= 2*workers:
+                    k0, k1, job = pending.pop(0)
+                    store(k0, k1, job.get())
+            for k0, k1, job in pending:
+                store(k0, k1, job.get())
+        finally:
+            pool.close()
+            pool.join()
+
+    return {'chi': chi, 'hist': hist, 'bins': bins, 'ncloud': ncloud,
+            'T_env': T_env, 'qv_env': qv_env}
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
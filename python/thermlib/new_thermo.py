@@ -1,7 +1,6 @@
 import numpy as np
-from rootfinder import fzero
+from rootfinder import fzero_newton
 from constants import constants as c
-import matplotlib.cbook as cbook
 import numpy.testing as test
 
 def convertSkewToTemp(xcoord, press, skew):
@@ -68,44 +67,37 @@ def findWvWl(Temp, wT, press):
 
     Parameters
     - - - - - -
-    Temp : float
+    Temp : float or array_like
         Temperature (K).
-    wT : float
+    wT : float or array_like
         Total water mixing ratio (kg/kg).
-    press : float
+    press : float or array_like
         Pressure (Pa).
 
 
     Returns
     - - - -
-    wv : float
+    wv : float or ndarray
         Water vapour mixing ratio (kg/kg).
-    wl : float
+    wl : float or ndarray
         Liquid water mixing ratio (kg/kg).
 
-
-    Raises
-    - - - -
-    AssertionError
-        If any of the inputs are in vector form.
+    Array inputs are broadcast against each other.
 
     Examples
     - - - - -
     >>> test.assert_almost_equal(findWvWl(250., 0.01, 8.e4),(0.00074, 0.00925),decimal=5)
     >>> test.assert_almost_equal(findWvWl(300., 0.01, 8.e4),(0.01, 0),decimal=4)
+    >>> wv, wl = findWvWl([250., 300.], 0.01, [8.e4, 9.e4])
+    >>> test.assert_array_almost_equal(wl,[0.00925, 0.],decimal=5)
     """
-    Temp=np.atleast_1d(Temp)
-    press=np.atleast_1d(press)
-    wT=np.atleast_1d(wT)
-    if (np.size(Temp)*np.size(press)*np.size(wT)) != 1:
-        raise AssertionError('need three scalars')
     wsVal = wsat(Temp, press)
-    if wsVal[0] > wT[0]: #unsaturated
-        wv = wT[0]
-        wl = 0
-    else:  #saturated
-        wv = wsVal[0]
-        wl = wT[0] - wv
+    #unsaturated: wv = wT, saturated: wv = wsVal
+    wv = np.minimum(wsVal, wT)
+    wl = wT - wv
+    if np.ndim(wv) == 0:
+        wv = float(wv)
+        wl = float(wl)
     return wv, wl
 
 def tinvert_thetae(thetaeVal, wT, p):
@@ -118,22 +110,26 @@ def tinvert_thetae(thetaeVal, wT, p):
 
     Parameters
     - - - - - -
-    thetaeVal : float
+    thetaeVal : float or array_like
         Thetae of parcel (K).
-    wtotal : float
+    wtotal : float or array_like
         Total water mixing ratio (kg/kg).
-    p : float
+    p : float or array_like
         Pressure of parcel in (Pa).
 
     Returns
     - - - -
-    theTemp : float
+    theTemp : float or ndarray
         Temperature for which thetaep equals the parcel thetae (K).
-    wv : float
+    wv : float or ndarray
         Vapor mixing ratio of the parcel (kg/kg).
-    wl : float
+    wl : float or ndarray
         liquid water mixing ratio of the parcel (kg/kg) at 'p'.
 
+    Array inputs are broadcast against each other and all of the
+    parcels are solved together, by Newton steps on the analytic
+    derivative from TchangeDeriv (rootfinder.fzero_newton).
+
     Raises
     - - - -
     IOError
@@ -142,18 +138,25 @@ def tinvert_thetae(thetaeVal, wT, p):
     Examples
     - - - - -
     >>> test.assert_array_almost_equal(tinvert_thetae(300., 0.001, 8.e4),(278.405, 0.001, 0),decimal=3)
+    >>> temp, wv, wl = tinvert_thetae(330., 0.014, [9.e4, 7.e4, 5.e4])
+    >>> test.assert_array_almost_equal(temp,[287.6, 277.4, 261.9],decimal=1)
+    >>> temp.shape == wv.shape == wl.shape == (3,)
+    True
     
     """
-    import scipy.optimize
-    
-    if p > 1.e5:
+    thetaeVal, wT, p = np.broadcast_arrays(np.asarray(thetaeVal, dtype=float),
+                                           np.asarray(wT, dtype=float),
+                                           np.asarray(p, dtype=float))
+    if np.any(p > 1.e5):
         raise IOError('expecting pressure level less than 100000 Pa')
     # The temperature has to be somewhere between thetae
     # (T at surface) and -40 deg. C (no ice).    
-    handle = Tchange
-    theTemp = scipy.optimize.zeros.brenth(handle, 50, \
-                                      thetaeVal, (thetaeVal, wT, p));
+    # Newton starts from the dry adiabat, on the warm side of the root
+    theTemp = fzero_newton(TchangeDeriv, 50., thetaeVal, thetaeVal, wT, p,
+                           x0=thetaeVal*(p/c.p0)**(c.Rd/c.cpd))
     [wv,wl] = findWvWl(theTemp, wT, p);
+    if np.ndim(theTemp) == 0:
+        theTemp = float(theTemp)
     return theTemp,wv,wl
 
 
@@ -165,6 +168,20 @@ def Tchange(Tguess, thetaeVal, wT, p):
     return thetaeVal - thetaep(tdGuess, Tguess, p);
 
 
+def TchangeDeriv(Tguess, thetaeVal, wT, p):
+    # Tchange and its derivative in Tguess: unsaturated the dewpoint is
+    # fixed by wT, saturated the parcel is on thetaes itself, rather
+    # than on thetaep at a dewpoint that is T to within roundoff, which
+    # can land on either side of the LCL branch
+    [wv, wl] = findWvWl(Tguess, wT, p);
+    tdGuess = Tdfind(wv, p);
+    theThetae, dthetae = thetaepDeriv(tdGuess, Tguess, p)
+    satThetae, satDeriv = thetaesDeriv(Tguess, p)
+    theThetae = np.where(wl > 0., satThetae, theThetae)
+    dthetae = np.where(wl > 0., satDeriv, dthetae)
+    return thetaeVal - theThetae, -dthetae
+
+
 def Tdfind(wv, p):
     """
     Tdfind(wv, p)
@@ -199,9 +216,9 @@ def Tdfind(wv, p):
     return Td
 
 
-def esat(Temp):
+def esat(Temp, out=None):
     """
-    esat(Temp)
+    esat(Temp, out=None)
 
     Calculates the saturation water vapor pressure over a flat
     surface of water at temperature 'T'.
@@ -210,10 +227,13 @@ def esat(Temp):
     - - - - - -
     Temp : float or array_like
         Temperature of parcel (K).
+    out : ndarray, optional
+        Float array to hold the result, so repeated calls don't
+        allocate. Must have a shape 'Temp' broadcasts to.
 
     Returns
     - - - -
-    esatOut : float or list
+    esatOut : float or ndarray
         Saturation water vapour pressure (Pa).
 
     Examples
@@ -221,25 +241,68 @@ def esat(Temp):
     >>> test.assert_almost_equal(esat(300.),3534.5196,decimal=3)
     >>> np.allclose(esat([300., 310.]),[3534.519, 6235.532])
     True
+    >>> buf = np.empty(2)
+    >>> esat([300., 310.], out=buf) is buf
+    True
 
     References
     - - - - - -
     Emanuel 4.4.14 p. 117
       
     """
-    # determine if Temp has been input as a vector
-    is_scalar=True
-    if cbook.iterable(Temp):
-        is_scalar = False
-    Temp=np.atleast_1d(Temp)
-    Tc = Temp - c.Tc
-    esatOut = 611.2 * np.exp(17.67 * Tc / (Tc + 243.5))
-    # if T is a vector
-    if is_scalar:
-        esatOut = esatOut[0]
-    return esatOut
+    if out is None:
+        out = np.empty(np.shape(Temp))
+    # 17.67*Tc/(Tc + 243.5) = 17.67 - 17.67*243.5/(Tc + 243.5),
+    # which can be built up in 'out' without temporaries
+    np.subtract(Temp, c.Tc - 243.5, out=out)
+    np.reciprocal(out, out=out)
+    out *= -17.67 * 243.5
+    out += 17.67
+    np.exp(out, out=out)
+    out *= 611.2
+    if out.ndim == 0:
+        return out[()]
+    return out
+
+
+def esatDeriv(Temp):
+    """
+    esatDeriv(Temp)
+
+    Saturation vapour pressure over water, as esat, together with
+    its temperature derivative.
+
+    Parameters
+    - - - - - -
+    Temp : float or array_like
+        Temperature (K).
+
+    Returns
+    - - - -
+    es : float or ndarray
+        Saturation water vapour pressure (Pa).
+    desdT : float or ndarray
+        d(es)/dT (Pa/K).
+
+    Examples
+    - - - - -
+    >>> es, desdT = esatDeriv(300.)
+    >>> test.assert_almost_equal(es, esat(300.), decimal=8)
+    >>> test.assert_almost_equal(desdT, (esat(300.001) - esat(299.999))/0.002, decimal=4)
+
+    References
+    - - - - - -
+    Emanuel 4.4.14 p. 117
+
+    """
+    Tc = np.asarray(Temp, dtype=float) - c.Tc
+    es = 611.2 * np.exp(17.67 * Tc / (Tc + 243.5))
+    desdT = es * 17.67 * 243.5 / (Tc + 243.5) ** 2
+    if es.ndim == 0:
+        return float(es), float(desdT)
+    return es, desdT
+
 
-    
 def LCLfind(Td, T, p):
     """
     LCLfind(Td, T, p)
@@ -303,9 +366,9 @@ def LCLfind(Td, T, p):
     return Tlcl, plcl
 
 
-def wsat(Temp, press):
+def wsat(Temp, press, out=None):
     """
-    wsat(Temp, press)
+    wsat(Temp, press, out=None)
 
     Calculates the saturation vapor mixing ratio of an air parcel.
 
@@ -314,46 +377,92 @@ def wsat(Temp, press):
     Temp : float or array_like
         Temperature in Kelvin.
     press : float or array_like
-        Pressure in Pa.
+        Pressure in Pa. Broadcast against 'Temp'.
+    out : ndarray, optional
+        Float array with the broadcast shape of 'Temp' and 'press'
+        to hold the result, so repeated calls don't allocate.
 
     Returns
     - - - -
-    theWs : float or array_like 
-        Saturation water vapor mixing ratio in (kg/kg).
-
-    Raises
-    - - - -
-    IOError
-        If both 'Temp' and 'press' are array_like.
+    theWs : float or ndarray
+        Saturation water vapor mixing ratio in (kg/kg), limited to
+        [0, 0.060] so rootfinders don't blow up.
 
     Examples
     - - - - -
     >>> test.assert_almost_equal(wsat(300, 8e4),0.02875,decimal=4)
     >>> test.assert_array_almost_equal(wsat([300,310], 8e4),[0.0287, 0.0525],decimal=4)
     >>> test.assert_array_almost_equal(wsat(300, [8e4, 7e4]),[0.0287, 0.0330],decimal=4)
-    >>> wsat([300, 310], [8e4, 7e4])
-    Traceback (most recent call last):
-        ...
-    IOError: Can't have two vector inputs.
-
-    """
-    is_scalar_temp=True
-    if cbook.iterable(Temp):
-        is_scalar_temp = False
-    is_scalar_press=True
-    if cbook.iterable(press):
-        is_scalar_press = False
-    Temp=np.atleast_1d(Temp)
-    press=np.atleast_1d(press)
-    if (np.size(Temp) !=1) and (np.size(press) != 1):
-        raise IOError, "Can't have two vector inputs."
-    es = esat(Temp);
-    theWs=(c.eps * es/ (press - es))
-    theWs[theWs > 0.060]=0.06
-    theWs[theWs < 0.0] = 0.
-    if is_scalar_temp and is_scalar_press:
-        theWs=theWs[0]
-    return theWs
+    >>> test.assert_array_almost_equal(wsat([300, 310], [8e4, 7e4]),[0.0287, 0.060],decimal=4)
+    >>> wsat([[280.], [300.]], [8e4, 7e4]).shape
+    (2, 2)
+
+    """
+    if out is None:
+        out = np.empty(np.broadcast(Temp, press).shape)
+    es = esat(Temp, out=out)
+    # eps*es/(press - es) = eps/(press/es - 1), done in place
+    np.divide(press, es, out=out)
+    out -= 1.
+    np.reciprocal(out, out=out)
+    out *= c.eps
+    np.clip(out, 0., 0.060, out=out)
+    if out.ndim == 0:
+        return out[()]
+    return out
+
+
+def wsatDeriv(Temp, press, dpress=False):
+    """
+    wsatDeriv(Temp, press, dpress=False)
+
+    Saturation mixing ratio, as wsat, together with its derivatives.
+
+    Parameters
+    - - - - - -
+    Temp : float or array_like
+        Temperature (K).
+    press : float or array_like
+        Pressure (Pa). Broadcast against 'Temp'.
+    dpress : bool, optional
+        If True also return the derivative with respect to pressure.
+
+    Returns
+    - - - -
+    ws : float or ndarray
+        Saturation water vapour mixing ratio (kg/kg), limited to
+        [0, 0.060] like wsat.
+    dwsdT : float or ndarray
+        d(ws)/dT (1/K), 0 where 'ws' is limited.
+    dwsdp : float or ndarray
+        d(ws)/dp (1/Pa), only if 'dpress' is True.
+
+    Examples
+    - - - - -
+    >>> ws, dwsdT, dwsdp = wsatDeriv(300., 8.e4, dpress=True)
+    >>> test.assert_almost_equal(ws, wsat(300., 8.e4), decimal=12)
+    >>> test.assert_almost_equal(dwsdT, (wsat(300.001, 8.e4) - wsat(299.999, 8.e4))/0.002, decimal=8)
+    >>> test.assert_almost_equal(dwsdp, (wsat(300., 8.e4 + 1.) - wsat(300., 8.e4 - 1.))/2., decimal=12)
+    >>> wsatDeriv([300., 320.], 7.e4)[1][1]
+    0.0
+
+    """
+    Temp, press = np.broadcast_arrays(np.asarray(Temp, dtype=float),
+                                      np.asarray(press, dtype=float))
+    es, desdT = esatDeriv(Temp)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ws = c.eps * es / (press - es)
+        dwsdT = c.eps * press * desdT / (press - es) ** 2
+        dwsdp = -ws / (press - es)
+    #the clipped values of wsat don't change
+    clipped = ~((ws >= 0.) & (ws <= 0.060))
+    ws = np.clip(ws, 0., 0.060)
+    dwsdT = np.where(clipped, 0., dwsdT)
+    dwsdp = np.where(clipped, 0., dwsdp)
+    out = (ws, dwsdT, dwsdp) if dpress else (ws, dwsdT)
+    if ws.ndim == 0:
+        out = tuple(float(x) for x in out)
+    return out
 
 
 def theta(*args):
@@ -418,24 +527,27 @@ def theta(*args):
     return thetaOut
 
 
-def thetaes(Temp, press):
+def thetaes(Temp, press, out=None):
     """
-    thetaes(Temp, press)
+    thetaes(Temp, press, out=None)
 
     Calculates the pseudo equivalent potential temperature of an air
     parcel.
 
     Parameters
     - - - - - -
-    Temp : float
+    Temp : float or array_like
         Temperature (K).
-    press : float
-        Pressure (Pa).
+    press : float or array_like
+        Pressure (Pa). Broadcast against 'Temp'.
+    out : ndarray, optional
+        Float array with the broadcast shape of 'Temp' and 'press'
+        to hold the result.
 
 
     Returns
     - - - -
-    thetaep : float
+    thetaep : float or ndarray
         Pseudo equivalent potential temperature (K).
 
 
@@ -454,22 +566,91 @@ def thetaes(Temp, press):
     Examples
     - - - - -
     >>> test.assert_almost_equal(thetaes(300., 8.e4),412.9736,decimal=4)
+    >>> test.assert_array_almost_equal(thetaes([280., 300.], [9.e4, 8.e4]),[308.31, 412.97],decimal=1)
     """
+    Temp = np.asarray(Temp, dtype=float)
+    press = np.asarray(press, dtype=float)
     # The parcel is saturated - prohibit supersaturation with Td > T.
     Tlcl = Temp;
     wv = wsat(Temp, press);
     thetaval = theta(Temp, press, wv);
     power = 0.2854 * (1 - 0.28 * wv);
-    thetaep = thetaval * np.exp(wv * (1 + 0.81 * wv) * \
-                                (3376. / Tlcl - 2.54))
+    if out is None:
+        out = np.empty(np.shape(wv))
+    np.exp(wv * (1 + 0.81 * wv) * (3376. / Tlcl - 2.54), out=out)
+    out *= thetaval
     #
     # peg this at 450 so rootfinder won't blow up
     #
-    if thetaep > 450.:
-        thetaep = 450;
-    return thetaep
+    np.minimum(out, 450., out=out)
+    if out.ndim == 0:
+        return out[()]
+    return out
+
+
+def thetaesDeriv(Temp, press, dpress=False):
+    """
+    thetaesDeriv(Temp, press, dpress=False)
+
+    Saturated pseudo equivalent potential temperature, as thetaes,
+    together with its derivatives.
 
+    Parameters
+    - - - - - -
+    Temp : float or array_like
+        Temperature (K).
+    press : float or array_like
+        Pressure (Pa). Broadcast against 'Temp'.
+    dpress : bool, optional
+        If True also return the derivative with respect to pressure.
+
+    Returns
+    - - - -
+    thetaes : float or ndarray
+        Pseudo equivalent potential temperature (K), pegged at 450 K
+        like thetaes.
+    dthetaesdT : float or ndarray
+        d(thetaes)/dT (dimensionless), 0 where it is pegged.
+    dthetaesdp : float or ndarray
+        d(thetaes)/dp (K/Pa), only if 'dpress' is True.  Along a moist
+        adiabat dT/dp = -dthetaesdp/dthetaesdT.
+
+    Examples
+    - - - - -
+    >>> th, dT, dp = thetaesDeriv(280., 8.e4, dpress=True)
+    >>> test.assert_almost_equal(th, thetaes(280., 8.e4), decimal=10)
+    >>> test.assert_almost_equal(dT, (thetaes(280.001, 8.e4) - thetaes(279.999, 8.e4))/0.002, decimal=5)
+    >>> test.assert_almost_equal(dp, (thetaes(280., 8.e4 + 1.) - thetaes(280., 8.e4 - 1.))/2., decimal=8)
+
+    References
+    - - - - - -
+    Emanuel 4.4.14 p. 117 and 4.7.9 p. 132
 
+    """
+    Temp, press = np.broadcast_arrays(np.asarray(Temp, dtype=float),
+                                      np.asarray(press, dtype=float))
+    wv, dwv, dwvdp = wsatDeriv(Temp, press, dpress=True)
+    logp = np.log(c.p0 / press)
+    power = c.Rd / c.cpd * (1. - 0.24 * wv)
+    expo = wv * (1 + 0.81 * wv) * (3376. / Temp - 2.54)
+    thetaesOut = Temp * np.exp(power * logp + expo)
+    #d(log thetaes)/d(wv) at fixed T and p
+    dlogdwv = -c.Rd / c.cpd * 0.24 * logp \
+              + (1 + 1.62 * wv) * (3376. / Temp - 2.54)
+    dlog = 1. / Temp + dlogdwv * dwv \
+           - wv * (1 + 0.81 * wv) * 3376. / Temp ** 2
+    dthetaesdT = thetaesOut * dlog
+    dthetaesdp = thetaesOut * (-power / press + dlogdwv * dwvdp)
+    # peg this at 450 so rootfinder won't blow up
+    pegged = thetaesOut > 450.
+    thetaesOut = np.where(pegged, 450., thetaesOut)
+    dthetaesdT = np.where(pegged, 0., dthetaesdT)
+    dthetaesdp = np.where(pegged, 0., dthetaesdp)
+    out = (thetaesOut, dthetaesdT, dthetaesdp) if dpress \
+          else (thetaesOut, dthetaesdT)
+    if thetaesOut.ndim == 0:
+        out = tuple(float(x) for x in out)
+    return out
 
 
 def thetaep(Td, T, p):
@@ -482,17 +663,17 @@ def thetaep(Td, T, p):
 
     Parameters
     - - - - - -
-    Td : float
+    Td : float or array_like
         Dewpoint temperature (K).
-    T : float
+    T : float or array_like
         Temperature (K).
-    p : float
+    p : float or array_like
         Pressure (Pa).
 
 
     Returns
     - - - -
-    thetaepOut : float
+    thetaepOut : float or ndarray
         Pseudo equivalent potential temperature (K).
 
 
@@ -511,15 +692,17 @@ def thetaep(Td, T, p):
     - - - - -
     >>> test.assert_almost_equal(thetaep(280., 300., 8.e4),344.998307,decimal=5) # Parcel is unsaturated.
     >>> test.assert_almost_equal(thetaep(300., 280., 8.e4),321.53029,decimal=5) # Parcel is saturated.
+    >>> test.assert_array_almost_equal(thetaep([280., 300.], [300., 280.], 8.e4),[344.998307, 321.53029],decimal=5)
     """
-    if Td < T:
-        #parcel is unsaturated
-        [Tlcl, plcl] = LCLfind(Td, T, p);
-        wv = wsat(Td, p);
-    else:
-        #parcel is saturated -- prohibit supersaturation with Td > T
-        Tlcl = T;
-        wv = wsat(T, p);
+    Td, T, p = np.broadcast_arrays(np.asarray(Td, dtype=float),
+                                   np.asarray(T, dtype=float),
+                                   np.asarray(p, dtype=float))
+    #parcel is unsaturated where Td < T, otherwise saturated --
+    #prohibit supersaturation with Td > T
+    unsat = Td < T
+    Tlcl = np.array(T)
+    Tlcl[unsat] = LCLfind(Td[unsat], T[unsat], p[unsat])[0]
+    wv = wsat(np.where(unsat, Td, T), p)
     
     # $$$   disp('inside theate')
     # $$$   [Td,T,wv]
@@ -530,11 +713,78 @@ def thetaep(Td, T, p):
     #
     # peg this at 450 so rootfinder won't blow up
     #
+    thetaepOut = np.minimum(thetaepOut, 450.)
+    if thetaepOut.ndim == 0:
+        thetaepOut = float(thetaepOut)
+    return thetaepOut
 
-    if (thetaepOut > 450.):
-        thetaepOut = 450;
 
-    return thetaepOut
+def thetaepDeriv(Td, T, p):
+    """
+    thetaepDeriv(Td, T, p)
+
+    Pseudo equivalent potential temperature, as thetaep, together
+    with its derivative in temperature at fixed dewpoint and
+    pressure.
+
+    Parameters
+    - - - - - -
+    Td : float or array_like
+        Dewpoint temperature (K).
+    T : float or array_like
+        Temperature (K).
+    p : float or array_like
+        Pressure (Pa).
+
+    Returns
+    - - - -
+    thetaepOut : float or ndarray
+        Pseudo equivalent potential temperature (K).
+    dthetaepdT : float or ndarray
+        d(thetaep)/dT at fixed 'Td' and 'p' (dimensionless), 0 where
+        thetaep is pegged at 450 K.
+
+    Notes
+    - - -
+    Unsaturated (Td < T) the mixing ratio is fixed by 'Td' and T only
+    enters through theta and the Bolton LCL temperature; saturated it
+    is d(thetaes)/dT from thetaesDeriv.
+
+    Examples
+    - - - - -
+    >>> th, dT = thetaepDeriv([280., 300.], [300., 280.], 8.e4)
+    >>> test.assert_array_almost_equal(th, thetaep([280., 300.], [300., 280.], 8.e4), decimal=10)
+    >>> fd = (thetaep(280., 300.001, 8.e4) - thetaep(280., 299.999, 8.e4))/0.002
+    >>> test.assert_almost_equal(dT[0], fd, decimal=5)
+    >>> test.assert_almost_equal(dT[1], thetaesDeriv(280., 8.e4)[1], decimal=10)
+
+    """
+    Td, T, p = np.broadcast_arrays(np.asarray(Td, dtype=float),
+                                   np.asarray(T, dtype=float),
+                                   np.asarray(p, dtype=float))
+    unsat = Td < T
+    thetaepOut, dthetaepdT = [np.array(x, dtype=float) for x in
+                              thetaesDeriv(T, p)]
+    if np.any(unsat):
+        Td, T, p = Td[unsat], T[unsat], p[unsat]
+        #Bolton's LCL temperature, as in LCLfind
+        denom = 3.5 * np.log(T) - np.log(esat(Td) * 0.01) - 4.805
+        Tlcl = 2840. / denom + 55.
+        dTlcl = -2840. * 3.5 / T / denom ** 2
+        wv = wsat(Td, p)
+        power = c.Rd / c.cpd * (1. - 0.24 * wv)
+        value = T * (c.p0 / p) ** power \
+                * np.exp(wv * (1 + 0.81 * wv) * (3376. / Tlcl - 2.54))
+        deriv = value * (1. / T - wv * (1 + 0.81 * wv) * 3376.
+                         / Tlcl ** 2 * dTlcl)
+        # peg this at 450 so rootfinder won't blow up
+        pegged = value > 450.
+        thetaepOut[unsat] = np.where(pegged, 450., value)
+        dthetaepdT[unsat] = np.where(pegged, 0., deriv)
+    if thetaepOut.ndim == 0:
+        return float(thetaepOut), float(dthetaepdT)
+    return thetaepOut, dthetaepdT
+
 
 def invtheta(theta, p, *args):
     """
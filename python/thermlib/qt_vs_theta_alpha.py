@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import numpy
-from pylab import subplot
 import sys
 import thermo
     
@@ -11,6 +10,7 @@ def plot_rt_vs_theta_alpha(p, T, r, rl, alpha):
     theta_alpha = (1. - alpha)*theta_l + alpha*theta_e
     rt = r + rl
     
+    from matplotlib.pyplot import subplot
     ax = subplot(1,1,1)
     ax.plot(theta_alpha, rt*1000)
     
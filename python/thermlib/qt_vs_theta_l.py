@@ -1,41 +1,26 @@
 #!/usr/bin/env python
 
-from pylab import *
-
 import numpy
 import sys
 import thermo
-import rootfinder
-    
-def Tfind(Tguess, p, theta_l, rt):
-    # due to the check in invert_theta_l, we can assume that r = r_star.
-    # However, we don't know the exact value of r_star because we don't know T.
-    r = thermo.r_star(p, Tguess)
-    rl = rt - r
-    return theta_l - thermo.theta_l(p, Tguess, r, rl)
     
 def invert_theta_l(theta_l, rt, p):
-    T = thermo.theta_to_T(theta_l, p)
-    r_star = thermo.r_star(p, T)
-    if r_star < rt:
-        T0 = numpy.array([233.15, theta_l])
-        T = rootfinder.fzero(Tfind, T0, p, theta_l, rt)
-    return T
+    # theta_l, rt and p may be whole (broadcastable) grids
+    return thermo.invert_theta_l(theta_l, p, rt)
 
-def make_rt_vs_theta_l(tlmin, tlmax, rtmin, rtmax, p):
+def make_rt_vs_theta_l(tlmin, tlmax, rtmin, rtmax, p, npts=100):
     #make a blank skewT diagram
-    clf()
+    # pyplot is only imported once a diagram is actually drawn
+    import matplotlib.pyplot as plt
+    plt.clf()
     
     #get a dense range of p, t0 to contour
-    theta_l_vals = linspace(tlmin, tlmax, 100)
-    r_vals = linspace(rtmin, rtmax, 100)
-    theta_l_vals, r_vals = meshgrid(theta_l_vals, r_vals)
+    theta_l_vals = numpy.linspace(tlmin, tlmax, npts)
+    r_vals = numpy.linspace(rtmin, rtmax, npts)
+    theta_l_vals, r_vals = numpy.meshgrid(theta_l_vals, r_vals)
     
-    Tvals = zeros(theta_l_vals.shape, float)
-
-    for i in range(100):
-        for j in range(100):
-            Tvals[j,i] = invert_theta_l(theta_l_vals[j,i], r_vals[j,i], p)
+    #invert the whole grid at once
+    Tvals = invert_theta_l(theta_l_vals, r_vals, p)
     
     #use the real (data) value to get the potential temperature
     r_star = thermo.r_star(p, Tvals)
@@ -43,19 +28,20 @@ def make_rt_vs_theta_l(tlmin, tlmax, rtmin, rtmax, p):
     rl[rl < 0.] = 0.
     r = r_vals - rl
 
-    theta_v = thermo.theta_v(p, Tvals, r)
+    theta_v = thermo.theta_v(p, Tvals, r, rl)
     
-    contour(theta_l_vals, r_vals*1000., -theta_v, 20, colors='k', linestyles=':')
+    plt.contour(theta_l_vals, r_vals*1000., -theta_v, 20, colors='k', linestyles=':')
     
-    axis([tlmin, tlmax, rtmin*1000., rtmax*1000.])
-    title('(theta_l, rt) Conserved Variable Diagram')
-    ylabel('rt (g kg-1)')
-    xlabel('theta_l (K)')
+    plt.axis([tlmin, tlmax, rtmin*1000., rtmax*1000.])
+    plt.title('(theta_l, rt) Conserved Variable Diagram')
+    plt.ylabel('rt (g kg-1)')
+    plt.xlabel('theta_l (K)')
     
 def plot_rt_vs_theta_l(p, T, r, rl):
     rt = r + rl
     theta_l = thermo.theta_l(p, T, r, rl)
-    plot(theta_l, rt*1000)
+    import matplotlib.pyplot as plt
+    plt.plot(theta_l, rt*1000)
     
 def get_sounding(filename):
     T = []
@@ -80,6 +66,7 @@ def main(tmin, tmax, rmin, rmax):
     p = result['p']
     RH = result['RH']
     rt = thermo.p_T_RH_to_r(p, T, RH)
+    import matplotlib.pyplot as plt
         
     make_rt_vs_theta_l(270, 310, 0./1000., 6./1000., 84000.)
     
@@ -89,9 +76,9 @@ def main(tmin, tmax, rmin, rmax):
     r = rt - rl
         
     plot_rt_vs_theta_l(p, T, r, rl)
-    axis([270,310,0,6])
+    plt.axis([270,310,0,6])
     
-    show()
+    plt.show()
  
 if __name__=="__main__":
       #print "example: python tdd.py -10 30 400 1000"
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import numpy
-from scipy import optimize
 
 def find_interval(f, x, *args):
     x1 = x
@@ -26,7 +25,7 @@ def find_interval(f, x, *args):
         fb = f(b, *args)
         if (fa*fb < 0.): return (a, b)
         
-    raise "Couldn't find a suitable range."
+    raise ValueError("Couldn't find a suitable range.")
 
 # This function evaluates a new point, sets the y range,
 # and tests for convergence
@@ -46,11 +45,227 @@ def fzero(the_func, root_bracket, *args, **parms):
     # so a single float can't be passed to fzero, as in MATLAB.
     # *args contains any other parameters needed for f
     # **parms can be xtol (allowable error) or maxiter (max number of iterations.)
+    from scipy import optimize
     answer=optimize.zeros.brenth(the_func, root_bracket[0], root_bracket[1], *args, **parms)
     return answer
     
+def fzero_vec(the_func, a, b, *args, **parms):
+    # Array version of fzero: finds one root of the_func in every
+    # bracket [a, b] at once, using Illinois (modified regula falsi)
+    # steps applied elementwise.  See fzero_bracket, which this calls
+    # with method='illinois'.
+    # **parms can be xtol (allowable error) or maxiter (max number of iterations.)
+    parms.setdefault('method', 'illinois')
+    return fzero_bracket(the_func, a, b, *args, **parms)
+
+def fzero_bracket(the_func, a, b, *args, **parms):
+    # Array bracketing root finder: finds one root of the_func in every
+    # bracket [a, b] at once.  Each element takes its own Chandrupatla
+    # (or Illinois) steps, and the_func is only passed the elements
+    # that are still iterating.
+    # a, b and *args are broadcast against each other; the_func must
+    # accept arrays.
+    # **parms can be
+    #   xtol, rtol: an element stops once its bracket (or, for
+    #       illinois, its last step) is narrower than
+    #       xtol + rtol*abs(root); either may be an array, broadcast
+    #       against a and b (defaults 2.e-12 and 4.e-16, as in brenth)
+    #   maxiter: max number of iterations (default 100)
+    #   method: 'chandrupatla' (default) or 'illinois'
+    #   full_output: if True return (root, niter, converged), with the
+    #       iteration count and convergence flag of every element
+    # Elements where the_func has the same sign at a and b get a nan
+    # root and converged=False.
+    xtol = parms.get('xtol', 2.e-12)
+    rtol = parms.get('rtol', 4.e-16)
+    maxiter = parms.get('maxiter', 100)
+    method = parms.get('method', 'chandrupatla')
+    if method not in ('chandrupatla', 'illinois'):
+        raise NameError('method must be chandrupatla or illinois')
+    arrays = numpy.broadcast_arrays(*[numpy.asarray(x, dtype=float)
+                                      for x in (a, b, xtol, rtol) + args])
+    the_shape = arrays[0].shape
+    a, b = [numpy.array(x).ravel() for x in arrays[:2]]
+    xtol, rtol = [x.ravel() for x in arrays[2:4]]
+    args = [x.ravel() for x in arrays[4:]]
+    fa = the_func(a, *args)
+    fb = the_func(b, *args)
+    root = numpy.where(abs(fa) < abs(fb), a, b)
+    niter = numpy.zeros(root.shape, int)
+    converged = (fa == 0.) | (fb == 0.)
+    no_bracket = ~converged & ~(numpy.sign(fa)*numpy.sign(fb) < 0.)
+    root[no_bracket] = numpy.nan
+    active = numpy.flatnonzero(~converged & ~no_bracket)
+    if method == 'illinois':
+        _illinois(the_func, a, b, fa, fb, args, xtol, rtol, maxiter,
+                  root, niter, converged, active)
+    else:
+        _chandrupatla(the_func, a, b, fa, fb, args, xtol, rtol, maxiter,
+                      root, niter, converged, active)
+    root = root.reshape(the_shape)
+    niter = niter.reshape(the_shape)
+    converged = converged.reshape(the_shape)
+    if root.ndim == 0:
+        root, niter, converged = float(root), int(niter), bool(converged)
+    if parms.get('full_output', False):
+        return root, niter, converged
+    return root
+
+def fzero_newton(the_func, a, b, *args, **parms):
+    # Array Newton root finder with a bracket safeguard: finds one root
+    # of f in every bracket [a, b] at once, where the_func returns the
+    # pair (f, df/dx), e.g. from the *Deriv functions of new_thermo.
+    # Each element takes Newton steps from x0, and bisects its bracket
+    # whenever a step would leave it, so it converges quadratically
+    # near the root and never worse than bisection.
+    # a, b and *args are broadcast against each other; the_func must
+    # accept arrays and is only passed the elements still iterating.
+    # **parms can be
+    #   x0: first guess, broadcast against a and b (default: the end
+    #       of the bracket with the smaller abs(f))
+    #   xtol, rtol: an element stops once its Newton step is smaller
+    #       than xtol + rtol*abs(root) (defaults 2.e-12 and 4.e-16)
+    #   maxiter: max number of iterations (default 100)
+    #   full_output: if True return (root, niter, converged), as for
+    #       fzero_bracket, niter counting calls to the_func
+    # Elements where f has the same sign at a and b get a nan root and
+    # converged=False.
+    xtol = parms.get('xtol', 2.e-12)
+    rtol = parms.get('rtol', 4.e-16)
+    maxiter = parms.get('maxiter', 100)
+    x0 = parms.get('x0', numpy.nan)
+    arrays = numpy.broadcast_arrays(*[numpy.asarray(x, dtype=float)
+                                      for x in (a, b, x0, xtol, rtol) + args])
+    the_shape = arrays[0].shape
+    a, b, x0 = [numpy.array(x).ravel() for x in arrays[:3]]
+    xtol, rtol = [x.ravel() for x in arrays[3:5]]
+    args = [x.ravel() for x in arrays[5:]]
+    fa = the_func(a, *args)[0]
+    fb = the_func(b, *args)[0]
+    # keep lo on the side where f < 0 and hi where f > 0
+    swap = fa > fb
+    lo = numpy.where(swap, b, a)
+    hi = numpy.where(swap, a, b)
+    root = numpy.where(abs(fa) < abs(fb), a, b)
+    niter = numpy.zeros(root.shape, int) + 2
+    converged = (fa == 0.) | (fb == 0.)
+    no_bracket = ~converged & ~(numpy.sign(fa)*numpy.sign(fb) < 0.)
+    root[no_bracket] = numpy.nan
+    with numpy.errstate(invalid='ignore'):
+        guess = ~converged & ~no_bracket & ((x0 - lo)*(x0 - hi) < 0.)
+    root[guess] = x0[guess]
+    active = numpy.flatnonzero(~converged & ~no_bracket)
+    for i in range(maxiter):
+        if active.size == 0: break
+        x = root[active]
+        f, df = the_func(x, *[y[active] for y in args])
+        niter[active] += 1
+        low, high = lo[active], hi[active]
+        low[f < 0.] = x[f < 0.]
+        high[f > 0.] = x[f > 0.]
+        lo[active], hi[active] = low, high
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            xnew = x - f/df
+        tol = xtol[active] + rtol[active]*abs(x)
+        # a step below tol is done even if roundoff puts it on the
+        # bracket; a bigger one has to stay inside the bracket
+        small = abs(xnew - x) < tol
+        inside = small | ((xnew - low)*(xnew - high) < 0.)
+        xnew = numpy.where(inside, xnew, 0.5*(low + high))
+        xnew[f == 0.] = x[f == 0.]
+        root[active] = xnew
+        done = (f == 0.) | small | (abs(high - low) < tol)
+        converged[active[done]] = True
+        active = active[~done]
+    root = root.reshape(the_shape)
+    niter = niter.reshape(the_shape)
+    converged = converged.reshape(the_shape)
+    if root.ndim == 0:
+        root, niter, converged = float(root), int(niter), bool(converged)
+    if parms.get('full_output', False):
+        return root, niter, converged
+    return root
+
+def _illinois(the_func, a, b, fa, fb, args, xtol, rtol, maxiter,
+              root, niter, converged, active):
+    # Illinois (modified regula falsi) steps for fzero_bracket, updating
+    # root, niter and converged in place
+    for i in range(maxiter):
+        if active.size == 0: break
+        aa, bb = a[active], b[active]
+        faa, fbb = fa[active], fb[active]
+        cc = bb - fbb*(bb - aa)/(fbb - faa)
+        step = abs(cc - bb)
+        fc = the_func(cc, *[x[active] for x in args])
+        # fc has the sign of fb: keep a and halve fa so the
+        # retained endpoint can't stall the iteration
+        same = fc*fbb > 0.
+        faa[same] = 0.5*faa[same]
+        aa[~same] = bb[~same]
+        faa[~same] = fbb[~same]
+        a[active], b[active] = aa, cc
+        fa[active], fb[active] = faa, fc
+        root[active] = cc
+        niter[active] += 1
+        tol = xtol[active] + rtol[active]*abs(cc)
+        # one end of the bracket can stay put all the way in, so a
+        # step below tol also counts as converged
+        done = (fc == 0.) | (abs(cc - aa) < tol) | (step < tol)
+        converged[active[done]] = True
+        active = active[~done]
+
+def _chandrupatla(the_func, a, b, fa, fb, args, xtol, rtol, maxiter,
+                  root, niter, converged, active):
+    # Chandrupatla's method (Adv. Eng. Software 28, 1997) for
+    # fzero_bracket: inverse quadratic steps when the last three points
+    # make them safe, bisection otherwise.  x1 is the newest point,
+    # x2 the other end of the bracket and x3 the point just dropped.
+    x1, f1 = a, fa
+    x2, f2 = b, fb
+    x3, f3 = b.copy(), fb.copy()
+    t = numpy.empty_like(a)
+    t.fill(0.5)
+    for i in range(maxiter):
+        if active.size == 0: break
+        xa1, xa2, xa3 = x1[active], x2[active], x3[active]
+        fa1, fa2, fa3 = f1[active], f2[active], f3[active]
+        xt = xa1 + t[active]*(xa2 - xa1)
+        ft = the_func(xt, *[x[active] for x in args])
+        same = numpy.sign(ft) == numpy.sign(fa1)
+        xa3 = numpy.where(same, xa1, xa2)
+        fa3 = numpy.where(same, fa1, fa2)
+        xa2 = numpy.where(same, xa2, xa1)
+        fa2 = numpy.where(same, fa2, fa1)
+        xa1, fa1 = xt, ft
+        better = abs(fa1) < abs(fa2)
+        xm = numpy.where(better, xa1, xa2)
+        fm = numpy.where(better, fa1, fa2)
+        root[active] = xm
+        niter[active] += 1
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            tl = 0.5*(xtol[active] + rtol[active]*abs(xm))/abs(xa2 - xa1)
+            xi = (xa1 - xa2)/(xa3 - xa2)
+            phi = (fa1 - fa2)/(fa3 - fa2)
+            quad = (phi**2 < xi) & ((1. - phi)**2 < 1. - xi)
+            tt = fa1/(fa2 - fa1)*fa3/(fa2 - fa3) \
+                 + (xa3 - xa1)/(xa2 - xa1)*fa1/(fa3 - fa1)*fa2/(fa3 - fa2)
+        tt = numpy.where(quad, tt, 0.5)
+        t[active] = numpy.minimum(numpy.maximum(tt, tl), 1. - tl)
+        x1[active], x2[active], x3[active] = xa1, xa2, xa3
+        f1[active], f2[active], f3[active] = fa1, fa2, fa3
+        done = (fm == 0.) | (tl > 0.5)
+        converged[active[done]] = True
+        active = active[~done]
+
 def testfunc(x):
     return numpy.sin(x)
+
+def testfunc_cubic(x):
+    # a triple root at 1: regula falsi keeps one end of the bracket
+    return (x - 1.)**3
+
+def testfunc_deriv(x):
+    return numpy.sin(x), numpy.cos(x)
      
  
 if __name__=="__main__":
@@ -58,3 +273,7 @@ if __name__=="__main__":
     x = [-1,1]
     print fzero(f, x)
     print fzero(f, x, xtol=1.e-300, maxiter=80)
+    print fzero_vec(f, [-1, 2], [1, 4])
+    print fzero_bracket(f, [-1, 2], [1, 4], full_output=True)
+    print fzero_vec(testfunc_cubic, 0., 3., full_output=True)
+    print fzero_newton(testfunc_deriv, [-1, 2], [1, 4], full_output=True)
@@ -1,18 +1,17 @@
 #!/usr/bin/env python
 
-from pylab import *
-import matplotlib as mpl
-import sys
+import numpy as np
 import thermo
-import scipy.optimize.zeros as scizeros
 
 def make_skewT(tmin, tmax, pmax, pmin, skew=30.):
     #make a blank skewT diagram
-    clf()
+    # pyplot is only imported once a diagram is actually drawn
+    import matplotlib.pyplot as plt
+    plt.clf()
     #get a dense range of p, t0 to contour
-    yplot = linspace(1050, 100, 100)
-    xplot = linspace(-50, 50, 100)
-    xplot, yplot = meshgrid(xplot, yplot)
+    yplot = np.linspace(1050, 100, 100)
+    xplot = np.linspace(-50, 50, 100)
+    xplot, yplot = np.meshgrid(xplot, yplot)
     
     #lay down a reference grid that labels xplot,yplot points 
     #in the new (skewT-lnP) coordinate system .
@@ -22,7 +21,7 @@ def make_skewT(tmin, tmax, pmax, pmin, skew=30.):
     #it's still the pressure
 
     #use the real (data) value to get the potential temperature
-    T = xplot + skew*log(0.001*yplot)
+    T = xplot + skew*np.log(0.001*yplot)
     Tk = T + 273.15 #convert from C to K for use in thermo functios
     p = yplot*100. #convert from hPa to Pa
 
@@ -34,33 +33,33 @@ def make_skewT(tmin, tmax, pmax, pmin, skew=30.):
     #saturated adiabat, so Tdew=Tk
     thetaeVals = thermo.theta_e(p, Tk, rstar, 0.)    
     
-    tempLabels = arange(-140., 50., 10.)
-    con1 = contour(xplot, yplot, T, levels = tempLabels, colors = 'k', linewidths=.5)
-    ax = gca()
+    tempLabels = np.arange(-140., 50., 10.)
+    con1 = plt.contour(xplot, yplot, T, levels = tempLabels, colors = 'k', linewidths=.5)
+    ax = plt.gca()
     ax.set_yscale('log')
-    lines = arange(100., 1100., 100.)
-    yticks(lines, ['100','200','300','400','500','600','700','800','900','1000'])
+    lines = np.arange(100., 1100., 100.)
+    plt.yticks(lines, ['100','200','300','400','500','600','700','800','900','1000'])
     for line in lines:
-        axhline(line, ls=':', color='k', linewidth=.5)
-    thetaLabels = arange(200., 380., 10.)
-    con2 = contour(xplot, yplot, th, levels = thetaLabels, colors='b', linewidths=.5)
+        plt.axhline(line, ls=':', color='k', linewidth=.5)
+    thetaLabels = np.arange(200., 380., 10.)
+    con2 = plt.contour(xplot, yplot, th, levels = thetaLabels, colors='b', linewidths=.5)
     rsLabels = [.1,.2,.4,.6, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 25, 30, 40]
-    con3 = contour(xplot, yplot, rstar*1.e3, levels=rsLabels, colors='g', linewidths=.5)
-    thetaeLabels = linspace(200,400,21)
-    con4 = contour(xplot, yplot, thetaeVals, levels = thetaeLabels, colors='r', linewidths=.5)
-    axis([tmin, tmax, pmax, pmin])
-    clabel(con1, inline = False, fmt = '%1.0f')
-    clabel(con2, inline = False, fmt = '%1.0f')
-    clabel(con3, inline = False, fmt = '%1.1f')
-    clabel(con4, inline = False, fmt = '%1.0f')
-    title('skew T - lnp chart')
-    ylabel('pressure (hPa)')
-    xlabel('temperature (black, degrees C)')
+    con3 = plt.contour(xplot, yplot, rstar*1.e3, levels=rsLabels, colors='g', linewidths=.5)
+    thetaeLabels = np.linspace(200,400,21)
+    con4 = plt.contour(xplot, yplot, thetaeVals, levels = thetaeLabels, colors='r', linewidths=.5)
+    plt.axis([tmin, tmax, pmax, pmin])
+    plt.clabel(con1, inline = False, fmt = '%1.0f')
+    plt.clabel(con2, inline = False, fmt = '%1.0f')
+    plt.clabel(con3, inline = False, fmt = '%1.1f')
+    plt.clabel(con4, inline = False, fmt = '%1.0f')
+    plt.title('skew T - lnp chart')
+    plt.ylabel('pressure (hPa)')
+    plt.xlabel('temperature (black, degrees C)')
             
 def skewIt(T, p, skew=30.):
     pz = p*0.01
     tz = T - 273.15
-    skewedTemp = tz - skew*log(0.001*pz)
+    skewedTemp = tz - skew*np.log(0.001*pz)
     return (skewedTemp, pz)
     
 def get_sounding(filename):
@@ -75,9 +74,9 @@ def get_sounding(filename):
         RH.append( float(line[2]) )
         
     result = {}
-    result['T'] = array(T)
-    result['p'] = array(p)
-    result['RH'] = array(RH)
+    result['T'] = np.array(T)
+    result['p'] = np.array(p)
+    result['RH'] = np.array(RH)
     return result
 
 def main(tmin, tmax, pmin, pmax):
@@ -87,13 +86,14 @@ def main(tmin, tmax, pmin, pmax):
     RH = result['RH']
     r = thermo.p_T_RH_to_r(p, T, RH)
     T_dew = thermo.T_d(r, p)
+    import matplotlib.pyplot as plt
     make_skewT(tmin, tmax, pmax, pmin)
     tee, pee = skewIt(T, p, 30.)
-    plot(tee, pee, 'k-')
+    plt.plot(tee, pee, 'k-')
     tee, pee = skewIt(T_dew, p, 30.)
-    plot(tee, pee, 'k-')
-    axis([tmin, tmax, pmax, pmin])
-    show()
+    plt.plot(tee, pee, 'k-')
+    plt.axis([tmin, tmax, pmax, pmin])
+    plt.show()
  
 if __name__=="__main__":
       #print "example: python tdd.py -10 30 400 1000"
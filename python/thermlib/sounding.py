@@ -0,0 +1,287 @@
+"""This is the docstring for the sounding.py module. This module
+contains the Sounding class, one sounding checked and stored once, with
+interpolation in height or pressure for any of its columns, in place of
+the nudge + np.interp lambdas of the skew_T and ode45 scripts."""
+
+import bisect
+import math
+
+import numpy as np
+
+#columns of a Sounding, in the units of littlerock.nc
+fields = ('press', 'height', 'temp', 'dewpt', 'direct', 'speed')
+
+class Sounding(object):
+    """
+    Sounding(press, height, temp, dewpt, direct=None, speed=None)
+
+    An immutable sounding that interpolates its columns in height or
+    in log(pressure).
+
+    Parameters
+    - - - - - -
+    press : array_like
+        Pressure (hPa).
+    height : array_like
+        Height (m).
+    temp, dewpt : array_like
+        Temperature and dewpoint (deg C).
+    direct, speed : array_like, optional
+        Wind direction (deg) and speed (knots).
+
+    Levels with a missing (nan or masked) value in press, height, temp
+    or dewpt are dropped, the rest are put in order of height, and a
+    level whose height does not rise or whose pressure does not fall
+    from the level below is dropped as a repeat.  This replaces
+    skew_T/nudge.py, which moves repeated levels in place.
+
+    Interpolation is linear in height, or in log(pressure), between
+    levels, and holds the end values outside the sounding, like
+    np.interp.  The levels and the slopes of every column on every
+    layer are worked out once, in both coordinates; the arrays are
+    read-only, the scalar lookups use tuples, and no attribute can be
+    changed, so one Sounding can be shared by threads and by the
+    right hand sides of ODEs.
+
+    Examples
+    - - - - -
+    >>> s = Sounding([1000., 900., 900., 800.], [100., 1000., 1000., 2000.],
+    ...              [25., 20., 20., 14.], [15., 12., 12., 2.])
+    >>> s.nlev
+    3
+    >>> s.interp('temp', height=[550., 1500.])
+    array([22.5, 17. ])
+    >>> temp, dewpt = s.interp(['temp', 'dewpt'], press=950.)
+    >>> print '%.4f %.4f' % (temp, dewpt)
+    22.5658 13.5395
+    >>> interpTenv = s.interpolator('temp', 'height')
+    >>> interpTenv(1000.)
+    20.0
+    >>> s.temp[0] = 0.
+    Traceback (most recent call last):
+    ...
+    ValueError: assignment destination is read-only
+    >>> s.temp = None
+    Traceback (most recent call last):
+    ...
+    AttributeError: Sounding is immutable
+
+    """
+    __slots__ = fields + ('nlev', 'negLogp', '_slopes', '_tuples')
+
+    def __init__(self, press, height, temp, dewpt, direct=None, speed=None):
+        columns = {}
+        for name, values in zip(fields, (press, height, temp, dewpt,
+                                         direct, speed)):
+            if values is None:
+                values = np.nan*np.empty(np.shape(press))
+            columns[name] = np.ma.filled(np.ma.asarray(values, dtype=float),
+                                         np.nan).ravel()
+        ok = np.ones(columns['press'].shape, bool)
+        for name in fields[:4]:
+            ok &= np.isfinite(columns[name])
+        order = np.argsort(columns['height'][ok], kind='mergesort')
+        for name in fields:
+            columns[name] = columns[name][ok][order]
+        # keep a level only if it is above and at lower pressure than
+        # the last level kept
+        keep = np.zeros(columns['press'].shape, bool)
+        last = None
+        for k in range(keep.size):
+            if last is None or (columns['height'][k] > columns['height'][last]
+                                and columns['press'][k] < columns['press'][last]):
+                keep[k] = True
+                last = k
+        if keep.sum() < 2:
+            raise ValueError('a sounding needs at least two distinct levels')
+        setSlot = object.__setattr__
+        for name in fields:
+            setSlot(self, name, _frozen(columns[name][keep]))
+        setSlot(self, 'nlev', int(keep.sum()))
+        setSlot(self, 'negLogp', _frozen(-np.log(self.press)))
+        slopes = {}
+        tuples = {}
+        for along, coord in (('height', self.height),
+                             ('press', self.negLogp)):
+            step = np.diff(coord)
+            tuples['coord', along] = tuple(coord)
+            for name in fields:
+                slopes[along, name] = _frozen(np.diff(getattr(self, name))
+                                              / step)
+                tuples[along, name] = tuple(slopes[along, name])
+        for name in fields:
+            tuples[name] = tuple(getattr(self, name))
+        setSlot(self, '_slopes', slopes)
+        setSlot(self, '_tuples', tuples)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Sounding is immutable')
+
+    __delattr__ = __setattr__
+
+    @classmethod
+    def from_array(cls, sound, col_names='press,height,temp,dewpt,relh,'
+                   'mixr,drct,sknt'):
+        """
+        Sounding.from_array(sound, col_names=<littlerock.nc columns>)
+
+        Builds a Sounding from a (nlev, ncols) array, e.g. a variable
+        of littlerock.nc, whose columns are named in 'col_names'.
+        """
+        cols = [name.strip() for name in col_names.split(',')]
+        sound = np.ma.asarray(sound)
+        def column(name):
+            if name in cols:
+                return sound[:, cols.index(name)]
+            return None
+        return cls(column('press'), column('height'), column('temp'),
+                   column('dewpt'), column('drct'), column('sknt'))
+
+    def _coord(self, along):
+        if along == 'height':
+            return self.height
+        elif along == 'press':
+            return self.negLogp
+        raise NameError('along must be height or press')
+
+    def hunt(self, x, along='height', hint=0):
+        """
+        hunt(x, along='height', hint=0)
+
+        Index j of the layer holding the scalar x, coord[j] <= x <
+        coord[j+1], clipped to the first and last layer.  The search
+        walks out from layer 'hint' in growing steps, then bisects, so
+        a query near the last one costs a few comparisons.  For
+        'press', x is a pressure (hPa).
+        """
+        self._coord(along)
+        if along == 'press':
+            x = -math.log(x)
+        return _hunt(self._tuples['coord', along], float(x), hint)
+
+    def interp(self, names, press=None, height=None, hint=None):
+        """
+        interp(names, press=None, height=None, hint=None)
+
+        Values of one column (names a str) or several (a sequence of
+        str) at pressures (hPa) or heights (m); give exactly one of
+        'press' and 'height'.
+
+        With an int 'hint' the query must be a scalar, the layer is
+        found by 'hunt' starting from 'hint', and the layer index is
+        returned too, to be handed back as the next hint.
+        """
+        if (press is None) == (height is None):
+            raise NameError('need exactly one of press and height')
+        single = isinstance(names, basestring)
+        if single:
+            names = [names]
+        along = 'height' if press is None else 'press'
+        query = height if press is None else press
+        if hint is not None or np.ndim(query) == 0:
+            # scalars: plain floats and the tuple copies are much
+            # quicker than numpy for one value
+            x = float(query)
+            if along == 'press':
+                x = -math.log(x)
+            coord = self._tuples['coord', along]
+            if hint is not None:
+                j = _hunt(coord, x, hint)
+            else:
+                j = min(max(bisect.bisect_right(coord, x) - 1, 0),
+                        self.nlev - 2)
+            dx = min(max(x, coord[0]), coord[-1]) - coord[j]
+            out = [self._tuples[name][j] + self._tuples[along, name][j]*dx
+                   for name in names]
+        else:
+            x = np.asarray(query, dtype=float)
+            if along == 'press':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    x = -np.log(x)
+            coord = self._coord(along)
+            if len(names) == 1:
+                out = [np.interp(x, coord, getattr(self, names[0]))]
+            else:
+                # one search for all the columns
+                j = np.clip(np.searchsorted(coord, x, side='right') - 1, 0,
+                            self.nlev - 2)
+                dx = np.clip(x, coord[0], coord[-1]) - coord[j]
+                out = [getattr(self, name)[j] + self._slopes[along, name][j]*dx
+                       for name in names]
+        if single:
+            out = out[0]
+        if hint is not None:
+            return out, j
+        return out
+
+    def interpolator(self, name, along='height'):
+        """
+        interpolator(name, along='height')
+
+        Function of height (m) or pressure (hPa) for column 'name',
+        a drop in replacement for the np.interp lambdas of the scripts.
+        """
+        coordArray = self._coord(along)
+        values = getattr(self, name)
+        coord = self._tuples['coord', along]
+        valueTuple = self._tuples[name]
+        slope = self._tuples[along, name]
+        last = self.nlev - 2
+        logp = along == 'press'
+        def interpolate(q):
+            if type(q) is not float and np.ndim(q) != 0:
+                x = np.asarray(q, dtype=float)
+                if logp:
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        x = -np.log(x)
+                return np.interp(x, coordArray, values)
+            x = -math.log(q) if logp else float(q)
+            j = min(max(bisect.bisect_right(coord, x) - 1, 0), last)
+            return valueTuple[j] \
+                   + slope[j]*(min(max(x, coord[0]), coord[-1]) - coord[j])
+        return interpolate
+
+
+def _hunt(coord, x, hint):
+    # layer of x in the ascending tuple coord, searching out from hint
+    last = len(coord) - 2
+    lo = min(max(int(hint), 0), last)
+    if x >= coord[lo]:
+        step = 1
+        hi = lo + 1
+        while hi <= last and x >= coord[hi]:
+            lo = hi
+            hi = lo + step
+            step *= 2
+        hi = min(hi, last + 1)
+    else:
+        step = 1
+        hi = lo
+        lo = hi - 1
+        while lo > 0 and x < coord[lo]:
+            hi = lo
+            lo = hi - step
+            step *= 2
+        lo = max(lo, 0)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if x >= coord[mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _frozen(x):
+    # contiguous read-only copy
+    x = np.ascontiguousarray(x, dtype=float).copy()
+    x.flags.writeable = False
+    return x
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
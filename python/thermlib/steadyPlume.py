@@ -0,0 +1,257 @@
+"""This is the docstring for the steadyPlume.py module. This module
+contains steadyPlume, the entraining parcel of ode45/answer_entrain.py
+as a steady plume integrated in height on the levels of a whole stack
+of soundings at once."""
+
+import numpy as np
+
+from constants import constants as c
+from new_thermo import wsat, thetaep
+from findTmoist import warmTmoist
+
+def steadyPlume(height, press, temp, dewpt, thetae0, wT0, zstart, winit=0.5,
+                mu=0., nsub=1):
+    """
+    steadyPlume(height, press, temp, dewpt, thetae0, wT0, zstart,
+                winit=0.5, mu=0., nsub=1)
+
+    Cloud top, buoyancy and liquid water profiles of a steady
+    entraining plume for every sounding of a stack.
+
+    Parameters
+    - - - - - -
+    height, press, temp, dewpt : array_like
+        Soundings (m, Pa, K, K), shape (nsound, nlev) or (nlev,), nan
+        padded as by batchCape.padSoundings.
+    thetae0, wT0 : float or array_like
+        thetae (K) and total water (kg/kg) of the plume at 'zstart'.
+    zstart : float or array_like
+        Height (m) the plume starts from.
+    winit : float or array_like, optional
+        Vertical velocity (m/s) at 'zstart'.
+    mu : float or array_like, optional
+        Entrainment per unit height (1/m); 0 for an undilute plume.
+    nsub : int, optional
+        Number of equal steps every sounding layer is split into.
+
+    The soundings and the plume parameters are broadcast against each
+    other, so one sounding can be given several plumes.
+
+    Returns
+    - - - -
+    plume : dict
+        'cloud_top' (m) and 'wmax' (m/s), shape (nsound,), and
+        'height' (m), 'w' (m/s), 'B' (buoyancy, m/s**2), 'thetae' (K),
+        'wT' and 'wl' (kg/kg), shape (nsound, nstep), on the heights
+        from 'zstart' up through the sounding levels (and the 'nsub'
+        steps between them).  Entries below 'zstart', above the cloud
+        top and past the end of a sounding are nan; the whole row is
+        nan if 'zstart' is outside the sounding.
+
+    Notes
+    - - -
+    This is the model of answer_entrain.py with height in place of
+    time:
+
+        d(thetae)/dz = mu*(thetae_env - thetae)
+        d(wT)/dz = mu*(wT_env - wT)
+        d(w**2/2)/dz = B
+
+    so a time rate 'entrain' corresponds to mu = entrain/w, and mu=0
+    is the undilute parcel of ode_littlerock.py.  Between steps the
+    environment is linear in height, as it is for Sounding.interp, so
+    thetae and wT are integrated exactly across every step, and the
+    buoyancy is taken as linear in height, so w**2/2 is a trapezoid sum
+    and the cloud top, where w = 0, is the root of a quadratic.  No
+    step divides by w.  The buoyancy neglects liquid water loading,
+    with the plume saturated, as in ode45/calcBuoy.py; 'wl' is wT less
+    the saturation mixing ratio, where positive.  The plume temperatures
+    are found in one findTmoist.warmTmoist call for the whole stack.
+    See bench_plume.py for the time against ensembleParcels.
+
+    Examples
+    - - - - -
+    The parcel of answer_entrain.py on the Mar-02-2012-12Z littlerock
+    sounding, for three entrainment rates:
+
+    >>> import os
+    >>> from storm_indices import read_archive
+    >>> filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    ...                         '..', 'skew_T', 'littlerock.nc')
+    >>> names, [(cols, stack)] = read_archive(filename)
+    >>> press, height, temp, dewpt = [stack[3, :, cols.index(name)]
+    ...                               for name in ('press', 'height', 'temp',
+    ...                                            'dewpt')]
+    >>> Tenv, Tdenv = [np.interp(900., press[::-1], x[::-1]) + c.Tc
+    ...                for x in (temp, dewpt)]
+    >>> z800 = np.interp(800., press[::-1], height[::-1])
+    >>> plume = steadyPlume(height, press*100., temp + c.Tc, dewpt + c.Tc,
+    ...                     thetaep(Tdenv, Tenv, 900.e2), wsat(Tdenv, 900.e2),
+    ...                     z800, mu=[0., 1.e-4, 3.e-4], nsub=4)
+    >>> print '%.1f %.1f %.1f' % tuple(plume['cloud_top'])
+    14422.0 12010.7 4771.1
+    >>> plume['height'].shape
+    (3, 417)
+
+    parcelTrajectory, run in time with parcelRHS and an entrainment
+    rate of mu*w, stops at 14423.2, 12012.8 and 4771.1 m.
+
+    A sounding cut off at 7280 m, nan padded in a stack with the whole
+    sounding, gives the same plume as on its own:
+
+    >>> short = [x[:31] for x in (height, press, temp, dewpt)]
+    >>> pad = lambda x: np.concatenate([x[:31], np.nan*x[31:]])
+    >>> args = (thetaep(Tdenv, Tenv, 900.e2), wsat(Tdenv, 900.e2), z800)
+    >>> alone = steadyPlume(short[0], short[1]*100., short[2] + c.Tc,
+    ...                     short[3] + c.Tc, *args)
+    >>> both = steadyPlume([pad(height), height],
+    ...                    [pad(press)*100., press*100.],
+    ...                    [pad(temp) + c.Tc, temp + c.Tc],
+    ...                    [pad(dewpt) + c.Tc, dewpt + c.Tc], *args)
+    >>> print '%.1f %.2f' % (alone['cloud_top'][0], alone['wmax'][0])
+    7280.0 42.39
+    >>> print '%.1f %.2f' % (both['cloud_top'][0], both['wmax'][0])
+    7280.0 42.39
+
+    """
+    height, press, temp, dewpt = [np.atleast_2d(np.asarray(x, dtype=float))
+                                  for x in (height, press, temp, dewpt)]
+    params = [np.asarray(x, dtype=float) for x in (thetae0, wT0, zstart,
+                                                   winit, mu)]
+    nsound = np.broadcast(height[:, 0], *params).size
+    nlev = height.shape[1]
+    height, press, temp, dewpt = [np.broadcast_to(x, (nsound, nlev))
+                                  for x in (height, press, temp, dewpt)]
+    thetae0, wT0, zstart, winit, mu = [np.broadcast_to(x, (nsound,)).copy()
+                                       for x in params]
+    rows = np.arange(nsound)
+
+    #keep the levels that are there and above every level before them,
+    #then move them to the front of their rows
+    with np.errstate(invalid='ignore'):
+        valid = np.isfinite(height) & np.isfinite(press) \
+                & np.isfinite(temp) & np.isfinite(dewpt)
+        highest = np.maximum.accumulate(np.where(valid, height, -np.inf),
+                                        axis=1)
+        lowest = np.minimum.accumulate(np.where(valid, press, np.inf),
+                                       axis=1)
+        valid[:, 1:] &= (height[:, 1:] > highest[:, :-1]) \
+                        & (press[:, 1:] < lowest[:, :-1])
+    order = np.argsort(~valid, axis=1, kind='mergesort')
+    valid, height, press, temp, dewpt = [np.take_along_axis(x, order, axis=1)
+                                         for x in (valid, height, press, temp,
+                                                   dewpt)]
+    nvalid = valid.sum(axis=1)
+    zbottom = height[:, 0]
+    ztop = height[rows, np.maximum(nvalid - 1, 0)]
+    with np.errstate(invalid='ignore'):
+        inside = (nvalid >= 2) & (zstart >= zbottom) & (zstart < ztop)
+
+    #the environment at zstart, then the levels above it
+    with np.errstate(invalid='ignore'):
+        below = np.where(inside, (valid & (height <= zstart[:, None]))
+                         .sum(axis=1) - 1, 0)
+    below = np.clip(below, 0, nlev - 2)
+    frac = (zstart - height[rows, below]) \
+           / (height[rows, below + 1] - height[rows, below])
+    start = [x[rows, below] + frac*(x[rows, below + 1] - x[rows, below])
+             for x in (press, temp, dewpt)]
+    with np.errstate(invalid='ignore'):
+        above = valid & (height > zstart[:, None]) & inside[:, None]
+    columns = []
+    for x, x0 in zip((height, press, temp, dewpt), [zstart] + start):
+        columns.append(np.concatenate([x0[:, None],
+                                       np.where(above, x, np.nan)], axis=1))
+    levels = np.concatenate([inside[:, None], above], axis=1)
+    order = np.argsort(~levels, axis=1, kind='mergesort')
+    levels, height, press, temp, dewpt = [np.take_along_axis(x, order, axis=1)
+                                          for x in [levels] + columns]
+    width = max(int(levels.sum(axis=1).max()), 1)
+    levels, height, press, temp, dewpt = [x[:, :width] for x in
+                                          (levels, height, press, temp,
+                                           dewpt)]
+
+    if nsub > 1 and width > 1:
+        #split every layer into nsub steps, linear in height
+        steps = np.arange(nsub)/float(nsub)
+        def split(x):
+            inner = x[:, :-1, None] + (x[:, 1:, None] - x[:, :-1, None])*steps
+            return np.concatenate([inner.reshape(nsound, -1), x[:, -1:]],
+                                  axis=1)
+        height, press, temp, dewpt = [split(x) for x in (height, press, temp,
+                                                          dewpt)]
+        levels = np.isfinite(height)
+    nstep = height.shape[1]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        wTenv = wsat(dewpt, press)
+        Tvenv = temp*(1. + c.eps*wTenv)
+        thetaeEnv = thetaep(dewpt, temp, press)
+
+        #thetae and wT relax towards an environment that is linear in
+        #height across each step
+        thetae = np.nan*height
+        wT = np.nan*height
+        thetae[:, 0] = np.where(inside, thetae0, np.nan)
+        wT[:, 0] = np.where(inside, wT0, np.nan)
+        dz = np.diff(height, axis=1)
+        decay = np.exp(-mu[:, None]*dz)
+        phi = np.where(mu[:, None] > 0., -np.expm1(-mu[:, None]*dz)
+                       / np.where(mu[:, None] > 0., mu[:, None], 1.), dz)
+        for k in range(nstep - 1):
+            for var, env in ((thetae, thetaeEnv), (wT, wTenv)):
+                slope = (env[:, k + 1] - env[:, k])/dz[:, k]
+                var[:, k + 1] = env[:, k + 1] \
+                                + (var[:, k] - env[:, k])*decay[:, k] \
+                                - slope*phi[:, k]
+
+        Tcloud = np.nan*height
+        Tcloud[levels] = warmTmoist(thetae[levels], press[levels],
+                                    np.nan*thetae[levels])[0]
+        wvCloud = wsat(Tcloud, press)
+        B = c.g0*(Tcloud*(1. + c.eps*wvCloud) - Tvenv)/Tvenv
+
+        #w**2/2 with the buoyancy linear in height over each step
+        K = np.empty_like(height)
+        K[:, 0] = 0.5*winit**2
+        K[:, 1:] = K[:, :1] + np.cumsum(0.5*(B[:, :-1] + B[:, 1:])*dz,
+                                        axis=1)
+    #first step where w**2/2 falls to zero, or the last step of the row;
+    #the nan padding past the end of a short sounding is not a stop
+    last = np.maximum(levels.sum(axis=1) - 1, 0)
+    with np.errstate(invalid='ignore'):
+        stopped = ~(K[:, 1:] > 0.) & (np.arange(1, nstep) <= last[:, None])
+    stop = np.where(stopped.any(axis=1), np.argmax(stopped, axis=1), last)
+    k = np.maximum(np.minimum(stop, last - 1), 0)
+    K0, B0, B1 = K[rows, k], B[rows, k], B[rows, np.minimum(k + 1, nstep - 1)]
+    step = dz[rows, k] if nstep > 1 else np.zeros(nsound)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        #first root of K0 + B0*x + curve*x**2, in the form that stays
+        #good as curve goes to 0
+        curve = 0.5*(B1 - B0)/step
+        root = 2.*K0/(np.sqrt(np.maximum(B0**2 - 4.*curve*K0, 0.)) - B0)
+    reached = stop < last
+    cloud_top = np.where(reached, height[rows, k] + np.clip(root, 0., step),
+                         height[rows, last])
+    cloud_top = np.where(inside, cloud_top, np.nan)
+
+    #nothing above the cloud top
+    with np.errstate(invalid='ignore'):
+        inCloud = levels & (height <= cloud_top[:, None])
+    w = np.where(inCloud, np.sqrt(np.maximum(2.*K, 0.)), np.nan)
+    wl = np.where(inCloud, np.maximum(wT - wvCloud, 0.), np.nan)
+    out = {'cloud_top': cloud_top, 'height': np.where(levels, height, np.nan),
+           'w': w, 'B': np.where(inCloud, B, np.nan), 'wl': wl,
+           'thetae': np.where(inCloud, thetae, np.nan),
+           'wT': np.where(inCloud, wT, np.nan)}
+    #fmax skips nan, and gives nan for a row with no plume
+    out['wmax'] = np.fmax.reduce(np.where(inCloud, w, np.nan), axis=1)
+    return out
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,233 @@
+"""This is the docstring for the storm_indices.py module. This module
+contains compute_indices, which finds the storm indices of
+skew_T/littlerock_stats.py (CAPE, lifted index, Total Totals,
+Showalter and SWEAT) for every sounding in an archive, a chunk of
+soundings at a time on a process pool."""
+
+from collections import OrderedDict
+
+import numpy
+
+from constants import constants as c
+from new_thermo import thetaep, wsat, tinvert_thetae
+from batchCape import padSoundings, batchCAPE
+
+#the columns of littlerock.nc
+default_columns = 'press,height,temp,dewpt,relh,mixr,drct,sknt'
+
+#names of the fields of every row of the table
+index_names = ['CAPE', 'CIN', 'LFC', 'EL', 'lifted_index', 'total_totals',
+               'showalter', 'sweat']
+
+def read_archive(archive, columns=default_columns):
+    """
+    read_archive(archive, columns=default_columns)
+
+    Gathers the soundings of an archive.
+
+    Parameters
+    - - - - - -
+    archive : str, sequence of str or mapping
+        A netCDF file written like littlerock.nc, with one variable per
+        sounding named by its time, a list of such files, or a mapping
+        from sounding time to a (nlev, ncols) array.
+    columns : str, optional
+        Comma separated column names for a mapping; files use their
+        'col_names' attribute.
+
+    Returns
+    - - - -
+    names : list of str
+        Sounding times, in file and variable order.
+    stacks : list of (cols, ndarray)
+        Column names and (nsound, nlev, ncols) nan padded soundings,
+        one entry per file.
+    """
+    if hasattr(archive, 'keys'):
+        names = [str(name) for name in archive.keys()]
+        cols = [name.strip() for name in columns.split(',')]
+        return names, [(cols, padSoundings([numpy.asarray(archive[name],
+                                                          dtype=float)
+                                            for name in archive.keys()]))]
+    if isinstance(archive, basestring):
+        archive = [archive]
+    from netCDF4 import Dataset
+
+    names = []
+    stacks = []
+    for filename in archive:
+        nc_file = Dataset(filename)
+        try:
+            cols = [name.strip() for name in nc_file.col_names.split(',')]
+            names.extend([str(name) for name in nc_file.variables.keys()])
+            stacks.append((cols, padSoundings([numpy.ma.filled(
+                var[:].astype(float), numpy.nan)
+                for var in nc_file.variables.values()])))
+        finally:
+            nc_file.close()
+    return names, stacks
+
+def _interp(pVals, press, values):
+    # values at pVals (hPa) from one padded sounding, as in
+    # littlerock_stats.py, nan if the sounding does not reach them
+    ok = numpy.isfinite(press) & numpy.isfinite(values)
+    if ok.sum() < 2:
+        return numpy.nan*numpy.asarray(pVals)
+    return numpy.interp(pVals, press[ok][::-1], values[ok][::-1],
+                        left=numpy.nan, right=numpy.nan)
+
+def _chunk_indices(cols, stack, parcel_press, top_press):
+    # storm indices for a (nsound, nlev, ncols) chunk of soundings,
+    # one row per sounding
+    def column(name):
+        if name in cols:
+            return stack[:, :, cols.index(name)]
+        return numpy.nan*stack[:, :, 0]
+    press, temp, dewpt = column('press'), column('temp'), column('dewpt')
+    direct, speed = column('drct'), column('sknt')
+    nsound = stack.shape[0]
+    rows = numpy.arange(nsound)
+
+    #CAPE for the level closest to parcel_press, lifted from the surface
+    with numpy.errstate(invalid='ignore'):
+        level = numpy.nanargmin(numpy.abs(press - parcel_press*1.e-2),
+                                axis=1)
+    thetaeVal = thetaep(dewpt[rows, level] + c.Tc, temp[rows, level] + c.Tc,
+                        press[rows, level]*100.)
+    CAPE, CIN, LFC, EL, wmax = batchCAPE(press*100., temp + c.Tc,
+                                         dewpt + c.Tc, thetae0=thetaeVal,
+                                         topPress=top_press, exact=True)
+
+    env = numpy.empty((7, nsound))
+    for i in range(nsound):
+        env[:, i] = [_interp(500., press[i], temp[i]),
+                     _interp(850., press[i], temp[i]),
+                     _interp(850., press[i], dewpt[i]),
+                     _interp(850., press[i], speed[i]),
+                     _interp(500., press[i], speed[i]),
+                     _interp(850., press[i], direct[i]),
+                     _interp(500., press[i], direct[i])]
+    Temp_500, Temp_850, dew_850, speed_850, speed_500, dir_850, dir_500 = env
+    Temp_500 = Temp_500 + c.Tc
+    Temp_850 = Temp_850 + c.Tc
+    dew_850 = dew_850 + c.Tc
+
+    #lifted index, surface parcel
+    thetaeSfc = thetaep(dewpt[:, 0] + c.Tc, temp[:, 0] + c.Tc,
+                        press[:, 0]*100.)
+    wT = wsat(dewpt[:, 0] + c.Tc, press[:, 0]*100.)
+    Tadia_500 = tinvert_thetae(thetaeSfc, wT, 500.e2)[0]
+    lifted_index = Temp_500 - Tadia_500
+    #total totals = vertical totals plus cross totals
+    TT_index = Temp_850 + dew_850 - 2*Temp_500
+    #Showalter, 850 hPa parcel, nan where the sounding starts above it
+    with numpy.errstate(invalid='ignore'):
+        thetae850 = thetaep(dew_850, Temp_850, 850.e2)
+        wT = wsat(dew_850, 850.e2)
+        Tadia_500 = tinvert_thetae(thetae850, wT, 500.e2)[0]
+    showalter = Temp_500 - Tadia_500
+    #SWEAT
+    with numpy.errstate(invalid='ignore'):
+        angle = dir_500 - dir_850
+        shear = 125.*(numpy.sin(angle*(numpy.pi/180)) + 0.2)
+        term1 = numpy.maximum(12.*(dew_850 - c.Tc), 0.)
+        term2 = numpy.where(TT_index < 49, 0., 20*(TT_index - 49))
+        veer = (dir_850 >= 130) & (dir_850 <= 250) & (dir_500 >= 150) \
+               & (dir_500 <= 310) & (angle > 0) & (speed_850 >= 15) \
+               & (speed_500 >= 15)
+    shear = numpy.where(veer, shear, 0.)
+    sweat = term1 + term2 + 2.*speed_850 + speed_500 + shear
+
+    table = numpy.array([CAPE, CIN, LFC, EL, lifted_index, TT_index,
+                         showalter, sweat])
+    return [dict(zip(index_names, row)) for row in table.T]
+
+def _chunk_task(args):
+    return _chunk_indices(*args)
+
+def compute_indices(archive, workers=None, chunk=64, parcel_press=900.e2,
+                    top_press=200.e2, columns=default_columns):
+    """
+    compute_indices(archive, workers=None, chunk=64, parcel_press=900.e2,
+                    top_press=200.e2, columns=default_columns)
+
+    Storm indices for every sounding of an archive.
+
+    Parameters
+    - - - - - -
+    archive : str, sequence of str or mapping
+        Soundings in the form taken by read_archive: littlerock.nc
+        style netCDF file(s), or a mapping from time to sounding array.
+    workers : int, optional
+        Number of processes for a multiprocessing pool, each taking
+        whole chunks.  The table does not depend on 'workers'.
+    chunk : int, optional
+        Number of soundings done together in one batchCAPE call.
+    parcel_press : float, optional
+        CAPE is for the parcel at the level closest to this pressure
+        (Pa), lifted from the lowest level, as in littlerock_stats.py.
+    top_press : float, optional
+        Top of the CAPE integration (Pa).
+    columns : str, optional
+        Column names for a mapping archive, see read_archive.
+
+    Returns
+    - - - -
+    table : OrderedDict
+        Maps every sounding time, in archive order, to a dict with the
+        'CAPE', 'CIN' (J/kg), 'LFC', 'EL' (Pa), 'lifted_index',
+        'total_totals', 'showalter' (K) and 'sweat' of that sounding.
+        Indices that need a level the sounding does not reach, such as
+        850 hPa over high ground, are nan, and so is SWEAT for archives
+        without wind columns ('drct' and 'sknt').
+
+    Notes
+    - - -
+    CAPE and CIN come from batchCAPE(..., exact=True).  The SWEAT
+    shear term needs both the 850 and 500 hPa winds to be at least 15
+    knots.  See bench_indices.py for the scaling with 'workers'.
+
+    Examples
+    - - - - -
+    >>> import os
+    >>> filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    ...                         '..', 'skew_T', 'littlerock.nc')
+    >>> table = compute_indices(filename, chunk=4)
+    >>> table.keys()[3]
+    'Mar-02-2012-12Z'
+    >>> row = table['Mar-02-2012-12Z']
+    >>> print '%.2f %.4f %.4f %.4f' % (row['CAPE'], row['lifted_index'],
+    ...                                row['total_totals'], row['showalter'])
+    1589.23 -4.4344 52.5000 -1.5377
+    >>> parallel = compute_indices(filename, workers=2, chunk=4)
+    >>> repr(parallel) == repr(table)
+    True
+
+    """
+    names, stacks = read_archive(archive, columns)
+    tasks = []
+    for cols, stack in stacks:
+        for k0 in range(0, stack.shape[0], chunk):
+            tasks.append((cols, stack[k0:k0 + chunk], parcel_press,
+                          top_press))
+    if not workers:
+        results = [_chunk_task(args) for args in tasks]
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        try:
+            #map hands the chunks back in order
+            results = pool.map(_chunk_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    rows = [row for result in results for row in result]
+    return OrderedDict(zip(names, rows))
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
@@ -23,21 +23,51 @@ def invert_Se(Se, z, r):
     T = rootfiner.fzero(Tfind_Se, T0, Se, z, r)
     return T
 
-def Tfind_thetal(p, T, thetal, rt):
+def Tfind_thetal(T, p, thetal, rt):
+    # only called for saturated points, so r = r_star
     r = r_star(p, T)
     rl = rt - r
-    err = thetal - theta_l(P, T, r, rl)
+    err = thetal - theta_l(p, T, r, rl)
     return err
 
 def invert_theta_l(thetal, p, rt):
-    # Given Liquid Water Potential Temperature thetal [K],
-    # pressure p [Pa] and total mixing ratio rt,
-    # return Temperature T [K]
-    T = theta_to_T(thetal, p)
-    rstar = r_star(p, T)
-    if r_star < rt:
-        T0 = array([230., thetal])
-        T = rootfinder.fzero(Tfind_thetal, p, T0, thetal, rt)
+    """
+    Given Liquid Water Potential Temperature thetal [K],
+    pressure p [Pa] and total mixing ratio rt,
+    return Temperature T [K]
+
+    Inputs may be arrays of any broadcastable shape: unsaturated
+    points are on the dry adiabat, and all the saturated points
+    are solved together on [233.15 K, T_star(p, rt)].  A saturated
+    parcel is colder than the temperature where rt saturates, but
+    near the surface it can be warmer than thetal.  A point counts
+    as saturated only if Tfind_thetal < 0 at T_star as well, so the
+    root is always inside the bracket; in the thin band where
+    theta_to_T and theta_l disagree about saturation the point stays
+    on the dry adiabat.  Points with no root between 233.15 K and
+    T_star come back as nan.
+
+    >>> print '%.4f' % invert_theta_l(300., 8.e4, 0.001)
+    281.4901
+    >>> T = invert_theta_l(290., [1.e5, 9.9e4], 0.015)
+    >>> print '%.4f %.4f' % tuple(T)
+    292.2425 291.8662
+    >>> abs(Tfind_thetal(T[0], 1.e5, 290., 0.015)) < 1.e-10
+    True
+    """
+    thetal, p, rt = numpy.broadcast_arrays(numpy.asarray(thetal, dtype=float),
+                                           numpy.asarray(p, dtype=float),
+                                           numpy.asarray(rt, dtype=float))
+    T = numpy.array(theta_to_T(thetal, p))
+    sat = numpy.array(r_star(p, T) < rt)
+    Tsat = T_star(p[sat], rt[sat])
+    inside = Tfind_thetal(Tsat, p[sat], thetal[sat], rt[sat]) < 0.
+    sat[sat] = inside
+    if sat.any():
+        T[sat] = rootfinder.fzero_vec(Tfind_thetal, 233.15, Tsat[inside],
+                                      p[sat], thetal[sat], rt[sat])
+    if T.ndim == 0:
+        T = T[()]
     return T
 
 #   temperature [K] from pressure P [Pa] and potential temperature theta [K]
@@ -77,6 +107,16 @@ def e_star(T):
 def r_star(p, T):
     return epsilon*e_star(T)/(p - e_star(T))
 
+def T_star(p, r):
+    #   temperature T (K) at which the saturation mixing ratio at
+    #   pressure p (Pa) is r (Kg/Kg), i.e. r_star(p, T) = r: Newton
+    #   steps on log(e_star) from Bolton's dewpoint T_d
+    logE = numpy.log(e(r, p))
+    T = T_d(r, p)
+    for count in range(4):
+        T = T - (numpy.log(e_star(T)) - logE)/(6743.769/T/T - 4.8451/T)
+    return T
+
 def destar_dT(T):
     return e_star(T)*(6743.769/T/T - 4.8451/T)
 
@@ -357,6 +397,112 @@ def all_uos(h, qt, p, gz):
         result["TRO"] = T_rho(t, qt, p)
     return result
 
+def T_rho_array(T, qt, p):
+    #   density temperature T_rho(K) as in T_rho, for arrays of
+    #   temperature T(K), specific total water content qt (g/g)
+    #   and pressure p (Pa)
+    rs = r_star(p, T)
+    qs = r_to_q(rs)
+    unsat = T*(1. + qt/0.622 - qt)
+    sat = T*(1. + rs/0.622)/(1. + q_to_r(qt))
+    return numpy.where(qt <= qs, unsat, sat)
+
+def tmu_array(h, qt, p, gz):
+    #   array version of tmu: temperature assuming unsaturated air
+    #   from liquid water static energy per unit of moist air h(J/kg)
+    #   specific total water content qt (g/g), pressure p (Pa) and
+    #   geopotential height gz (m2/s2)
+    #   h = CPN*t + gz is linear in t, so the secant iteration in tmu
+    #   lands on this on its first step; no point can fail
+    h, qt, p, gz = numpy.broadcast_arrays(h, qt, p, gz)
+    CPN = Cpd*(1. - qt) + Cpv*qt
+    return (h - gz)/CPN
+
+def tms_array(h, qt, p, gz, maxiter=100):
+    #   array version of tms: temperature assuming saturated air,
+    #   inputs as in tmu_array
+    #   returns (t, flag): every point takes the same secant steps as
+    #   tms, converged points drop out, and flag is True where |h1 - h|
+    #   is still >= 0.01 after maxiter steps (tms returned -1 there)
+    the_shape = numpy.broadcast(h, qt, p, gz).shape
+    h, qt, p, gz = [numpy.array(x, dtype=float).ravel() for x in
+                    numpy.broadcast_arrays(h, qt, p, gz)]
+    t = 300. + 0.*h
+    flag = numpy.ones(h.shape, bool)
+    active = numpy.arange(h.size)
+    for count in range(maxiter):
+        if active.size == 0: break
+        hh, qq, pp, gg = h[active], qt[active], p[active], gz[active]
+        tgess1 = t[active]
+        LV = Lv0 - (Cl - Cpv)*(tgess1 - 273.15)
+        qs = q_star(tgess1, pp)
+        CPN = Cpd*(1. - qs) + Cpv*qs
+        h1 = CPN*tgess1 - LV*(qq - qs) + gg
+        done = abs(h1 - hh) < 0.01
+        flag[active[done]] = False
+        tgess2 = tgess1 - 1.
+        LV = Lv0 - (Cl - Cpv)*(tgess2 - 273.15)
+        qs = q_star(tgess2, pp)
+        CPN = Cpd*(1. - qs) + Cpv*qs
+        h2 = CPN*tgess2 - LV*(qq - qs) + gg
+        step = ~done
+        t[active[step]] = (tgess1 + (h1 - hh)/(h2 - h1))[step]
+        active = active[step]
+    return t.reshape(the_shape), flag.reshape(the_shape)
+
+def t_uos_array(h, qt, p, gz):
+    #   array version of t_uos: temperature for both saturated and
+    #   unsaturated air, inputs as in tmu_array
+    #   returns a dict of arrays T, QL, X like t_uos, plus flag
+    #   (True where the saturated solution was needed but did not converge)
+    #   tms is only run where qt > qs(tmu), since elsewhere t_uos
+    #   always takes the unsaturated answer
+    h, qt, p, gz = [numpy.asarray(x, dtype=float) for x in
+                    numpy.broadcast_arrays(h, qt, p, gz)]
+    t1 = tmu_array(h, qt, p, gz)
+    qs1 = q_star(t1, p)
+    T = numpy.array(t1)
+    QL = numpy.zeros(T.shape)
+    X = numpy.zeros(T.shape, int)
+    flag = numpy.zeros(T.shape, bool)
+    maybe = qt > qs1
+    if maybe.any():
+        t2, flag2 = tms_array(h[maybe], qt[maybe], p[maybe], gz[maybe])
+        qs2 = q_star(t2, p[maybe])
+        sat = qt[maybe] > qs2
+        idx = numpy.nonzero(maybe)
+        idx = tuple(i[sat] for i in idx)
+        T[idx] = t2[sat]
+        QL[idx] = qt[maybe][sat] - qs2[sat]
+        X[idx] = 1
+        flag[idx] = flag2[sat]
+    return {"T": T, "QL": QL, "X": X, "flag": flag}
+
+def all_uos_array(h, qt, p, gz):
+    #   array version of all_uos: temperature and other thermodynamic
+    #   variables from liquid water static energy per unit of moist
+    #   air h(J/kg), specific total water content qt (g/g), pressure
+    #   p (Pa) and geopotential height gz (m2/s2)
+    #   returns a dict of arrays T, QL, X, Q, RH, TRO, flag
+    #   (see t_uos_array for X and flag); RH is a fraction,
+    #   1 where saturated. Each field has the broadcast shape of the
+    #   inputs; all-scalar inputs give plain scalars, as in esat
+    result = t_uos_array(h, qt, p, gz)
+    t = result["T"]
+    qt = numpy.broadcast_to(qt, t.shape)
+    p = numpy.broadcast_to(p, t.shape)
+    sat = result["X"] == 1
+    qs = q_star(t, p)
+    result["Q"] = numpy.where(sat, qs, qt)
+    ES = e_star(t)
+    E = numpy.where(sat, ES, e(q_to_r(qt), p))
+    result["RH"] = E/ES
+    result["TRO"] = T_rho_array(t, qt, p)
+    if t.ndim == 0:
+        for key in result:
+            result[key] = numpy.asarray(result[key])[()]
+    return result
+
 def T_theta_e(the, p, t):
     #   Computes temperature t (K)
     #   from pseduo-equiv. pot. temp. (theta-e) and pressure p (Pa).
@@ -388,8 +534,12 @@ def T_theta_e(the, p, t):
     return t
     
  
+def _test():
+    import doctest
+    doctest.testmod()
+
 if __name__=="__main__":
-    pass
+    _test()
 #      print "example: python tdd.py -10 30 400 1000"
 #      print "argv:", sys.argv[0], sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]
 #      tmin  = float(sys.argv[1]) # minimum temperature in the TDD 
@@ -6,24 +6,27 @@ from constants import constants
 from theta import theta
 from wsat import wsat
 
-def thetaes(T, p):
+def thetaes(T, p, out=None):
     """
-    thetaes(T, p)
+    thetaes(T, p, out=None)
 
     Calculates the pseudo equivalent potential temperature of an air
     parcel.
 
     Parameters
     - - - - - -
-    T : float
+    T : float or array_like
         Temperature (K).
-    p : float
-        Pressure (Pa).
+    p : float or array_like
+        Pressure (Pa). Broadcast against 'T'.
+    out : ndarray, optional
+        Float array with the broadcast shape of 'T' and 'p' to hold
+        the result.
 
 
     Returns
     - - - -
-    thetaep : float
+    thetaep : float or ndarray
         Pseudo equivalent potential temperature (K).
 
 
@@ -41,25 +44,31 @@ def thetaes(T, p):
 
     Examples
     - - - - -
-    >>> thetaes(300., 8.e4)
-    412.97362667593831
+    >>> np.allclose(thetaes(300., 8.e4), 412.97362667593831)
+    True
+    >>> np.allclose(thetaes([300., 280.], [8.e4, 9.e4]), [412.97362667593831, 308.3086022])
+    True
     
     """
     c = constants();
+    T = np.asarray(T, dtype=float)
+    p = np.asarray(p, dtype=float)
     # The parcel is saturated - prohibit supersaturation with Td > T.
     Tlcl = T;
     wv = wsat(T, p);
     thetaval = theta(T, p, wv);
     power = 0.2854 * (1 - 0.28 * wv);
-    thetaep = thetaval * np.exp(wv * (1 + 0.81 * wv) * \
-                                (3376. / Tlcl - 2.54))
+    if out is None:
+        out = np.empty(np.shape(wv))
+    np.exp(wv * (1 + 0.81 * wv) * (3376. / Tlcl - 2.54), out=out)
+    out *= thetaval
     #
     # peg this at 450 so rootfinder won't blow up
     #
-    if thetaep > 450.:
-        thetaep = 450;
-
-    return thetaep
+    np.minimum(out, 450., out=out)
+    if out.ndim == 0:
+        return out[()]
+    return out
 
 
 def _test():
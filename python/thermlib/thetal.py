@@ -52,6 +52,83 @@ def thetal(T,p,wv,wl):
     return thetalOut
 
 
+def thetalDeriv(T,p,wv,wl):
+    """
+    thetalDeriv(T,p,wv,wl)
+
+    Liquid water potential temperature, as thetal, together with its
+    partial derivatives.
+
+    Parameters
+    - - - - - -
+    T : float or array_like
+        Temperature (K).
+    p : float or array_like
+        Pressure (Pa)
+    wv : float or array_like
+        Vapour mixing ratio (kg/kg).
+    wl : float or array_like
+        Liquid water mixing ratio (kg/kg).
+
+
+    Returns
+    - - - -
+    thetalOut : float or ndarray
+        Liquid water potential temperature (K).
+    dT : float or ndarray
+        d(thetal)/dT at fixed p, wv and wl (dimensionless).
+    dwv, dwl : float or ndarray
+        d(thetal)/d(wv) and d(thetal)/d(wl) (K kg/kg), each with the
+        other water variable, T and p fixed.
+
+    For a saturated parcel of total water wT, at wv = wsat(T, p), the
+    derivative in T is dT + (dwv - dwl)*d(wsat)/dT.
+
+
+    Examples
+    - - - - -
+    >>> th, dT, dwv, dwl = thetalDeriv(300., 8.e4, 0.03, 0.01)
+    >>> print '%.8f' % th
+    298.21374486
+    >>> fd = [(thetal(300. + h[0], 8.e4, 0.03 + h[1], 0.01 + h[2])
+    ...        - thetal(300. - h[0], 8.e4, 0.03 - h[1], 0.01 - h[2]))
+    ...       /(2.*sum(h)) for h in [(1.e-3, 0., 0.), (0., 1.e-6, 0.),
+    ...                              (0., 0., 1.e-6)]]
+    >>> np.allclose([dT, dwv, dwl], fd, rtol=1.e-6)
+    True
+    
+    """
+    c = constants();
+    T, p, wv, wl = [np.asarray(x, dtype=float) for x in (T, p, wv, wl)]
+    Lval = L(T);
+    wt = wv + wl;
+    cp = c.cpd + wt * c.cpv;
+    chi = (c.Rd + wt * c.Rv) / cp;
+    gamma = wt * c.Rv / cp;
+    logp = np.log(c.p0 / p)
+    log1 = np.log(1 - wl / (1. + wt))
+    log2 = np.log(1 - wl / (c.eps + wt))
+    log3 = np.log(1 - wl / wt)
+    thetalOut = T * np.exp(chi * logp + log1 + (chi - 1) * log2
+                           - gamma * log3 - Lval * wl / (cp * T))
+    dT = thetalOut * (1. / T - wl / cp * ((c.cpv - c.cl) * T - Lval) / T**2)
+    #log derivatives in wt at fixed wl, and in wl at fixed wt
+    dchi = (c.Rv - chi * c.cpv) / cp
+    dgamma = (c.Rv - gamma * c.cpv) / cp
+    dwt = dchi * (logp + log2) - dgamma * log3 \
+          + wl / ((1. + wt) * (1. + wt - wl)) \
+          + (chi - 1) * wl / ((c.eps + wt) * (c.eps + wt - wl)) \
+          - gamma * wl / (wt * (wt - wl)) \
+          + Lval * wl * c.cpv / (cp**2 * T)
+    dwlFixed = -1. / (1. + wt - wl) - (chi - 1) / (c.eps + wt - wl) \
+               + gamma / (wt - wl) - Lval / (cp * T)
+    dwv = thetalOut * dwt
+    dwl = thetalOut * (dwt + dwlFixed)
+    if thetalOut.ndim == 0:
+        return float(thetalOut), float(dT), float(dwv), float(dwl)
+    return thetalOut, dT, dwv, dwl
+
+
 def _test():
     import doctest
     doctest.testmod()
@@ -1,7 +1,8 @@
-import scipy.optimize
+import numpy as np
 
-from findWvWl import findWvWl
-from thetal import thetal
+from new_thermo import findWvWl, wsatDeriv, Tdfind
+from rootfinder import fzero_newton
+from thetal import thetal, thetalDeriv
 
 def tinvert(thetalVal, wT, p):
     """
@@ -12,23 +13,30 @@ def tinvert(thetalVal, wT, p):
 
     Parameters
     - - - - - -
-    thetalVal : float
+    thetalVal : float or array_like
         Liquid potential temperature of the air parcel (K).        
-    wT : float
+    wT : float or array_like
         Total water mixing ratio (kg/kg),
-    p : float
+    p : float or array_like
         Pressure (Pa).
 
 
     Returns
     - - - -
-    T : float
+    T : float or ndarray
         Temperature (K) corresponding to 'thetal'.
-    wv : float
+    wv : float or ndarray
         Vapour mixing ratio (kg/kg) at 'p'.
-    wl : float
+    wl : float or ndarray
         Liquid mixing ratio (kg/kg) at 'p'.
 
+    Array inputs are broadcast against each other and solved
+    together, by Newton steps on the analytic derivative from
+    TchangeDeriv (rootfinder.fzero_newton), between 233.15 K and
+    just above the larger of 'thetal' and the dewpoint of 'wT'.
+    Points with no temperature in that range come back as nan, they
+    don't raise.
+
 
     Raises
     - - - -
@@ -39,26 +47,33 @@ def tinvert(thetalVal, wT, p):
     Examples
     - - - - -
     >>> [T, wv, wl] = tinvert(300., 0.01, 8.e4)
-    >>> T
-    282.77595546332617
-    >>> wv
-    0.0094462286004982372
-    >>> wl
-    0.00055377139950176305
+    >>> print '%.8f' % T
+    282.77595546
+    >>> print '%.10f %.10f' % (wv, wl)
+    0.0094462286 0.0005537714
+
+    A saturated parcel near the surface is warmer than its thetal:
+
+    >>> [T, wv, wl] = tinvert(290., 0.015, [1.e5, 9.9e4])
+    >>> print '%.4f %.4f' % tuple(T)
+    292.1898 291.8022
+    >>> print '%.6f' % wl[0]
+    0.000999
     >>> [T, wv, wl] = tinvert(300., 0.01, 8.e6)
     Traceback (most recent call last):
         ...
     NameError: expecting pressure level less than 100000 Pa
     
     """
-    if p > 1.e5:
+    if np.any(np.asarray(p) > 1.e5):
         raise NameError, \
               'expecting pressure level less than 100000 Pa'
-    # The temperature has to be somewhere between 'thetal'
-    # (T at surface) and -40 deg. C (no ice).
-    
-    T = scipy.optimize.zeros.brenth(Tchange, 233.15, thetalVal, \
-                                     (thetalVal, wT, p));
+    # The temperature has to be above -40 deg. C (no ice), and below
+    # both 'thetal' (unsaturated) and the dewpoint of wT (saturated,
+    # which near the surface can be warmer than 'thetal'); 1 K past
+    # the larger of the two Tchange is always negative.
+    Tmax = np.maximum(thetalVal, Tdfind(np.asarray(wT, dtype=float), p)) + 1.
+    T = fzero_newton(TchangeDeriv, 233.15, Tmax, thetalVal, wT, p);
     [wv, wl] = findWvWl(T, wT, p);
     return T, wv, wl
 
@@ -66,10 +81,20 @@ def tinvert(thetalVal, wT, p):
 def Tchange(Tguess, thetalVal, wT, p):
     [wv, wl] = findWvWl(Tguess, wT, p);
     # Iterate on Tguess until this function is zero to within the
-    # default tolerance in brenth.
+    # default tolerance in fzero_bracket.
     return thetalVal - thetal(Tguess, p, wv, wl);
 
 
+def TchangeDeriv(Tguess, thetalVal, wT, p):
+    # Tchange and its derivative in Tguess; where the parcel is
+    # saturated wv = wsat(Tguess, p) and wl = wT - wv move with it
+    [wv, wl] = findWvWl(Tguess, wT, p);
+    theThetal, dT, dwv, dwl = thetalDeriv(Tguess, p, wv, wl)
+    dwsdT = wsatDeriv(Tguess, p)[1]
+    dT = dT + np.where(wl > 0., (dwv - dwl) * dwsdT, 0.)
+    return thetalVal - theThetal, -dT
+
+
 def _test():
     import doctest
     doctest.testmod()
@@ -1,3 +1,8 @@
+import numpy as np
+
+from new_thermo import findWvWl, Tdfind, thetaep
+from rootfinder import fzero_bracket
+
 def tinvert_thetae(thetaeVal, wT, p):
     """
     tinvert_thetae(thetaeVal, wT, p)
@@ -8,22 +13,25 @@ def tinvert_thetae(thetaeVal, wT, p):
 
     Parameters
     - - - - - -
-    thetaeVal : float
+    thetaeVal : float or array_like
         Thetae of parcel (K).
-    wtotal : float
+    wtotal : float or array_like
         Total water mixing ratio (kg/kg).
-    p : float
+    p : float or array_like
         Pressure of parcel in (Pa).
 
     Returns
     - - - -
-    theTemp : float
+    theTemp : float or ndarray
         Temperature for which thetaep equals the parcel thetae (K).
-    wv : float
+    wv : float or ndarray
         Vapor mixing ratio of the parcel (kg/kg).
-    wl : float
+    wl : float or ndarray
         liquid water mixing ratio of the parcel (kg/kg) at 'p'.
 
+    Array inputs are broadcast against each other and all of the
+    parcels are solved together.
+
     Raises
     - - - -
     IOError
@@ -31,18 +39,15 @@ def tinvert_thetae(thetaeVal, wT, p):
 
     Examples
     - - - - -
-    >>> tinvert_thetae(300., 0.001, 8.e4)
+    >>> print '%.3f %.3f %.3f' % tinvert_thetae(300., 0.001, 8.e4)
+    278.405 0.001 0.000
     
     """
-    import scipy.optimize
-    
-    if p > 1.e5:
+    if np.any(np.asarray(p) > 1.e5):
         raise IOError('expecting pressure level less than 100000 Pa')
     # The temperature has to be somewhere between thetae
     # (T at surface) and -40 deg. C (no ice).    
-    handle = Tchange
-    theTemp = scipy.optimize.zeros.brenth(handle, 50, \
-                                      thetaeVal, (thetaeVal, wT, p));
+    theTemp = fzero_bracket(Tchange, 50., thetaeVal, thetaeVal, wT, p)
     [wv,wl] = findWvWl(theTemp, wT, p);
     return theTemp,wv,wl
 
@@ -54,3 +59,10 @@ def Tchange(Tguess, thetaeVal, wT, p):
     # zero to within tolerance.
     return thetaeVal - thetaep(tdGuess, Tguess, p);
 
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
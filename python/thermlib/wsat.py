@@ -3,14 +3,14 @@ two functions, wsat and replaceelem. Note that replaceelem is
 designed for use within wsat.
 """
 
-import scipy as sp
+import numpy as np
 
 from constants import constants
 from esat import esat
 
-def wsat(Temp, press):
+def wsat(Temp, press, out=None):
     """
-    wsat(Temp, press)
+    wsat(Temp, press, out=None)
 
     Calculates the saturation vapor mixing ratio of an air parcel.
 
@@ -19,85 +19,47 @@ def wsat(Temp, press):
     Temp : float or array_like
         Temperature in Kelvin.
     press : float or array_like
-        Pressure in Pa.
+        Pressure in Pa. Broadcast against 'Temp'.
+    out : ndarray, optional
+        Float array with the broadcast shape of 'Temp' and 'press'
+        to hold the result, so repeated calls don't allocate.
 
     Returns
     - - - -
-    theWs : float or array_like 
+    theWs : float or ndarray
         Saturation water vapor mixing ratio in (kg/kg).
 
-    Raises
-    - - - -
-    IOError
-        If both 'Temp' and 'press' are array_like.
-
     Examples
     - - - - -
-    >>> wsat(300, 8e4)
-    0.028751159650442507
-    >>> wsat([300,310], 8e4)
-    [0.028751159650442507, 0.052579529573838296]
-    >>> wsat(300, [8e4, 7e4])
-    [0.028751159650442507, 0.033076887758679716]
-    >>> wsat([300, 310], [8e4, 7e4])
-    Traceback (most recent call last):
-        ...
-    IOError: Can't have two vector inputs.
+    >>> np.allclose(wsat(300, 8e4), 0.028751159650442507)
+    True
+    >>> np.allclose(wsat([300,310], 8e4), [0.028751159650442507, 0.052579529573838296])
+    True
+    >>> np.allclose(wsat(300, [8e4, 7e4]), [0.028751159650442507, 0.033076887758679716])
+    True
+    >>> np.allclose(wsat([300, 310], [8e4, 7e4]), [0.028751159650442507, 0.060])
+    True
 
     """
     c = constants();
-    es = esat(Temp);
-
-    # We need to test for all possible cases of (Temp,press)
-    # combinations (ie. (vector,vector), (vector,scalar),
-    # (scalar,vector), or (scalar,scalar).
-    
-    try:
-        len(es)
-    except:
-        esIsVect = False
-    else:
-        esIsVect = True
-
-    try:
-        len(press)
-    except:
-        pressIsVect = False
-    else:
-        pressIsVect = True
-    
-    if esIsVect and pressIsVect:
-        raise IOError, "Can't have two vector inputs."
-    elif esIsVect:
-        theWs = [(c.eps * i/ (press - i)) for i in es]
-        # Limit ws values so rootfinder doesn't blow up.       
-        theWs = list(replaceelem(theWs,0,0.060))
-    elif pressIsVect:
-        theWs = [(c.eps * es/ (i - es)) for i in press]
-        # Limit ws values so rootfinder doesn't blow up.       
-        theWs = list(replaceelem(theWs,0,0.060))
-    else: # Neither 'es' nor 'press' in a vector.
-        theWs = (c.eps * es/ (press - es))
-        # Limit ws value so rootfinder doesn't blow up.
-        if theWs > 0.060: theWs = 0.060
-        elif theWs < 0: theWs = 0
-
-    # Set minimum and maximum acceptable values for theWs.
-        
-    try:
-        len(theWs)
-    except:        
-        if theWs > 0.060: theWs = 0.060
-        elif theWs < 0: theWs = 0
-    else:
-        theWs = list(replaceelem(theWs, 0, 0.060))
-
-    return theWs
-
-
-def replaceelem(theList,lowLim,upLim):
+    if out is None:
+        out = np.empty(np.broadcast(Temp, press).shape)
+    es = esat(Temp, out=out);
+    # eps*es/(press - es) = eps/(press/es - 1), done in place
+    np.divide(press, es, out=out)
+    out -= 1.
+    np.reciprocal(out, out=out)
+    out *= c.eps
+    # Limit ws values so rootfinder doesn't blow up.
+    replaceelem(out, 0, 0.060, out=out)
+    if out.ndim == 0:
+        return out[()]
+    return out
+
+
+def replaceelem(theList,lowLim,upLim,out=None):
     """
-    raplaceelem(theList, lowLim, upLim)
+    replaceelem(theList, lowLim, upLim, out=None)
 
     Replaces any elements in 'theList' greater than 'upLim' and less
     than 'lowLim' with the values of 'upLim' and 'lowLim',
@@ -114,6 +76,8 @@ def replaceelem(theList,lowLim,upLim):
     upLim : int
         Number to replace any values within 'theList' that are higher
         than it.
+    out : ndarray, optional
+        Array to hold the result; may be 'theList' itself.
 
     Returns
     - - - -
@@ -121,15 +85,7 @@ def replaceelem(theList,lowLim,upLim):
         Augmentation of 'theList' with upper and lower bounds
         accounted for and replaced if necessary.
     """    
-    newList = sp.zeros(len(theList))
-    for i in theList:
-        if i < lowLim:
-            newList[theList.index(i)] = lowLim
-        elif i > upLim:
-            newList[theList.index(i)] = upLim
-        else:
-            newList[theList.index(i)] = i
-    return newList
+    return np.clip(theList, lowLim, upLim, out=out)
 
 
 def _test():